@@ -86,6 +86,11 @@ const experimentCompletedHandler = async (req: Request, res: Response): Promise<
       logError("Progress Check Failed", progressError, { runId });
     }
 
+    // 워커가 비정상 종료되면 FastAPI 스케줄러가 FAILED를 보냄 (진행률과 관계없이 FAILED)
+    if (req.body?.status === "FAILED") {
+      finalStatus = "FAILED";
+    }
+
     // 실험 상태 업데이트 및 artifacts 정보 저장
     const updateData: any = {
       status: finalStatus,
@@ -94,6 +94,7 @@ ALGO_SCHEMAS={
             {"key": "train_freq", "label": "Train Frequency", "group": "update", "type": "int", "default": 4, "min": 1, "max": 16, "step": 1, "help": "Update the model every 'train_freq' steps."},
             {"key": "gradient_steps", "label": "Gradient Steps", "group": "update", "type": "int", "default": 1, "min": -1, "max": 16, "step": 1, "help": "How many gradient steps to do after each rollout. -1 means as many as steps taken."},
             {"key": "target_update_interval", "label": "Target Update Interval", "group": "update", "type": "int", "default": 10000, "min": 500, "max": 20000, "step": 500, "help": "Update the target network every 'target_update_interval' environment steps."},
+            {"key": "n_envs", "label": "Parallel Envs", "group": "teacher", "type": "int", "default": 1, "min": 1, "max": 8, "step": 1, "help": "Number of Unity environments stepped together. Above 1 the teacher is queried once per vector step for all environments."},
             {"key": "teacher_feedback_weight", "label": "Feedback Weight", "group": "teacher", "type": "float", "default": 0.5, "min": 0.0, "max": 2.0, "step": 0.1, "help": "Weight of the teacher's feedback in the reward shaping."},
             {"key": "teacher_warmup_episodes", "label": "Warmup Episodes", "group": "teacher", "type": "int", "default": 50, "min": 0, "max": 500, "step": 10, "help": "Number of episodes to wait before applying teacher feedback."},
             {"key": "teacher_name", "label": "Teacher Model Name", "group": "teacher", "type": "select", "required": True, "options": [], "help": "Select a pre-trained teacher model."},
@@ -123,8 +124,45 @@ ALGO_SCHEMAS={
             {"key": "target_update_interval", "label": "Target Update Interval", "group": "update", "type": "int", "default": 10000, "min": 500, "max": 20000, "step": 500, "help": "Update the target network every 'target_update_interval' environment steps."},
             {"key": "feedback_weight", "label": "Feedback Weight", "group": "llm", "type": "float", "default": 0.05, "min": 0.0, "max": 2.0, "step": 0.01, "help": "Weight of the LLM's feedback in the reward shaping."},
             {"key": "warmup_fraction", "label": "Warmup Fraction", "group": "llm", "type": "float", "default": 0.05, "min": 0.0, "max": 0.5, "step": 0.01, "help": "Fraction of total timesteps to wait before applying LLM feedback."},
+            {"key": "productive_pause", "label": "Train While Paused", "group": "llm", "type": "select", "default": "false", "options": [{"label": "Off", "value": "false"}, {"label": "On", "value": "true"}], "help": "Keep taking gradient steps from the replay buffer while the run is paused for feedback."},
+            {"key": "pause_replay_ratio", "label": "Pause Replay Ratio", "group": "llm", "type": "float", "default": 1.0, "min": 0.1, "max": 8.0, "step": 0.1, "help": "Extra gradient updates per pause, as a multiple of the configured gradient_steps/train_freq ratio over the steps collected since the previous pause."},
             {"key": "teacher_name", "label": "Teacher Model Name", "group": "teacher", "type": "select", "required": True, "options": [], "help": "Select a pre-trained teacher model."},
-            {"key": "teacher_algo", "label": "Teacher Algorithm", "group": "teacher", "type": "string", "required": False, "help": "Algorithm of the selected teacher model (auto-detected)."}
+            {"key": "teacher_algo", "label": "Teacher Algorithm", "group": "teacher", "type": "string", "required": False, "help": "Algorithm of the selected teacher model (auto-detected)."},
+            {"key": "cache_cnn_embedding", "label": "Cache CNN Embedding", "group": "teacher", "type": "select", "default": "false", "options": [{"label": "Off", "value": "false"}, {"label": "On", "value": "true"}], "help": "Freeze the CNN copied from the teacher and store its embedding in the replay buffer instead of the image."},
+            {"key": "share_features_extractor", "label": "Share Feature Extractor", "group": "teacher", "type": "select", "default": "false", "options": [{"label": "Off", "value": "false"}, {"label": "On", "value": "true"}], "help": "Share one feature extractor between the online and target Q-networks; target updates then only sync the heads."},
+            {"key": "cnn_lr", "label": "CNN Learning Rate", "group": "teacher", "type": "float", "default": 0.000005, "min": 0.0, "max": 0.001, "step": 1e-6, "help": "Learning rate of the CNN copied from the teacher. 0 freezes the CNN and skips its backward pass."},
+            {"key": "cnn_unfreeze_fraction", "label": "CNN Unfreeze Fraction", "group": "teacher", "type": "float", "min": 0.0, "max": 1.0, "step": 0.05, "help": "Fraction of total timesteps after which a frozen CNN (cnn_lr=0) starts training again."},
+            {"key": "cnn_unfreeze_lr", "label": "CNN Unfreeze LR", "group": "teacher", "type": "float", "default": 0.000005, "min": 1e-7, "max": 0.001, "step": 1e-6, "help": "CNN learning rate applied once the CNN is unfrozen."}
+        ]
+    },
+    # srl은 API로 직접 제출할 때만 사용 (프론트의 teacher 모델 선택 UI가 tsc/hf-llm 전용이라 ALGO_LIST에는 없음)
+    "srl": {
+        "groups": [
+            {"id": "general", "label": "General"},
+            {"id": "replay", "label": "Replay Buffer"},
+            {"id": "exploration", "label": "Exploration"},
+            {"id": "update", "label": "Update Parameters"},
+            {"id": "teacher", "label": "Teacher Student"}
+        ],
+        "fields": [
+            {"key": "learning_rate", "label": "Learning Rate", "group": "general", "type": "float", "default": 0.0001, "min": 1e-5, "max": 0.1, "step": 1e-5, "help": "The learning rate for the optimizer."},
+            {"key": "gamma", "label": "Gamma (Discount Factor)", "group": "general", "type": "float", "default": 0.99, "min": 0.8, "max": 0.9999, "step": 0.001, "help": "Discount factor for future rewards."},
+            {"key": "stats_window_size", "label": "Stats Window Size", "group": "general", "type": "int", "default": 100, "min": 1, "max": 500, "step": 1, "help": "Window size for the rollout logging, specifying the number of episodes to average."},
+            {"key": "buffer_size", "label": "Buffer Size", "group": "replay", "type": "int", "default": 1000000, "min": 10000, "max": 2000000, "step": 10000, "help": "Size of the replay buffer."},
+            {"key": "learning_starts", "label": "Learning Starts", "group": "replay", "type": "int", "default": 500, "min": 300, "max": 2000, "step": 100, "help": "How many steps of experience to collect before learning starts."},
+            {"key": "batch_size", "label": "Batch Size", "group": "replay", "type": "int", "default": 32, "min": 16, "max": 512, "step": 16, "help": "Minibatch size for each gradient update."},
+            {"key": "exploration_fraction", "label": "Exploration Fraction", "group": "exploration", "type": "float", "default": 0.1, "min": 0.01, "max": 0.5, "step": 0.01, "help": "Fraction of entire training period over which the exploration rate is reduced."},
+            {"key": "exploration_final_eps", "label": "Final Epsilon", "group": "exploration", "type": "float", "default": 0.05, "min": 0.01, "max": 0.2, "step": 0.01, "help": "Final value of random action probability."},
+            {"key": "train_freq", "label": "Train Frequency", "group": "update", "type": "int", "default": 4, "min": 1, "max": 16, "step": 1, "help": "Update the model every 'train_freq' steps."},
+            {"key": "gradient_steps", "label": "Gradient Steps", "group": "update", "type": "int", "default": 1, "min": -1, "max": 16, "step": 1, "help": "How many gradient steps to do after each rollout. -1 means as many as steps taken."},
+            {"key": "target_update_interval", "label": "Target Update Interval", "group": "update", "type": "int", "default": 10000, "min": 500, "max": 20000, "step": 500, "help": "Update the target network every 'target_update_interval' environment steps."},
+            {"key": "teacher_name", "label": "Teacher Model Name", "group": "teacher", "type": "select", "required": True, "options": [], "help": "Select a pre-trained teacher model whose feature extractor is copied."},
+            {"key": "teacher_algo", "label": "Teacher Algorithm", "group": "teacher", "type": "string", "required": False, "help": "Algorithm of the selected teacher model (auto-detected)."},
+            {"key": "cache_cnn_embedding", "label": "Cache CNN Embedding", "group": "teacher", "type": "select", "default": "false", "options": [{"label": "Off", "value": "false"}, {"label": "On", "value": "true"}], "help": "Freeze the CNN copied from the teacher and store its embedding in the replay buffer instead of the image."},
+            {"key": "share_features_extractor", "label": "Share Feature Extractor", "group": "teacher", "type": "select", "default": "false", "options": [{"label": "Off", "value": "false"}, {"label": "On", "value": "true"}], "help": "Share one feature extractor between the online and target Q-networks; target updates then only sync the heads."},
+            {"key": "cnn_lr", "label": "CNN Learning Rate", "group": "teacher", "type": "float", "default": 0.000005, "min": 0.0, "max": 0.001, "step": 1e-6, "help": "Learning rate of the CNN copied from the teacher. 0 freezes the CNN and skips its backward pass."},
+            {"key": "cnn_unfreeze_fraction", "label": "CNN Unfreeze Fraction", "group": "teacher", "type": "float", "min": 0.0, "max": 1.0, "step": 0.05, "help": "Fraction of total timesteps after which a frozen CNN (cnn_lr=0) starts training again."},
+            {"key": "cnn_unfreeze_lr", "label": "CNN Unfreeze LR", "group": "teacher", "type": "float", "default": 0.000005, "min": 1e-7, "max": 0.001, "step": 1e-6, "help": "CNN learning rate applied once the CNN is unfrozen."}
         ]
     }
 }
\ No newline at end of file
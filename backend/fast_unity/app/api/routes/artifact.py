@@ -1,10 +1,19 @@
 from fastapi import APIRouter, HTTPException
 from fastapi.responses import FileResponse
 from pathlib import Path
+from typing import Literal, Optional
 import os
 import mimetypes
 import shutil
 
+from unity.train_util.metric_store import MetricStore, METRIC_DB_NAME
+from unity.train_util.episode_log import export_episode_csv, has_episode_log
+from unity.train_util.slim_policy import slim_path_for
+from unity.train_util.onnx_policy import onnx_path_for, quantized_onnx_path_for
+from unity.train_util.onnx_quantize import observation_set_path_for, quantize_candidate_paths
+from unity.train_util.mlagents_export import mlagents_onnx_path_for
+from unity.train_util.training_state import replay_buffer_path_for
+
 # 라우터 생성
 artifact_router = APIRouter(prefix="/api/artifacts", tags=["downloads"])
 
@@ -29,10 +38,16 @@ def safe_file_access(root: Path, filename: str, allowed_extensions: set[str]) ->
     return file_path
 
 @artifact_router.get("/models/{file_name}")
-async def download_model(file_name: str):
-    """모델 다운로드"""
+async def download_model(file_name: str, full: bool = False):
+    """
+    모델 다운로드
+    추론 전용 아티팩트(.policy.zip)가 있으면 그것을 내려줍니다. 학습 재개용 전체 모델은 full=true
+    """
     try:
         file_path = safe_file_access(MODELS_PATH, file_name, {".zip"})
+        slim_path = Path(slim_path_for(str(file_path)))
+        if not full and slim_path.is_file() and slim_path.stat().st_mtime >= file_path.stat().st_mtime:
+            file_path = slim_path
 
         media_type = mimetypes.guess_type(file_path.name)[0] or "application/zip"
         
@@ -50,7 +65,11 @@ async def download_model(file_name: str):
 async def download_train_logs(file_name: str):
     """학습 로그 다운로드"""
     try:
-        base_name = file_name.rsplit('.', 1)[0]
+        base_name = os.path.basename(file_name).rsplit('.', 1)[0]
+        log_dir = LOGS_PATH / base_name
+        if file_name.lower().endswith(".csv") and has_episode_log(str(log_dir)):
+            # 컬럼형 에피소드 기록은 다운로드 요청 시에만 CSV로 변환 (변경이 없으면 이전 변환 결과 재사용)
+            export_episode_csv(str(log_dir), str(log_dir / f"{base_name}.csv"))
         file_path = safe_file_access(LOGS_PATH / base_name, file_name, {".csv"})
         
         media_type = mimetypes.guess_type(file_path.name)[0] or "text/csv"
@@ -77,7 +96,7 @@ async def check_run_artifacts(run_name: str):
         # 로그 파일 확인 (runName 폴더 안의 runName.csv)
         log_dir = LOGS_PATH / run_name
         log_file = log_dir / f"{run_name}.csv"
-        log_exists = log_file.exists() and log_file.is_file()
+        log_exists = (log_file.exists() and log_file.is_file()) or has_episode_log(str(log_dir))
         
         return {
             "run_name": run_name,
@@ -96,6 +115,64 @@ async def check_run_artifacts(run_name: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error checking run artifacts: {str(e)}")
 
+def _open_metric_store(run_name: str) -> MetricStore:
+    db_path = (LOGS_PATH / os.path.basename(run_name) / METRIC_DB_NAME).resolve()
+    if LOGS_PATH.resolve() not in db_path.parents:
+        raise HTTPException(status_code=400, detail="Invalid path")
+    if not db_path.is_file():
+        raise HTTPException(status_code=404, detail="Metrics not found")
+    return MetricStore(str(db_path), readonly=True)
+
+@artifact_router.get("/{run_name}/metrics/keys")
+def get_metric_keys(run_name: str):
+    """저장된 메트릭 키 목록"""
+    store = _open_metric_store(run_name)
+    try:
+        return {"run_name": run_name, "keys": store.keys()}
+    finally:
+        store.close()
+
+@artifact_router.get("/{run_name}/metrics")
+def query_metrics(
+    run_name: str,
+    keys: str,
+    start_step: Optional[int] = None,
+    end_step: Optional[int] = None,
+    start_time: Optional[float] = None,
+    end_time: Optional[float] = None,
+    max_points: int = 1000,
+    method: Literal["lttb", "minmax"] = "lttb",
+):
+    """
+    스텝/시간(epoch 초) 범위의 메트릭을 서버에서 다운샘플링해서 반환합니다.
+    keys는 쉼표로 구분 (예: rollout/ep_rew_mean,train/loss). max_points=0이면 전체 포인트를 반환합니다.
+    """
+    store = _open_metric_store(run_name)
+    try:
+        series = store.query(
+            [key for key in keys.split(",") if key],
+            step_range=(start_step, end_step),
+            time_range=(start_time, end_time),
+            max_points=max_points,
+            method=method,
+        )
+    finally:
+        store.close()
+    return {"run_name": run_name, "method": method, "max_points": max_points, "series": series}
+
+def model_artifact_paths(run_name: str) -> list[Path]:
+    """
+    모델 체크포인트(.zip)와 그로부터 만든 사이드카 전체
+    (.policy.zip, .onnx(.json), .int8.onnx(.json)와 양자화 임시 파일, .mlagents.onnx, .obs.npz, 선점 때 저장한 .replay.pkl)
+    """
+    model_path = str(MODELS_PATH / f"{os.path.basename(run_name)}.zip")
+    onnx_paths = [onnx_path_for(model_path), quantized_onnx_path_for(model_path)]
+    onnx_paths += quantize_candidate_paths(model_path)
+    paths = [model_path, slim_path_for(model_path), mlagents_onnx_path_for(model_path), observation_set_path_for(model_path),
+             replay_buffer_path_for(model_path)]
+    paths += [p for onnx_path in onnx_paths for p in (onnx_path, onnx_path + ".json")]
+    return [Path(p) for p in paths]
+
 @artifact_router.delete("/delete")
 async def delete_artifacts(request: dict):
     """실험 관련 아티팩트 삭제 (모델 파일과 로그 파일)"""
@@ -107,11 +184,11 @@ async def delete_artifacts(request: dict):
         
         deleted_items = []
         
-        # 모델 파일 삭제
-        model_path = MODELS_PATH / f"{run_name}.zip"
-        if model_path.exists() and model_path.is_file():
-            model_path.unlink()
-            deleted_items.append(f"model: {model_path.name}")
+        # 모델 파일과 추론용 사이드카 삭제 (남아 있으면 삭제된 모델이 ONNX 경로로 계속 로드될 수 있음)
+        for path in model_artifact_paths(run_name):
+            if path.exists() and path.is_file():
+                path.unlink()
+                deleted_items.append(f"model: {path.name}")
         
         # 로그 디렉토리 삭제
         log_path = LOGS_PATH / run_name
@@ -1,4 +1,7 @@
-from fastapi import APIRouter, HTTPException, status
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, status, Header, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
 from app.services.unity_service import UnityService
 
 from pydantic import BaseModel
@@ -18,22 +21,30 @@ async def start_run(experiment_id: str,
 runs_router = APIRouter(prefix="/runs", tags=["Runs"])
 
 
+@runs_router.get("/scheduler")
+async def get_scheduler_status():
+    """동시 실행 슬롯, 대기열, 작업별 상태를 조회합니다."""
+    return unity_service.get_status()
+
 
 @runs_router.post("/{run_id}:pause")
 async def pause_run(run_id: str):
-    result = await unity_service.pause(run_id)
-    return {"status": result}
+    # latency_ms: 명령을 보낸 뒤 워커에 실제로 반영될 때까지 걸린 시간 (시간 초과면 null)
+    result, latency_ms = await unity_service.pause(run_id)
+    return {"status": result, "latency_ms": latency_ms}
 
 
 @runs_router.post("/{run_id}:resume")
 async def resume_run(run_id: str):
-    result = await unity_service.resume(run_id)
-    return {"status": result}
+    # latency_ms: 명령을 보낸 뒤 워커에 실제로 반영될 때까지 걸린 시간 (시간 초과면 null)
+    result, latency_ms = await unity_service.resume(run_id)
+    return {"status": result, "latency_ms": latency_ms}
 
 @runs_router.post("/{run_id}:stop")
 async def stop_run(run_id: str):
-    result = await unity_service.stop(run_id)
-    return {"status": result}
+    # latency_ms: 명령을 보낸 뒤 워커에 실제로 반영될 때까지 걸린 시간 (시간 초과면 null)
+    result, latency_ms = await unity_service.stop(run_id)
+    return {"status": result, "latency_ms": latency_ms}
 
 @runs_router.post("/{run_id}:simSpeed")
 async def set_speed(run_id :str,
@@ -42,6 +53,51 @@ async def set_speed(run_id :str,
     result = await unity_service.set_speed(run_id,sim_speed)
     return {"status": result}
 
+@runs_router.get("/{run_id}/metrics/stream")
+async def stream_metrics_sse(run_id: str, last_event_id: int = 0,
+                             last_event_id_header: Optional[str] = Header(None, alias="Last-Event-ID")):
+    """
+    학습 메트릭 SSE 스트림. FastAPI 메모리의 링 버퍼에서 바로 내보냅니다. (Mongo 경유 없음)
+    재연결 시 Last-Event-ID 헤더(또는 last_event_id 쿼리) 이후의 이벤트부터 이어서 받습니다.
+    허브에 버퍼가 없고 대기/실행 중도 아닌 실행이면 404.
+    """
+    if not unity_service.has_metrics(run_id):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Metrics stream not found")
+    if last_event_id_header and last_event_id_header.isdigit():
+        last_event_id = int(last_event_id_header)
+
+    async def event_stream():
+        async for event in unity_service.metrics_hub.subscribe(
+                run_id, last_event_id, is_active=lambda: unity_service.is_active(run_id)):
+            # 직렬화된 바이트를 모든 구독자가 공유
+            yield event.sse if event is not None else b": keep-alive\n\n"
+        yield b"event: end\ndata: {}\n\n"
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@runs_router.websocket("/{run_id}/metrics/stream")
+async def stream_metrics_ws(websocket: WebSocket, run_id: str, last_event_id: int = 0):
+    """
+    학습 메트릭 WebSocket 스트림. 메시지 형식: {"id": 이벤트 ID, "data": 메트릭 페이로드}
+    허브에 버퍼가 없고 대기/실행 중도 아닌 실행이면 연결을 거부합니다. (1008)
+    """
+    if not unity_service.has_metrics(run_id):
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    await websocket.accept()
+    try:
+        async for event in unity_service.metrics_hub.subscribe(
+                run_id, last_event_id, is_active=lambda: unity_service.is_active(run_id)):
+            if event is None:
+                await websocket.send_text('{"type": "keep-alive"}')
+            else:
+                await websocket.send_text(event.ws)
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+
 class LLMFeedbackRequest(BaseModel):
     message: str
 
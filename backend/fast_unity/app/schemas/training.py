@@ -18,6 +18,13 @@ class TrainRequest(BaseModel):
     total_timesteps: int = Field(..., gt=0)
     hyperparams: Dict[str, Any] = {}  # SB3 하이퍼파라미터 통째로
     envparams : Dict[str,Any]={}
+    priority: int = 0  # 스케줄러 우선순위 (클수록 먼저 실행, 낮은 우선순위 학습을 선점)
+
+    def n_envs(self) -> int:
+        """동시에 띄울 Unity 환경 수 (tsc만 hyperparams의 n_envs를 쓰고 나머지는 1)"""
+        if self.algorithm != "tsc":
+            return 1
+        return max(1, int(self.hyperparams.get("n_envs", 1)))
 
 class TestRequest(BaseModel):
     model_name:str
@@ -25,6 +32,7 @@ class TestRequest(BaseModel):
     env_name: str
     episodesnum : int
     envparams: Dict[str,Any]={}
+    priority: int = 0
     
 class SimSpeed(BaseModel):
     sim_speed:float
\ No newline at end of file
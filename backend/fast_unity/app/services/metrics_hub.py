@@ -0,0 +1,125 @@
+import asyncio
+import json
+import threading
+from collections import OrderedDict, deque
+from typing import Any, AsyncIterator, Callable, Deque, Dict, List, Optional
+
+
+class MetricEvent:
+    """한 번만 직렬화해서 모든 구독자(SSE/WebSocket)가 공유하는 메트릭 이벤트"""
+    __slots__ = ("id", "data", "sse", "ws")
+
+    def __init__(self, event_id: int, payload: Dict[str, Any]):
+        self.id = event_id
+        self.data = json.dumps(payload, ensure_ascii=False)
+        self.sse = f"id: {event_id}\ndata: {self.data}\n\n".encode("utf-8")
+        self.ws = f'{{"id": {event_id}, "data": {self.data}}}'
+
+
+class _RunChannel:
+    def __init__(self, buffer_size: int):
+        self.events: Deque[MetricEvent] = deque(maxlen=buffer_size)
+        self.next_id = 1
+        self.closed = False
+
+
+class MetricsHub:
+    """
+    학습 워커가 보낸 메트릭을 API 프로세스 메모리에 보관하고 대시보드에 바로 스트리밍하는 허브.
+
+    - 실행(run)마다 최근 buffer_size개의 이벤트를 링 버퍼에 보관합니다. 이벤트 ID는 실행마다 1부터 증가합니다.
+    - 구독자는 Last-Event-ID 이후의 이벤트를 링 버퍼에서 먼저 받고, 이후 새 이벤트를 기다립니다.
+      (링 버퍼에서 밀려난 구간은 건너뜁니다)
+    - publish()는 워커 파이프를 읽는 스레드에서 호출되고, 구독자는 이벤트 루프에서 깨어납니다.
+    - 실행이 끝나면 close()로 구독 스트림을 끝내며, 종료된 실행의 버퍼는 max_closed_runs개까지만 유지합니다.
+    - 허브가 모르는 실행(발행된 적 없거나 버퍼가 정리됨)은 is_active()가 False가 되는 즉시 스트림을 끝냅니다.
+    """
+
+    def __init__(self, buffer_size: int = 2000, max_closed_runs: int = 50):
+        self.buffer_size = buffer_size
+        self.max_closed_runs = max_closed_runs
+        self._runs: "OrderedDict[str, _RunChannel]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # 이벤트 루프 스레드에서만 접근 (새 이벤트가 오면 set 후 교체)
+        self._signals: Dict[str, asyncio.Event] = {}
+
+    # ---- 생산자 (워커 파이프 리더 스레드) ----
+    def publish(self, run_id: str, payload: Dict[str, Any]) -> None:
+        with self._lock:
+            channel = self._runs.get(run_id)
+            if channel is None or channel.closed:
+                channel = self._runs[run_id] = _RunChannel(self.buffer_size)
+            channel.events.append(MetricEvent(channel.next_id, payload))
+            channel.next_id += 1
+        self._wake(run_id)
+
+    def close(self, run_id: str) -> None:
+        with self._lock:
+            channel = self._runs.get(run_id)
+            if channel is None:
+                # 메트릭 없이 끝난 실행: 발행을 기다리던 구독자를 깨워 스트림을 끝내게 함
+                self._wake(run_id)
+                return
+            channel.closed = True
+            self._runs.move_to_end(run_id)
+            closed = [key for key, ch in self._runs.items() if ch.closed]
+            for key in closed[:-self.max_closed_runs]:
+                del self._runs[key]
+        self._wake(run_id)
+
+    def _wake(self, run_id: str) -> None:
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self._notify, run_id)
+
+    def _notify(self, run_id: str) -> None:
+        signal = self._signals.pop(run_id, None)
+        if signal is not None:
+            signal.set()
+
+    # ---- 소비자 (이벤트 루프) ----
+    def events_after(self, run_id: str, last_event_id: int) -> List[MetricEvent]:
+        with self._lock:
+            channel = self._runs.get(run_id)
+            if channel is None:
+                return []
+            return [event for event in channel.events if event.id > last_event_id]
+
+    def has_run(self, run_id: str) -> bool:
+        with self._lock:
+            return run_id in self._runs
+
+    def is_closed(self, run_id: str) -> bool:
+        with self._lock:
+            channel = self._runs.get(run_id)
+            return channel is not None and channel.closed
+
+    async def subscribe(self, run_id: str, last_event_id: int = 0, heartbeat: float = 15.0,
+                        is_active: Optional[Callable[[], bool]] = None) -> AsyncIterator[Optional[MetricEvent]]:
+        """
+        last_event_id 이후의 이벤트를 순서대로 내보냅니다.
+        heartbeat초 동안 새 이벤트가 없으면 None을 내보내므로 호출자가 keep-alive를 보낼 수 있습니다.
+        허브에 실행 버퍼가 없고 is_active()(스케줄러에서 대기/실행 중인지)도 False면 끝냅니다. (is_active가 없으면 항상 False)
+        """
+        self._loop = asyncio.get_running_loop()
+        while True:
+            # 확인 전에 신호를 먼저 잡아야 그 사이에 온 이벤트를 놓치지 않음
+            signal = self._signals.get(run_id)
+            if signal is None:
+                signal = self._signals[run_id] = asyncio.Event()
+
+            events = self.events_after(run_id, last_event_id)
+            for event in events:
+                yield event
+                last_event_id = event.id
+            if events:
+                continue
+            if self.is_closed(run_id):
+                return
+            if not self.has_run(run_id) and not (is_active is not None and is_active()):
+                return
+            try:
+                await asyncio.wait_for(signal.wait(), heartbeat)
+            except asyncio.TimeoutError:
+                yield None
@@ -0,0 +1,305 @@
+import heapq
+import itertools
+import os
+import threading
+import time
+from functools import partial
+from typing import Dict, List, Optional, Union
+
+from app.schemas.training import TrainRequest, TestRequest
+from app.services.metrics_hub import MetricsHub
+from unity.train.run_worker import RunProcess, load_test_policy
+from unity.train_util.event_bus import get_event_bus
+from unity.train_util.policy_server import PolicyServerProcess, policy_server_enabled
+from unity.train_util.training_state import SharedRunState
+
+QUEUED, RUNNING, PREEMPTING, STOPPED = "QUEUED", "RUNNING", "PREEMPTING", "STOPPED"
+
+
+def _available_memory_mb() -> Optional[int]:
+    """/proc/meminfo의 MemAvailable(MB). 읽을 수 없는 환경이면 None (메모리 조건 생략)"""
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) // 1024
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def _usable_cores() -> List[int]:
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+class RunJob:
+    """스케줄러가 관리하는 학습/추론 작업 하나. 작업마다 전용 상태(SharedRunState)와 워커를 가집니다."""
+    def __init__(self, kind: str, req: Union[TrainRequest, TestRequest], run_id: str, priority: int, seq: int):
+        self.kind = kind
+        self.req = req
+        self.run_id = run_id
+        self.priority = priority
+        self.seq = seq
+        self.state = SharedRunState()
+        self.status = QUEUED
+        self.worker: Optional[RunProcess] = None
+        self.slot: Optional[int] = None
+        # 차지하는 슬롯 수와 슬롯 번호 (tsc의 n_envs > 1이면 Unity 환경마다 슬롯 하나의 CPU/메모리 몫)
+        self.width = 1
+        self.slot_ids: List[int] = []
+        # 선점 후 재시작할 때 저장된 체크포인트에서 이어서 학습
+        self.resume = False
+        self.preempt_count = 0
+        # 선점 중에 사용자가 중지한 작업 (워커가 완료 신호를 보내지 않으므로 스케줄러가 STOPPED를 보냄)
+        self.stopped_while_preempting = False
+        self.submitted_at = time.time()
+        self.started_at: Optional[float] = None
+
+    def sort_key(self):
+        # 우선순위가 높을수록, 먼저 들어온 작업일수록 앞
+        return (-self.priority, self.seq)
+
+    def snapshot(self) -> dict:
+        return {
+            "run_id": self.run_id,
+            "kind": self.kind,
+            "status": self.status,
+            "priority": self.priority,
+            "slot": self.slot,
+            "width": self.width,
+            "is_paused": self.state.is_paused,
+            "preempt_count": self.preempt_count,
+            "submitted_at": self.submitted_at,
+            "started_at": self.started_at,
+        }
+
+
+class RunScheduler:
+    """
+    여러 학습/추론 작업을 동시에 실행하는 스케줄러.
+    - 동시 실행 수(슬롯)는 코어 수 / CPUS_PER_RUN으로 정하고, MAX_CONCURRENT_RUNS로 상한을 둘 수 있습니다.
+    - 새 작업은 빈 슬롯이 있고 여유 메모리가 MEMORY_PER_RUN_MB 이상일 때만 시작하며, 나머지는 우선순위 큐에서 대기합니다.
+      Unity 환경을 n_envs개 띄우는 학습(tsc)은 슬롯 n_envs개(코어/메모리 몫 n_envs배)를 차지하고, n_envs는 전체 슬롯 수로 제한합니다.
+      큐의 맨 앞 작업이 들어갈 자리가 날 때까지 뒤의 작업도 시작하지 않습니다. (우선순위 유지)
+    - 슬롯마다 CPU 코어 집합과 Unity worker_id(포트)가 고정되어 동시 실행 작업끼리 충돌하지 않습니다.
+    - 빈 슬롯이 없으면 더 낮은 우선순위의 학습을 선점합니다. (중지 → 체크포인트 저장 → 큐에 재등록 → 이어서 학습)
+      선점 시에는 모델과 리플레이 버퍼를 저장하고, 재시작할 때 둘 다 복원합니다. (저장에 실패한 워커는 비정상 종료 → FAILED)
+    - 워커가 완료 신호를 보내지 못하고 끝난 작업(비정상 종료, 선점 중 중지)은 스케줄러가 FAILED/STOPPED 신호를 보냅니다.
+    - POLICY_SERVER=1이면 test 작업의 추론은 전용 PolicyServer 프로세스가 맡아, 같은 모델을 쓰는 작업들의 관측을 묶어 추론합니다.
+      (첫 test 작업 때 띄우고, 워커에는 연결 정보만 넘김)
+    """
+    def __init__(self, metrics_hub: Optional[MetricsHub] = None):
+        self.metrics_hub = metrics_hub
+        cores = _usable_cores()
+        self.cpus_per_run = max(1, int(os.getenv("CPUS_PER_RUN", "2")))
+        self.memory_per_run_mb = int(os.getenv("MEMORY_PER_RUN_MB", "3072"))
+        n_slots = max(1, len(cores) // self.cpus_per_run)
+        max_runs = os.getenv("MAX_CONCURRENT_RUNS")
+        if max_runs:
+            n_slots = max(1, min(n_slots, int(max_runs)))
+
+        # 코어가 부족하면 슬롯끼리 코어를 나눠 씀
+        self.slot_cores: List[List[int]] = [
+            [cores[(i * self.cpus_per_run + j) % len(cores)] for j in range(self.cpus_per_run)]
+            for i in range(n_slots)
+        ]
+        self.slots: List[Optional[RunJob]] = [None] * n_slots
+        self.jobs: Dict[str, RunJob] = {}
+        self._queue: list = []
+        self._seq = itertools.count()
+        self._lock = threading.RLock()
+        self._policy_server: Optional[PolicyServerProcess] = None
+        print(f"[RunScheduler] 슬롯 {n_slots}개 (슬롯당 코어 {self.cpus_per_run}개, 메모리 {self.memory_per_run_mb}MB)")
+
+    # ---- 조회 ----
+    def get(self, run_id: str) -> Optional[RunJob]:
+        with self._lock:
+            return self.jobs.get(run_id)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "slots": len(self.slots),
+                "running": len({id(job) for job in self.slots if job is not None}),
+                "free_slots": sum(job is None for job in self.slots),
+                "queued": len(self._queue),
+                "available_memory_mb": _available_memory_mb(),
+                "event_bus": get_event_bus().stats(),
+                "jobs": [job.snapshot() for job in sorted(self.jobs.values(), key=RunJob.sort_key)],
+            }
+
+    # ---- 제출/취소 ----
+    def submit(self, kind: str, req: Union[TrainRequest, TestRequest], run_id: str) -> RunJob:
+        with self._lock:
+            if run_id in self.jobs:
+                raise RuntimeError("같은 ID의 작업이 이미 실행 중이거나 대기 중입니다.")
+            job = RunJob(kind, req, run_id, req.priority, next(self._seq))
+            job.width = self._job_width(kind, req)
+            self.jobs[run_id] = job
+            heapq.heappush(self._queue, (job.sort_key(), job))
+            self._schedule()
+            if job.status == QUEUED:
+                self._maybe_preempt(job)
+            return job
+
+    def cancel(self, job: RunJob) -> bool:
+        """대기 중인 작업을 큐에서 제거합니다. 이미 실행 중이면 False."""
+        with self._lock:
+            if job.status != QUEUED:
+                return False
+            self._queue = [(key, queued) for key, queued in self._queue if queued is not job]
+            heapq.heapify(self._queue)
+            self.jobs.pop(job.run_id, None)
+        self._notify_finished(job, "STOPPED")
+        return True
+
+    def request_stop(self, job: RunJob) -> bool:
+        """
+        실행 중인 작업에 사용자 중지를 표시합니다. STOPPED 작업은 워커가 종료되어도 다시 큐에 넣지 않고 선점 대상에서도 빠집니다.
+        실행 중(RUNNING/PREEMPTING)이 아니면 False.
+        """
+        with self._lock:
+            if job.status not in (RUNNING, PREEMPTING):
+                return False
+            if job.status == PREEMPTING:
+                job.stopped_while_preempting = True
+            job.status = STOPPED
+            return True
+
+    # ---- 내부 ----
+    def _job_width(self, kind: str, req: Union[TrainRequest, TestRequest]) -> int:
+        """작업이 차지할 슬롯 수. 슬롯 수보다 많은 n_envs는 슬롯 수로 줄여서 실행합니다."""
+        if kind != "train":
+            return 1
+        n_envs = req.n_envs()
+        if n_envs > len(self.slots):
+            print(f"[RunScheduler][WARN] n_envs={n_envs}가 슬롯 수({len(self.slots)})보다 많아 {len(self.slots)}로 줄입니다.")
+            n_envs = len(self.slots)
+            req.hyperparams["n_envs"] = n_envs
+        return n_envs
+
+    def _schedule(self) -> None:
+        while self._queue:
+            job = self._queue[0][1]
+            free = [i for i, running in enumerate(self.slots) if running is None]
+            if len(free) < job.width:
+                return
+            available = _available_memory_mb()
+            if available is not None and available < self.memory_per_run_mb * job.width and any(self.slots):
+                # 실행 중인 작업이 하나도 없으면 메모리와 관계없이 하나는 실행
+                print(f"[RunScheduler] 여유 메모리 부족 ({available}MB) - 대기 작업 {len(self._queue)}개")
+                return
+            heapq.heappop(self._queue)
+            self._launch(job, free[:job.width])
+
+    def _launch(self, job: RunJob, slot_ids: List[int]) -> None:
+        job.state.reset()
+        job.state.is_running = True
+        # Unity worker_id(포트)는 첫 슬롯 기준 (추가 환경은 env_factory가 ENV_WORKER_STRIDE 간격으로 띄움)
+        slot = slot_ids[0]
+        job.slot = slot
+        job.slot_ids = slot_ids
+        job.status = RUNNING
+        job.started_at = time.time()
+        cores = sorted({core for i in slot_ids for core in self.slot_cores[i]})
+        policy_server = self._policy_server_info() if job.kind == "test" else None
+        job.worker = RunProcess(job.kind, job.req, job.run_id, job.state,
+                                worker_id=slot, cores=cores, resume=job.resume,
+                                on_message=partial(self._on_worker_message, job),
+                                policy_server=policy_server)
+        job.worker.start()
+        for i in slot_ids:
+            self.slots[i] = job
+        print(f"[RunScheduler] {job.kind} 시작 (run_id: {job.run_id}, slot: {slot_ids}, resume: {job.resume})")
+        threading.Thread(target=self._watch, args=(job,), name=f"watch-{job.run_id}", daemon=True).start()
+
+    def _policy_server_info(self):
+        """POLICY_SERVER=1이면 PolicyServer 프로세스를 (없거나 죽었으면) 띄우고 연결 정보를 반환합니다."""
+        if not policy_server_enabled():
+            return None
+        if self._policy_server is None or not self._policy_server.is_alive():
+            server = PolicyServerProcess(loader=load_test_policy)
+            try:
+                server.start()
+            except Exception as e:
+                # 워커는 연결 정보가 없으면 모델을 직접 로드
+                print(f"[RunScheduler][WARN] PolicyServer 프로세스를 시작하지 못했습니다: {e}")
+                return None
+            self._policy_server = server
+        return self._policy_server.connect_info
+
+    def _on_worker_message(self, job: RunJob, command: str, value) -> None:
+        if command == "metrics" and self.metrics_hub is not None:
+            self.metrics_hub.publish(job.run_id, value)
+
+    def _maybe_preempt(self, job: RunJob) -> None:
+        """새 작업보다 우선순위가 낮은 학습 중 가장 낮은(같으면 가장 늦게 시작한) 작업을 선점합니다."""
+        if any(running is not None and running.status == PREEMPTING for running in self.slots):
+            # 이미 비워지고 있는 슬롯이 있으면 추가 선점하지 않음
+            return
+        candidates = [running for running in self.slots
+                      if running is not None and running.kind == "train" and running.status == RUNNING
+                      and running.priority < job.priority]
+        if not candidates:
+            return
+        victim = min(candidates, key=lambda running: (running.priority, -(running.started_at or 0)))
+        victim.status = PREEMPTING
+        victim.state.is_preempted = True
+        victim.state.set_stop(True)
+        print(f"[RunScheduler] run_id {victim.run_id}(우선순위 {victim.priority})를 선점합니다 -> {job.run_id}")
+
+    def _watch(self, job: RunJob) -> None:
+        exitcode = job.worker.join()
+        with self._lock:
+            for i in job.slot_ids:
+                self.slots[i] = None
+            job.worker = None
+            job.slot = None
+            job.slot_ids = []
+            if job.status == PREEMPTING and exitcode == 0:
+                # 체크포인트가 저장되었으므로 큐에 다시 넣고 이어서 학습
+                job.status = QUEUED
+                job.resume = True
+                job.preempt_count += 1
+                heapq.heappush(self._queue, (job.sort_key(), job))
+            else:
+                if exitcode != 0:
+                    print(f"[RunScheduler][ERROR] {job.kind} 워커가 비정상 종료되었습니다 (run_id: {job.run_id}, exitcode: {exitcode})")
+                self.jobs.pop(job.run_id, None)
+                if self.metrics_hub is not None:
+                    self.metrics_hub.close(job.run_id)
+            print(f"[RunScheduler] {job.kind} 워커 종료 (run_id: {job.run_id}, status: {job.status})")
+            self._schedule()
+            # 여러 슬롯이 필요한 작업은 선점 한 번으로 자리가 모자랄 수 있으므로 다음 선점을 이어서 진행
+            if self._queue:
+                self._maybe_preempt(self._queue[0][1])
+        status = self._unreported_status(job, exitcode)
+        if status is not None:
+            self._notify_finished(job, status)
+
+    @staticmethod
+    def _unreported_status(job: RunJob, exitcode: Optional[int]) -> Optional[str]:
+        """
+        워커가 완료 신호를 보내지 못한 채 스케줄러를 떠나는 작업의 상태. (보낼 필요가 없으면 None)
+        - 비정상 종료: 사용자가 중지한 작업이면 STOPPED, 아니면 FAILED (선점 중 체크포인트 저장 실패 포함)
+        - 선점 중에 중지: 워커는 선점으로 알고 완료 신호를 건너뛰므로 STOPPED
+        """
+        if job.status == QUEUED:
+            return None
+        if exitcode != 0:
+            return "STOPPED" if job.status == STOPPED else "FAILED"
+        if job.stopped_while_preempting:
+            return "STOPPED"
+        return None
+
+    def _notify_finished(self, job: RunJob, status: str) -> None:
+        """취소되거나 비정상 종료된 작업처럼 워커가 신호를 보내지 못한 작업의 완료 신호를 Node.js API 서버에 보냅니다."""
+        base_api_server_url = os.getenv("API_SERVER_URL")
+        if not base_api_server_url:
+            return
+        callback = "experiment-completed" if job.kind == "train" else "test-completed"
+        endpoint = f"{base_api_server_url}/callbacks/{job.run_id}/{callback}"
+        print(f"[RunScheduler] {job.kind} 완료 신호({status})를 보냅니다 (run_id: {job.run_id})")
+        get_event_bus().publish(endpoint, {"status": status}, droppable=False)
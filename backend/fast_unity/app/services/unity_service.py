@@ -4,168 +4,170 @@ from functools import partial
 import threading
 from fastapi import APIRouter, BackgroundTasks
 import json
+import time
+from typing import Optional, Tuple
 
-from unity.train.train_runner import run_training,test_model
+from app.services.metrics_hub import MetricsHub
+from app.services.run_scheduler import RunScheduler, RunJob, QUEUED
 #from unity.train.test_model import test_model
 #from rl.scripts.train_sb3_dqn import start_train
 from app.schemas.training import TrainRequest, TestRequest, SimSpeed
-from unity.train_util.training_state import UnityTrainingState, UnityInferenceState
-from unity.train_util.sentiment_feedback_wrapper import SentimentLLMFeedback
-from unity.train_util.sidechannel import RLSideChannel
+
+# 제어 명령이 워커에 반영되기를 기다리는 최대 시간(초)
+CONTROL_ACK_TIMEOUT = 10.0
 
 
 class UnityService:
     def __init__(self):
-        self.train_states = UnityTrainingState()
-        self.inference_states = UnityInferenceState()
-        # LLM 피드백 인스턴스를 run_id 별로 관리
-        self.llm_feedback_handlers: dict[str, SentimentLLMFeedback] = {}
-        self.side_channel = RLSideChannel()
-        self.current_run_id :str = None
- 
-    def finish_train_callback(self):
-        """학습 종료 시 호출되는 콜백. 관련 리소스를 정리합니다."""
-        if self.current_run_id and self.current_run_id in self.llm_feedback_handlers:
-            # 더 이상 사용하지 않는 LLM 핸들러를 메모리에서 제거
-            del self.llm_feedback_handlers[self.current_run_id]
-            print(f"[UnityService] LLM 핸들러를 정리했습니다 (run_id: {self.current_run_id})")
-
-        # 현재 실행 중인 실험 상태 초기화
-        self.current_run_id = None
-        self.train_states.reset()
-        print(f"[UnityService] 실험 상태 초기화 완료")
-        
+        # 학습/추론 작업은 스케줄러가 큐잉하고, 작업마다 전용 워커 프로세스/상태/사이드 채널로 실행합니다.
+        # 워커가 보낸 메트릭은 MetricsHub에 보관되어 /runs/{id}/metrics/stream으로 바로 스트리밍됩니다.
+        self.metrics_hub = MetricsHub()
+        self.scheduler = RunScheduler(metrics_hub=self.metrics_hub)
+
+    def _get_job(self, run_id: str) -> RunJob:
+        job = self.scheduler.get(run_id)
+        if job is None:
+            raise RuntimeError("요청한 ID와 일치하는 실행 중인 작업이 없습니다.")
+        return job
+
+    def _get_running_job(self, run_id: str) -> RunJob:
+        job = self._get_job(run_id)
+        if job.status == QUEUED or job.worker is None:
+            raise RuntimeError("요청한 작업이 아직 대기 중입니다.")
+        return job
+
+    def _send_command(self, job: RunJob, command: str, value: str = ""):
+        """작업의 워커 프로세스 사이드 채널로 명령을 전달합니다."""
+        worker = job.worker
+        if worker is None or not worker.send(command, value):
+            print(f"[UnityService][WARN] 워커에 '{command}' 명령을 전달하지 못했습니다. (run_id: {job.run_id})")
+
+    async def _measure_applied(self, job: RunJob, seq: int, started: float) -> Optional[float]:
+        """명령이 워커에 반영될 때까지 기다린 뒤, 명령 시점부터 걸린 시간(ms)을 반환합니다. 시간 초과면 None"""
+        loop = asyncio.get_running_loop()
+        applied = await loop.run_in_executor(None, job.state.wait_applied, seq, CONTROL_ACK_TIMEOUT)
+        if not applied:
+            print(f"[UnityService][WARN] {CONTROL_ACK_TIMEOUT}초 안에 명령이 반영되지 않았습니다. (run_id: {job.run_id})")
+            return None
+        return round((time.perf_counter() - started) * 1000, 3)
+
+    def is_active(self, run_id: str) -> bool:
+        """스케줄러에서 대기 중이거나 실행 중인 작업인지"""
+        return self.scheduler.get(run_id) is not None
+
+    def has_metrics(self, run_id: str) -> bool:
+        """메트릭 스트림을 구독할 수 있는 실행인지 (허브에 버퍼가 있거나 스케줄러에 작업이 있음)"""
+        return self.metrics_hub.has_run(run_id) or self.is_active(run_id)
+
+    def get_status(self) -> dict:
+        """스케줄러 슬롯/대기열 상태"""
+        return self.scheduler.snapshot()
+
     # 학습 시작
     async def start(self, req: TrainRequest, exeriment_id :str):
-        if self.train_states.is_running or self.current_run_id is not None:
-            raise RuntimeError("다른 학습이 이미 실행 중입니다.")
-        
-        if self.inference_states.is_running:
-            raise RuntimeError("모델 추론(테스트)이 실행 중이므로 학습을 시작할 수 없습니다.")
-
-        def unpause_simulation():
-            """LLM 피드백 처리 후 학습을 재개하는 콜백"""
-            if self.train_states.is_paused:
-                self.train_states.set_paused(False)
-
-        # 새 학습을 위한 LLM 핸들러 생성 및 등록
-        llm_handler = SentimentLLMFeedback(unpause_callback=unpause_simulation)
-        self.llm_feedback_handlers[exeriment_id] = llm_handler
-        self.current_run_id = exeriment_id
-        
-        
-        self.train_states.is_running =True
-        loop = asyncio.get_running_loop()
-        
-        task = partial(
-        run_training,
-        req, self.train_states, self.side_channel, self.current_run_id, self, llm_handler
-        )
-        loop.run_in_executor(None, task)
-        
-        
+        # 학습은 전용 워커 프로세스에서 실행 (API 이벤트 루프와 GIL을 공유하지 않음)
+        job = self.scheduler.submit("train", req, exeriment_id)
+        if job.status == QUEUED:
+            return "학습이 대기열에 추가되었습니다."
+        return "학습을 시작했습니다."
+
+
     # 유니티 빌드를 종료
-    async def stop(self, exeriment_id :str):
-        if self.current_run_id != exeriment_id:
-            raise RuntimeError("요청한 ID와 일치하는 실행 중인 작업이 없습니다.")
+    async def stop(self, exeriment_id :str) -> Tuple[str, Optional[float]]:
+        job = self._get_job(exeriment_id)
+        started = time.perf_counter()
+
+        # 0. 대기 중인 작업은 큐에서 제거
+        if self.scheduler.cancel(job):
+            return "대기 중인 작업을 취소했습니다.", 0.0
+
+        # 선점 중이던 작업도 워커 종료 후 다시 큐에 들어가지 않도록 스케줄러에 중지를 표시
+        stop_marked = self.scheduler.request_stop(job)
 
         # 1. 학습 중지 처리
-        if self.train_states.is_running or self.train_states.is_paused:
-            self.train_states.is_stopped = True
-            self.side_channel.send_command("stop", "")
-            print("학습이 중지되었습니다.")
-            # self.current_run_id는 finish_train_callback에서 정리됩니다.
-            return "학습 중지 신호를 보냈습니다."
+        if job.kind == "train" and (job.state.is_running or job.state.is_paused):
+            seq = job.state.set_stop(True)
+            self._send_command(job, "stop", "")
+            latency_ms = await self._measure_applied(job, seq, started)
+            print(f"학습이 중지되었습니다. ({latency_ms} ms)")
+            # 작업 정리는 스케줄러가 워커 종료 시 수행합니다.
+            return "학습 중지 신호를 보냈습니다.", latency_ms
         # 2. 추론(테스트) 중지 처리
-        elif self.inference_states.is_running:
-            self.inference_states.set_stop(True) # 스레드 안전한 메서드 사용
-            print("추론(테스트)이 중지되었습니다.")
-            return "추론(테스트) 중지 신호를 보냈습니다."
+        elif job.kind == "test" and job.state.is_running:
+            seq = job.state.set_stop(True)
+            latency_ms = await self._measure_applied(job, seq, started)
+            print(f"추론(테스트)이 중지되었습니다. ({latency_ms} ms)")
+            return "추론(테스트) 중지 신호를 보냈습니다.", latency_ms
+        # 선점으로 이미 종료 중인 작업 (워커 종료 후 스케줄러가 STOPPED 신호를 보냄)
+        elif stop_marked:
+            return "작업 중지 신호를 보냈습니다.", None
 
         raise RuntimeError("중지할 작업(학습 또는 테스트)이 실행 중이 아닙니다.")
 
     # 유니티 빌드를 일시정지
-    async def pause(self, exeriment_id :str):
-        if self.current_run_id != exeriment_id:
-            raise RuntimeError("요청한 ID와 일치하는 실행 중인 작업이 없습니다.")
-
-        if self.train_states.is_running and not self.train_states.is_paused:
-            self.train_states.set_paused(True)
-            print("학습이 일시정지되었습니다.")
-            return "학습을 일시정지했습니다."
-        elif self.inference_states.is_running and not self.inference_states.is_paused:
-            self.inference_states.set_paused(True)
-            print("추론(테스트)이 일시정지되었습니다.")
-            return "추론(테스트)을 일시정지했습니다."
+    async def pause(self, exeriment_id :str) -> Tuple[str, Optional[float]]:
+        job = self._get_running_job(exeriment_id)
+        started = time.perf_counter()
+
+        if job.state.is_running and not job.state.is_paused:
+            seq = job.state.set_paused(True)
+            # 워커가 다음 스텝 경계에서 실제로 멈출 때까지의 시간
+            latency_ms = await self._measure_applied(job, seq, started)
+            if job.kind == "train":
+                print(f"학습이 일시정지되었습니다. ({latency_ms} ms)")
+                return "학습을 일시정지했습니다.", latency_ms
+            print(f"추론(테스트)이 일시정지되었습니다. ({latency_ms} ms)")
+            return "추론(테스트)을 일시정지했습니다.", latency_ms
 
         raise RuntimeError("일시정지할 작업이 없거나 이미 일시정지 상태입니다.")
 
     # 유니티 빌드를 재개
-    async def resume(self,exeriment_id :str):
-        if self.current_run_id != exeriment_id:
-            raise RuntimeError("요청한 ID와 일치하는 실행 중인 작업이 없습니다.")
-
-        if self.train_states.is_running and self.train_states.is_paused:
-            self.train_states.set_paused(False)
-            self.side_channel.send_command("resume", "")
-            return "학습을 재개했습니다."
-        elif self.inference_states.is_running and self.inference_states.is_paused:
-            self.inference_states.set_paused(False)
-            return "추론(테스트)을 재개했습니다."
+    async def resume(self,exeriment_id :str) -> Tuple[str, Optional[float]]:
+        job = self._get_running_job(exeriment_id)
+        started = time.perf_counter()
+
+        if job.state.is_running and job.state.is_paused:
+            seq = job.state.set_paused(False)
+            if job.kind == "train":
+                self._send_command(job, "resume", "")
+            latency_ms = await self._measure_applied(job, seq, started)
+            if job.kind == "train":
+                return "학습을 재개했습니다.", latency_ms
+            return "추론(테스트)을 재개했습니다.", latency_ms
 
         raise RuntimeError("재개할 작업이 없거나 이미 실행 중인 상태입니다.")
 
     async def set_speed(self, exeriment_id:str ,sim_speed:SimSpeed):
-        if(self.current_run_id == exeriment_id):
-            if self.train_states.is_running :
-                msg_dict = sim_speed.model_dump()# 테스트 용.
-                msg = {"simSpeed": sim_speed.sim_speed}
-                msg = json.dumps(msg, ensure_ascii=False)
-                self.side_channel.send_command("simSpeed",msg)
+        job = self.scheduler.get(exeriment_id)
+        if job is not None and job.kind == "train" and job.state.is_running:
+            msg_dict = sim_speed.model_dump()# 테스트 용.
+            msg = {"simSpeed": sim_speed.sim_speed}
+            msg = json.dumps(msg, ensure_ascii=False)
+            self._send_command(job, "simSpeed",msg)
 
     # LLM 피드백 추가
     async def add_llm_feedback(self, run_id: str, message: str) -> bool:
-        if run_id != self.current_run_id or not self.train_states.is_running:
+        job = self.scheduler.get(run_id)
+        if job is None or job.kind != "train" or not job.state.is_running:
             raise RuntimeError("피드백을 전달할 학습 세션이 실행 중이 아닙니다.")
 
-        if not self.train_states.is_paused:
+        if not job.state.is_paused:
             raise RuntimeError("LLM 피드백은 학습이 '일시정지' 상태일 때만 가능합니다.")
 
-        handler = self.llm_feedback_handlers.get(run_id)
-        if not handler:
+        worker = job.worker
+        if worker is None:
             raise RuntimeError("해당 학습 세션의 LLM 피드백 핸들러를 찾을 수 없습니다.")
 
         print(f"[UnityService] LLM 피드백 수신 (run_id: {run_id}): '{message}'")
-        
-        # 비동기로 LLM API 호출 실행
-        loop = asyncio.get_running_loop()
-        success = await loop.run_in_executor(None, handler.AddMessage, message)
-        
-        return success
+
+        # 워커 프로세스의 LLM 핸들러로 전달 (워커가 메시지를 받으면 학습을 재개함)
+        return worker.send("feedback", message)
 
 #--------------------------------------
     #선택된 모델을 추론 평가 , 보상 정보등을 리턴해야하는데 ?
     async def inference_model(self, req :TestRequest, run_id: str):
-        if self.inference_states.is_running:
-            raise RuntimeError("다른 모델 추론(테스트)이 이미 실행 중입니다.")
-        
-        if self.train_states.is_running:
-            raise RuntimeError("학습이 실행 중이므로 모델 추론(테스트)을 시작할 수 없습니다.")
-
-        self.current_run_id = run_id
-        self.inference_states.is_running = True
-        loop = asyncio.get_running_loop()
-
-        def task_wrapper():
-            try:
-                test_model(req, self.inference_states, self.side_channel,run_id)
-            except Exception as e:
-                print(f"[inference_model][ERROR] 추론 중 예외 발생: {e}")
-            finally:
-                # 추론이 성공적으로 끝나거나 예외로 종료될 때 상태를 초기화합니다.
-                self.inference_states.is_running = False
-                self.current_run_id = None # 현재 실행 ID 초기화
-                print("추론(테스트)이 종료되었습니다.")
-
-        loop.run_in_executor(None, task_wrapper)
-        return "모델 추론(테스트)을 시작했습니다."
\ No newline at end of file
+        # 추론도 전용 워커 프로세스에서 실행되며, 학습과 동시에 실행될 수 있습니다.
+        job = self.scheduler.submit("test", req, run_id)
+        if job.status == QUEUED:
+            return "모델 추론(테스트)이 대기열에 추가되었습니다."
+        return "모델 추론(테스트)을 시작했습니다."
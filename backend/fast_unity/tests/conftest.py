@@ -0,0 +1,85 @@
+import os
+
+import gymnasium as gym
+import numpy as np
+import pytest
+from gymnasium import spaces
+from stable_baselines3 import DQN, PPO, SAC
+
+from unity.train_util.custom_extractor import AdvancedCombinedExtractorMultipleVectors
+from unity.train_util.custom_policy import DiffrentRLPolicy
+
+# protobuf C 확장과 mlagents 버전이 맞지 않는 환경에서도 import되도록
+os.environ.setdefault("PROTOCOL_BUFFERS_PYTHON_IMPLEMENTATION", "python")
+
+
+class FakeDictEnv(gym.Env):
+    """cnn_car와 같은 형태(이미지 + 벡터 2개)의 관측을 내는 Unity 없는 테스트용 환경"""
+
+    def __init__(self, episode_length: int = 30):
+        self.observation_space = spaces.Dict({
+            "obs_0": spaces.Box(0, 255, (84, 84, 3), np.uint8),
+            "obs_1": spaces.Box(-np.inf, np.inf, (8,), np.float32),
+            "obs_2": spaces.Box(-np.inf, np.inf, (5,), np.float32),
+        })
+        self.action_space = spaces.Discrete(18)
+        self.episode_length = episode_length
+        self.t = 0
+
+    def reset(self, *, seed=None, options=None):
+        super().reset(seed=seed)
+        self.t = 0
+        return self.observation_space.sample(), {}
+
+    def step(self, action):
+        self.t += 1
+        return self.observation_space.sample(), float(np.random.rand()), self.t >= self.episode_length, False, {}
+
+
+class FakeFlatEnv(gym.Env):
+    """use_dict_obs=False인 MLAgentsGymWrapper처럼 벡터 센서 2개((8,), (5,))를 이어 붙인 관측을 내는 환경"""
+
+    def __init__(self, action_space: gym.Space):
+        self.observation_space = spaces.Box(-np.inf, np.inf, (13,), np.float32)
+        self.action_space = action_space
+
+    def reset(self, *, seed=None, options=None):
+        super().reset(seed=seed)
+        return self.observation_space.sample(), {}
+
+    def step(self, action):
+        return self.observation_space.sample(), 0.0, False, False, {}
+
+
+SRL_POLICY_KWARGS = dict(
+    features_extractor_class=AdvancedCombinedExtractorMultipleVectors,
+    features_extractor_kwargs=dict(cnn_output_dim=128),
+    net_arch=[256, 128],
+)
+
+# 내보내기/로드 테스트가 함께 쓰는 작은 모델들 (이름 → 학습하지 않은 모델을 만드는 함수)
+MODEL_ZOO = {
+    # Box 관측
+    "dqn_box": lambda: DQN("MlpPolicy", gym.make("CartPole-v1"), buffer_size=100, policy_kwargs=dict(net_arch=[32])),
+    "ppo_box_gaussian": lambda: PPO("MlpPolicy", gym.make("Pendulum-v1"), n_steps=64, policy_kwargs=dict(net_arch=[32])),
+    "sac_box": lambda: SAC("MlpPolicy", gym.make("Pendulum-v1"), buffer_size=100, policy_kwargs=dict(net_arch=[32])),
+    # 벡터 센서를 이어 붙인 Box 관측 (평탄화 이산 행동 / [-1, 1] 연속 행동)
+    "dqn_flat": lambda: DQN("MlpPolicy", FakeFlatEnv(spaces.Discrete(12)), buffer_size=100,
+                            policy_kwargs=dict(net_arch=[32])),
+    "sac_flat": lambda: SAC("MlpPolicy", FakeFlatEnv(spaces.Box(-1, 1, (2,), np.float32)), buffer_size=100,
+                            policy_kwargs=dict(net_arch=[32])),
+    # Dict 관측 (cnn_car 형태: 이미지 + 벡터 2개)
+    "srl_dict": lambda: DQN(DiffrentRLPolicy, FakeDictEnv(), buffer_size=100, policy_kwargs=SRL_POLICY_KWARGS),
+    "ppo_dict_logits": lambda: PPO("MultiInputPolicy", FakeDictEnv(), n_steps=64, policy_kwargs=dict(net_arch=[32])),
+}
+
+
+@pytest.fixture(params=sorted(MODEL_ZOO))
+def zoo_name(request):
+    """MODEL_ZOO의 모델 이름. 일부 모델만 쓰는 테스트는 @pytest.mark.parametrize("zoo_name", [...])로 덮어씀"""
+    return request.param
+
+
+@pytest.fixture
+def zoo_model(zoo_name):
+    return MODEL_ZOO[zoo_name]()
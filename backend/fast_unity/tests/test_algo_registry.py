@@ -0,0 +1,37 @@
+import pytest
+import torch as th
+from stable_baselines3 import DQN
+
+from conftest import FakeDictEnv
+from unity.train.algo_registry import load_model
+from unity.train_util.custom_extractor import AdvancedCombinedExtractorMultipleVectors
+from unity.train_util.custom_policy import DiffrentRLPolicy
+
+
+def _srl_model(env, **optimizer_kwargs):
+    policy_kwargs = dict(
+        features_extractor_class=AdvancedCombinedExtractorMultipleVectors,
+        features_extractor_kwargs=dict(cnn_output_dim=128),
+        net_arch=[256, 128],
+        optimizer_kwargs=optimizer_kwargs,
+    )
+    return DQN(DiffrentRLPolicy, env, buffer_size=100, learning_starts=10, batch_size=4, policy_kwargs=policy_kwargs)
+
+
+@pytest.mark.parametrize("optimizer_kwargs, n_groups", [({"cnn_lr": 0.000005}, 2), ({}, 1)])
+def test_load_model_keeps_saved_optimizer_groups(tmp_path, monkeypatch, optimizer_kwargs, n_groups):
+    monkeypatch.chdir(tmp_path)
+    env = FakeDictEnv()
+    model = _srl_model(env, **optimizer_kwargs)
+    model.learn(20)
+    model.save(tmp_path / "models" / "student")
+
+    # .policy.zip/.onnx가 없으므로 전체 체크포인트(옵티마이저 포함)를 로드
+    loaded = load_model("student", DQN, env, allow_onnx=False)
+
+    groups = loaded.policy.optimizer.param_groups
+    assert len(groups) == n_groups
+    if n_groups == 2:
+        assert [(g["name"], g["lr"]) for g in groups][0] == ("cnn", 0.000005)
+    for saved, restored in zip(model.policy.state_dict().values(), loaded.policy.state_dict().values()):
+        assert th.equal(saved.cpu(), restored.cpu())
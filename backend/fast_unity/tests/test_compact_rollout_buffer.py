@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+import torch as th
+from stable_baselines3 import PPO
+from stable_baselines3.common.buffers import DictRolloutBuffer
+
+from conftest import FakeDictEnv
+from unity.train_util.compact_rollout_buffer import CompactDictRolloutBuffer, compact_rollout_buffer_class
+from unity.train_util.custom_extractor import AdvancedCombinedExtractorMultipleVectors
+
+_installed_reset = DictRolloutBuffer.reset
+
+
+def _float32_observation_reset(self):
+    """SB3 2.6의 DictRolloutBuffer.reset처럼 모든 관측 키를 float32로 할당"""
+    _installed_reset(self)
+    self.observations = {k: v.astype(np.float32) for k, v in self.observations.items()}
+
+
+@pytest.fixture
+def sb3_26_parent(monkeypatch):
+    monkeypatch.setattr(DictRolloutBuffer, "reset", _float32_observation_reset)
+
+
+def _fill(buffer, env, n_steps, seed=0):
+    rng = np.random.default_rng(seed)
+    env.observation_space.seed(seed)
+    observations = []
+    for _ in range(n_steps):
+        obs = {k: v[None] for k, v in env.observation_space.sample().items()}
+        observations.append(obs)
+        buffer.add(obs, np.array([[rng.integers(18)]]), np.array([rng.random()], dtype=np.float32),
+                   np.array([False]), th.zeros(1), th.zeros(1))
+    buffer.compute_returns_and_advantage(th.zeros(1), np.array([False]))
+    return observations
+
+
+def test_installed_sb3_uses_the_compact_buffer_only_when_it_stores_float32():
+    env = FakeDictEnv()
+    parent = DictRolloutBuffer(4, env.observation_space, env.action_space, device="cpu")
+    expected = None if parent.observations["obs_0"].dtype == np.uint8 else CompactDictRolloutBuffer
+    assert compact_rollout_buffer_class() is expected
+
+
+def test_images_are_stored_as_uint8_and_round_trip_exactly(sb3_26_parent):
+    assert compact_rollout_buffer_class() is CompactDictRolloutBuffer
+    env = FakeDictEnv()
+    parent = DictRolloutBuffer(32, env.observation_space, env.action_space, device="cpu")
+    compact = CompactDictRolloutBuffer(32, env.observation_space, env.action_space, device="cpu")
+    observations = _fill(compact, env, 32)
+
+    assert compact.image_keys == {"obs_0"}
+    assert parent.observations["obs_0"].dtype == np.float32
+    assert compact.observations["obs_0"].dtype == np.uint8
+    # 이미지 키 메모리는 부모 버퍼의 1/4, 나머지 키와 행동은 부모와 같은 dtype
+    assert compact.observations["obs_0"].nbytes * 4 == parent.observations["obs_0"].nbytes
+    assert compact.observations["obs_1"].dtype == parent.observations["obs_1"].dtype
+    assert compact.actions.dtype == parent.actions.dtype
+
+    # get()은 섞어서 꺼내므로, 평탄화한 뒤 저장 순서대로 다시 꺼내 비교
+    next(compact.get(batch_size=None))
+    samples = compact._get_samples(np.arange(32))
+    assert samples.observations["obs_0"].dtype == th.uint8
+    for key in env.observation_space.spaces:
+        expected = np.concatenate([obs[key] for obs in observations])
+        np.testing.assert_array_equal(samples.observations[key].numpy(), expected)
+
+
+def test_ppo_trains_with_the_compact_buffer(sb3_26_parent):
+    model = PPO("MultiInputPolicy", FakeDictEnv(), n_steps=32, batch_size=16, n_epochs=1,
+                rollout_buffer_class=CompactDictRolloutBuffer,
+                policy_kwargs=dict(features_extractor_class=AdvancedCombinedExtractorMultipleVectors,
+                                   features_extractor_kwargs=dict(cnn_output_dim=32), net_arch=[32]))
+    before = [p.detach().clone() for p in model.policy.parameters()]
+    model.learn(64)
+
+    assert isinstance(model.rollout_buffer, CompactDictRolloutBuffer)
+    assert model.rollout_buffer.observations["obs_0"].dtype == np.uint8
+    assert any(not th.equal(b, a) for b, a in zip(before, model.policy.parameters()))
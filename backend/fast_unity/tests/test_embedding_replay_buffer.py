@@ -0,0 +1,125 @@
+import pickle
+
+import numpy as np
+import pytest
+import torch as th
+from stable_baselines3 import DQN
+from stable_baselines3.common.preprocessing import preprocess_obs
+
+from conftest import FakeDictEnv
+from unity.train.algo_registry import ALGORITHM_REGISTRY
+from unity.train_util.custom_extractor import IMAGE_KEY, AdvancedCombinedExtractorMultipleVectors
+from unity.train_util.custom_policy import DiffrentRLPolicy
+from unity.train_util.dup_replay_buffer import FeedbackPatchMixin
+from unity.train_util.embedding_replay_buffer import EmbeddingDictReplayBuffer
+
+
+class CountingEncoder:
+    """이미지 배치를 채널별 평균 3개 + 0으로 채운 임베딩으로 바꾸고 호출 횟수를 셈"""
+
+    def __init__(self, dim=8):
+        self.dim = dim
+        self.calls = 0
+
+    def __call__(self, images):
+        self.calls += 1
+        embedding = np.zeros((len(images), self.dim), dtype=np.float32)
+        embedding[:, :3] = images.reshape(len(images), images.shape[1], -1).mean(axis=-1)
+        return embedding
+
+
+def _chw_space():
+    env = FakeDictEnv()
+    space = env.observation_space
+    image = space[IMAGE_KEY]
+    space.spaces[IMAGE_KEY] = type(image)(0, 255, (3, 84, 84), np.uint8)
+    return space, env.action_space
+
+
+def _obs(space, rng):
+    space.seed(int(rng.integers(1 << 31)))
+    return {k: v[None] for k, v in space.sample().items()}
+
+
+def test_feedback_patch_mixin_requires_transition_arrays():
+    class Incomplete(FeedbackPatchMixin):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_buffer_stores_and_samples_embeddings():
+    space, action_space = _chw_space()
+    encoder = CountingEncoder()
+    buffer = EmbeddingDictReplayBuffer(50, space, action_space, device="cpu", embedding_dim=encoder.dim)
+    buffer.set_encoder(encoder)
+    rng = np.random.default_rng(0)
+
+    obs = _obs(space, rng)
+    images = []
+    for step in range(20):
+        next_obs = _obs(space, rng)
+        images.append(obs[IMAGE_KEY][0])
+        buffer.add(obs, next_obs, np.array([[step % 18]]), np.array([float(step)]), np.array([False]), [{}])
+        obs = next_obs
+
+    # 이미지 대신 임베딩 크기의 float32 벡터만 저장
+    assert buffer.observations[IMAGE_KEY].shape == (50, 1, encoder.dim)
+    assert buffer.observations[IMAGE_KEY].dtype == np.float32
+    # 직전 next_obs의 임베딩을 재사용하므로 전이당 encoder 호출 1회 (+ 첫 obs)
+    assert encoder.calls == 21
+
+    samples = buffer.sample(10)
+    assert samples.observations[IMAGE_KEY].shape == (10, encoder.dim)
+    assert samples.next_observations[IMAGE_KEY].shape == (10, encoder.dim)
+    for reward, embedding in zip(samples.rewards[:, 0].numpy(), samples.observations[IMAGE_KEY].numpy()):
+        image = images[int(reward)]
+        np.testing.assert_allclose(embedding[:3], image.reshape(3, -1).mean(axis=-1), rtol=1e-5)
+    assert samples.observations["obs_1"].shape == (10, 8)
+
+
+def test_buffer_without_encoder_raises():
+    space, action_space = _chw_space()
+    buffer = EmbeddingDictReplayBuffer(10, space, action_space, device="cpu", embedding_dim=8)
+    rng = np.random.default_rng(0)
+    with pytest.raises(RuntimeError):
+        buffer.add(_obs(space, rng), _obs(space, rng), np.array([[0]]), np.array([0.0]), np.array([False]), [{}])
+
+
+def test_pickled_buffer_drops_the_encoder():
+    space, action_space = _chw_space()
+    buffer = EmbeddingDictReplayBuffer(10, space, action_space, device="cpu", embedding_dim=8)
+    buffer.set_encoder(lambda images: np.zeros((len(images), 8), dtype=np.float32))
+    rng = np.random.default_rng(0)
+    buffer.add(_obs(space, rng), _obs(space, rng), np.array([[0]]), np.array([0.0]), np.array([False]), [{}])
+
+    restored = pickle.loads(pickle.dumps(buffer))
+    assert restored.encoder is None and restored.size() == 1
+
+
+def test_cached_embeddings_give_the_same_q_values_as_images():
+    env = FakeDictEnv()
+    adapter = ALGORITHM_REGISTRY["srl"]
+    buffer_class, buffer_kwargs = adapter._replay_buffer_setup({"cache_cnn_embedding": "true"}, cnn_output_dim=128)
+    model = DQN(DiffrentRLPolicy, env, buffer_size=100, learning_starts=10, batch_size=8,
+                replay_buffer_class=buffer_class, replay_buffer_kwargs=buffer_kwargs,
+                policy_kwargs=dict(features_extractor_class=AdvancedCombinedExtractorMultipleVectors,
+                                   features_extractor_kwargs=dict(cnn_output_dim=128), net_arch=[64]))
+    adapter._freeze_cnn_and_cache(model)
+    model.learn(30)
+
+    buffer = model.replay_buffer
+    assert isinstance(buffer, EmbeddingDictReplayBuffer)
+    assert buffer.observations[IMAGE_KEY].shape[-1] == 128
+
+    # 같은 관측을 이미지로 넣은 Q값과 캐시된 임베딩으로 넣은 Q값이 같음
+    obs = {k: v[None] for k, v in model.observation_space.sample().items()}
+    policy = model.policy
+    with th.no_grad():
+        obs_tensor, _ = policy.obs_to_tensor(obs)
+        q_from_image = policy.q_net(obs_tensor)
+        image = preprocess_obs(obs_tensor[IMAGE_KEY], model.observation_space[IMAGE_KEY])
+        embedded = dict(obs_tensor, **{IMAGE_KEY: policy.q_net.features_extractor.encode_image(image)})
+        q_from_embedding = policy.q_net(embedded)
+    th.testing.assert_close(q_from_embedding, q_from_image)
@@ -0,0 +1,126 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+from unity.train_util.event_bus import EventBus
+
+
+class FlakyServer:
+    """처음 fail_first번은 503, 그 뒤로는 200을 돌려주는 로컬 HTTP 서버"""
+
+    def __init__(self, fail_first: int, status: int = 503, delay: float = 0.0):
+        self.fail_first = fail_first
+        self.status = status
+        self.delay = delay
+        self.requests = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers["Content-Length"]))
+                time.sleep(server.delay)
+                server.requests.append((time.monotonic(), json.loads(body)))
+                code = server.status if len(server.requests) <= server.fail_first else 200
+                self.send_response(code)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = HTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}/events"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def test_retries_with_backoff_until_the_server_recovers():
+    bus = EventBus(backoff=0.05, max_backoff=0.5)
+    with FlakyServer(fail_first=2) as server:
+        bus.publish(server.url, {"step": 1}, droppable=False)
+        assert bus.flush(timeout=5.0)
+
+    assert [payload for _, payload in server.requests] == [{"step": 1}] * 3
+    assert bus.stats() == {
+        "queue_depth": 0, "sent": 1, "dropped": 0, "coalesced": 0, "failed": 0, "retried": 2,
+    }
+    # 재시도 간격은 지수적으로 늘어남 (0.05초 → 0.1초)
+    first, second, third = (t for t, _ in server.requests)
+    assert second - first >= 0.05
+    assert third - second >= 0.1
+
+
+def test_gives_up_after_max_retries():
+    bus = EventBus(backoff=0.01)
+    with FlakyServer(fail_first=10) as server:
+        bus.publish(server.url, {"step": 1}, max_retries=1)
+        assert bus.flush(timeout=5.0)
+
+    assert len(server.requests) == 2
+    stats = bus.stats()
+    assert stats["failed"] == 1 and stats["sent"] == 0 and stats["retried"] == 1
+
+
+@pytest.mark.parametrize("status", [400, 404])
+def test_client_errors_are_not_retried(status):
+    bus = EventBus(backoff=0.01)
+    with FlakyServer(fail_first=10, status=status) as server:
+        bus.publish(server.url, {"step": 1}, droppable=False)
+        assert bus.flush(timeout=5.0)
+
+    assert len(server.requests) == 1
+    assert bus.stats()["failed"] == 1 and bus.stats()["retried"] == 0
+
+
+def test_completion_events_jump_ahead_of_queued_metrics():
+    bus = EventBus(backoff=0.01)
+    with FlakyServer(fail_first=0, delay=0.1) as server:
+        bus.publish(server.url + "/a", {"metric": 0})
+        time.sleep(0.05)  # 첫 메트릭이 전송 중인 동안 나머지가 큐에 쌓임
+        for endpoint in ("b", "c", "d"):
+            bus.publish(f"{server.url}/{endpoint}", {"metric": endpoint})
+        bus.publish(server.url, {"status": "COMPLETED"}, droppable=False)
+        assert bus.flush(timeout=5.0)
+
+    payloads = [payload for _, payload in server.requests]
+    assert payloads[:2] == [{"metric": 0}, {"status": "COMPLETED"}]
+    assert len(payloads) == 5
+
+
+def test_queued_metrics_are_coalesced_per_endpoint():
+    bus = EventBus(backoff=0.01)
+    with FlakyServer(fail_first=0, delay=0.1) as server:
+        bus.publish(server.url, {"step": 0})
+        time.sleep(0.05)
+        for step in range(1, 6):
+            bus.publish(server.url, {"step": step})
+        assert bus.flush(timeout=5.0)
+
+    assert [payload for _, payload in server.requests] == [{"step": 0}, {"step": 5}]
+    assert bus.stats()["coalesced"] == 4
+
+
+def test_close_skips_metrics_and_abandons_their_retries():
+    bus = EventBus(backoff=5.0)
+    with FlakyServer(fail_first=1) as server:
+        bus.publish(server.url, {"step": 1})
+        time.sleep(0.1)  # 첫 시도가 실패하고 5초 백오프에 들어감
+        bus.publish(server.url + "/metrics", {"step": 2})
+        start = time.monotonic()
+        bus.publish(server.url, {"status": "COMPLETED"}, droppable=False)
+        assert bus.close(timeout=5.0)
+        assert time.monotonic() - start < 1.0
+
+    assert [payload for _, payload in server.requests] == [{"step": 1}, {"status": "COMPLETED"}]
+    stats = bus.stats()
+    assert stats["sent"] == 1 and stats["dropped"] == 2 and stats["failed"] == 0
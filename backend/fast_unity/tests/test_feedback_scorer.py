@@ -0,0 +1,121 @@
+import multiprocessing
+import os
+
+import pytest
+
+from unity.train_util.feedback_scorer import (
+    CachedFeedbackScorer,
+    ChainedFeedbackScorer,
+    FeedbackScorer,
+    LexiconFeedbackScorer,
+)
+
+
+class FakeRemote(FeedbackScorer):
+    name = "llm"
+
+    def __init__(self, value=0.5):
+        self.value = value
+        self.calls = []
+
+    def score(self, message, action_description):
+        self.calls.append((message, action_description))
+        return self.value
+
+
+@pytest.mark.parametrize("message", ["I know", "nothing happened", "now turn left", "자브레이크", "nonstop"])
+def test_lexicon_matches_whole_tokens_only(message):
+    assert LexiconFeedbackScorer().score(message) is None
+
+
+@pytest.mark.parametrize("message, expected", [
+    ("no", 0.75),
+    ("Stop!", 0.75),
+    ("브레이크를 늦게 밟았어", 0.7),
+    ("좋아요", 0.1),
+    ("안좋아", 0.8),
+    ("not bad", 0.35),
+])
+def test_lexicon_scores_single_polarity(message, expected):
+    assert LexiconFeedbackScorer().score(message) == pytest.approx(expected)
+
+
+@pytest.mark.parametrize("message", ["good, but too fast", "잘했는데 너무 빨라", "nice... no wait, stop"])
+def test_mixed_messages_fall_through_to_the_llm(message, tmp_path):
+    remote = FakeRemote(0.6)
+    scorer = ChainedFeedbackScorer(cache=CachedFeedbackScorer(str(tmp_path / "cache.json")),
+                                   local=[LexiconFeedbackScorer()], remote=remote)
+    assert scorer.score_local(message, "accelerate") is None
+    assert scorer.score(message, "accelerate") == 0.6
+    assert remote.calls == [(message, "accelerate")]
+
+
+class ActionAwareRemote(FeedbackScorer):
+    """감속 지시는 제동 중이면 긍정, 가속 중이면 부정으로 채점하는 LLM 대역"""
+    name = "llm"
+
+    def score(self, message, action_description):
+        return 0.1 if "제동" in action_description else 0.8
+
+
+@pytest.mark.parametrize("message", ["천천히", "속도 줄여", "감속해", "브레이크", "slow down", "brake earlier"])
+def test_speed_commands_are_scored_against_the_action(message, tmp_path):
+    scorer = ChainedFeedbackScorer(cache=CachedFeedbackScorer(str(tmp_path / "cache.json")),
+                                   local=[LexiconFeedbackScorer()], remote=ActionAwareRemote())
+    assert scorer.score_local(message, "직진하며 강하게 제동합니다.") is None
+
+    assert scorer.score(message, "직진하며 강하게 제동합니다.") == 0.1
+    assert scorer.score(message, "직진하며 강하게 가속합니다.") == 0.8
+    assert scorer.score_local(message, "직진하며 강하게 제동합니다.") == 0.1 and scorer.last_source == "cache"
+
+
+def test_cache_key_includes_action_description(tmp_path):
+    path = str(tmp_path / "cache.json")
+    remote = FakeRemote(0.1)
+    scorer = ChainedFeedbackScorer(cache=CachedFeedbackScorer(path), remote=remote)
+    assert scorer.score("천천히", "감속") == 0.1
+
+    remote.value = 0.8
+    assert scorer.score("천천히", "가속") == 0.8
+    assert scorer.score("천천히!", "감속") == 0.1 and scorer.last_source == "cache"
+    assert len(remote.calls) == 2
+    scorer.close()
+
+    reloaded = CachedFeedbackScorer(path)
+    assert reloaded.score("천천히", "감속") == 0.1 and reloaded.score("천천히", "가속") == 0.8
+    assert reloaded.score("천천히") is None
+
+
+def test_cache_save_merges_entries_from_other_processes(tmp_path):
+    path = str(tmp_path / "cache.json")
+    first, second = CachedFeedbackScorer(path), CachedFeedbackScorer(path)
+    first.put("좋아", "가속", 0.1)
+    second.put("별로", "감속", 0.7)
+    first.save()
+    second.save()
+
+    reloaded = CachedFeedbackScorer(path)
+    assert reloaded.score("좋아", "가속") == 0.1 and reloaded.score("별로", "감속") == 0.7
+    # 저장하면서 다른 프로세스의 항목도 읽어 옴
+    assert second.score("좋아", "가속") == 0.1
+
+
+def _put_many(path, worker):
+    scorer = CachedFeedbackScorer(path, save_interval=0.0)
+    for i in range(50):
+        scorer.put(f"message {worker} {i}", "가속", 0.5)
+    scorer.save()
+
+
+def test_concurrent_saves_keep_every_entry(tmp_path):
+    path = str(tmp_path / "cache.json")
+    ctx = multiprocessing.get_context("spawn")
+    workers = [ctx.Process(target=_put_many, args=(path, w)) for w in range(4)]
+    for p in workers:
+        p.start()
+    for p in workers:
+        p.join(timeout=60)
+        assert p.exitcode == 0
+
+    assert len(CachedFeedbackScorer(path)) == 200
+    assert sorted(os.listdir(tmp_path)) == ["cache.json", "cache.json.lock"]
@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+
+from conftest import FakeDictEnv
+from unity.train_util.feedback_wrapper import (
+    FeedbackTables,
+    TeacherFeedbackWrapper,
+    action_distance,
+    action_map,
+    cnt_for_fb,
+    to_feedback,
+)
+
+
+def old_feedback(student, teacher, step, weighted_map, thresholds, total_timesteps, warmup_end_step):
+    """표 도입 전 TeacherFeedbackWrapper.step이 스텝마다 하던 계산"""
+    dist = action_distance(student, teacher, weighted_map)
+    fb = to_feedback(dist, *thresholds)
+    steps_since_warmup = max(0, step - warmup_end_step)
+    total_remaining_steps = max(1, total_timesteps - step)
+    return fb, cnt_for_fb(fb, steps_since_warmup, total_remaining_steps)
+
+
+@pytest.mark.parametrize("total_timesteps, warmup_end_step", [(3000, 150), (1000, 0), (500, 500)])
+def test_cnt_schedule_matches_cnt_for_fb_at_every_step(total_timesteps, warmup_end_step):
+    tables = FeedbackTables(action_map, (0.1, 0.4), total_timesteps, warmup_end_step)
+    for fb in (-1, 0, 1):
+        for step in range(warmup_end_step, total_timesteps + 10):
+            expected = cnt_for_fb(fb, max(0, step - warmup_end_step), max(1, total_timesteps - step))
+            assert tables.cnt(fb, step) == expected, (fb, step)
+
+
+@pytest.mark.parametrize("thresholds", [(0.1, 0.4), (0.05, 0.6)])
+def test_lookup_matches_old_per_step_computation_for_every_action_pair(thresholds):
+    weighted_map = {k: (x * 2, y, p * 0.5) for k, (x, y, p) in action_map.items()}
+    tables = FeedbackTables(weighted_map, thresholds, 2000, 100)
+    n_actions = len(action_map)
+    for student in range(n_actions):
+        for teacher in range(n_actions):
+            for step in (100, 700, 1500, 1999, 2500):
+                expected = old_feedback(student, teacher, step, weighted_map, thresholds, 2000, 100)
+                assert tables.lookup(student, teacher, step) == expected
+
+
+def test_lookup_batch_matches_lookup():
+    tables = FeedbackTables(action_map, (0.1, 0.4), 5000, 250)
+    rng = np.random.default_rng(0)
+    students = rng.integers(0, 18, size=256)
+    teachers = rng.integers(0, 18, size=256)
+    steps = rng.integers(250, 5000, size=256)
+
+    fb, cnt = tables.lookup_batch(students, teachers, steps)
+    expected = [tables.lookup(int(s), int(t), int(n)) for s, t, n in zip(students, teachers, steps)]
+    assert fb.tolist() == [e[0] for e in expected]
+    assert cnt.tolist() == [e[1] for e in expected]
+
+
+def test_wrapper_steps_match_old_computation_after_weight_change():
+    rng = np.random.default_rng(1)
+    teacher_actions = iter(rng.integers(0, 18, size=400).tolist())
+    env = TeacherFeedbackWrapper(FakeDictEnv(), teacher=lambda obs: next(teacher_actions),
+                                 total_timesteps=400, warmup_fraction=0.1, verbose=0)
+    env.reset(seed=0)
+
+    # 절반쯤에서 가중치를 바꾸면 표를 다시 만들어야 함
+    for step in range(1, 400):
+        if step == 200:
+            env.wx = 3
+            env.neu_th = 0.3
+        student = int(rng.integers(0, 18))
+        teacher_actions, peek = _peek(teacher_actions)
+        _, _, terminated, truncated, _ = env.step(student)
+        if terminated or truncated:
+            env.reset()
+
+        row = env.step_feedback
+        if step < env.warmup_end_step:
+            assert bool(row.is_warmup[0])
+            continue
+        expected = old_feedback(student, peek, step, env.weighted_map, (env.pos_th, env.neu_th), 400, env.warmup_end_step)
+        assert (int(row.feedback[0]), int(row.cnt[0])) == expected
+    assert env.tables.distance[0, 7] == action_distance(0, 7, {k: (x * 3, y, p) for k, (x, y, p) in action_map.items()})
+
+
+def _peek(iterator):
+    value = next(iterator)
+
+    def chained():
+        yield value
+        yield from iterator
+    return chained(), value
@@ -0,0 +1,50 @@
+from types import SimpleNamespace
+
+import numpy as np
+
+from unity.train_util import logger_callback
+from unity.train_util.logger_callback import EpisodeLogCallback
+from unity.train_util.step_feedback import StepFeedbackTable
+
+
+class FakeWriter:
+    def __init__(self, save_dir, append=False):
+        self.rows = []
+
+    def add(self, **row):
+        self.rows.append(row)
+
+    def close(self):
+        pass
+
+
+def test_feedback_counts_per_episode(monkeypatch, tmp_path):
+    table = StepFeedbackTable(3)
+    monkeypatch.setattr(logger_callback, "EpisodeLogWriter", FakeWriter)
+    monkeypatch.setattr(logger_callback, "attach_step_feedback", lambda venv: table)
+    callback = EpisodeLogCallback(str(tmp_path))
+    callback.init_callback(SimpleNamespace(get_env=lambda: SimpleNamespace(num_envs=3), num_timesteps=0))
+    callback.on_training_start({}, {})
+
+    # (feedback, valid) 스텝별 값. 마지막 스텝에 0번/2번 환경의 에피소드가 끝남
+    steps = [
+        ([1, -1, 0], [True, True, True]),
+        ([1, 1, -1], [True, False, True]),
+        ([-1, 0, 0], [True, True, False]),
+    ]
+    for i, (feedback, valid) in enumerate(steps):
+        table.feedback[:] = feedback
+        table.valid[:] = valid
+        done = i == len(steps) - 1
+        callback.update_locals({
+            "dones": np.array([done, False, done]),
+            "infos": [{"episode": {"r": 1.0, "l": 3}} if done else {} for _ in range(3)],
+        })
+        callback.on_step()
+
+    rows = {row["env_index"]: row for row in callback.log_writer.rows}
+    assert sorted(rows) == [0, 2]
+    assert (rows[0]["feedback_pos"], rows[0]["feedback_neg"], rows[0]["feedback_neutral"]) == (2, 1, 0)
+    assert (rows[2]["feedback_pos"], rows[2]["feedback_neg"], rows[2]["feedback_neutral"]) == (0, 1, 1)
+    # 끝난 환경은 0으로 초기화, 진행 중인 1번 환경은 계속 누적 (부정 1, 중립 1)
+    assert callback._feedback_counts.tolist() == [[0, 0, 0], [0, 1, 1], [0, 0, 0]]
@@ -0,0 +1,32 @@
+from unity.train_util.metric_store import MetricStore
+
+
+def test_points_at_one_step_beyond_chunk_size_are_kept(tmp_path):
+    path = str(tmp_path / "metrics.sqlite")
+    store = MetricStore(path, chunk_size=8)
+    # 일시정지 중처럼 같은 스텝에 여러 번 기록 → 가득 찬 청크와 다음 청크의 first_step이 같음
+    for i in range(30):
+        store.append(100, {"train/loss": float(i)}, wall=1000.0 + i)
+    store.append(101, {"train/loss": 30.0}, wall=1030.0)
+    store.close()
+
+    reader = MetricStore(path, readonly=True)
+    series = reader.query(["train/loss"], max_points=0)["train/loss"]
+    reader.close()
+    assert series["total"] == 31
+    assert series["value"] == [float(i) for i in range(31)]
+    assert series["step"] == [100] * 30 + [101]
+
+
+def test_resume_appends_after_existing_chunks(tmp_path):
+    path = str(tmp_path / "metrics.sqlite")
+    store = MetricStore(path, chunk_size=4)
+    for i in range(6):
+        store.append(10, {"a": i})
+    store.close()
+
+    store = MetricStore(path, chunk_size=4)
+    for i in range(6, 10):
+        store.append(10, {"a": i})
+    assert store.query(["a"], max_points=0)["a"]["value"] == [float(i) for i in range(10)]
+    store.close()
@@ -0,0 +1,46 @@
+import asyncio
+
+from app.services.metrics_hub import MetricsHub
+
+
+def _collect(hub, run_id, is_active=None, last_event_id=0, timeout=2.0):
+    async def run():
+        return [event async for event in hub.subscribe(run_id, last_event_id, heartbeat=0.05, is_active=is_active)]
+    return asyncio.run(asyncio.wait_for(run(), timeout))
+
+
+def test_unknown_run_ends_immediately():
+    assert _collect(MetricsHub(), "missing") == []
+
+
+def test_evicted_run_ends_instead_of_heartbeating():
+    hub = MetricsHub(max_closed_runs=1)
+    for run_id in ("old", "new"):
+        hub.publish(run_id, {"step": 1})
+        hub.close(run_id)
+    assert not hub.has_run("old")
+    assert _collect(hub, "old", last_event_id=1) == []
+
+
+def test_active_run_waits_until_it_stops_being_active():
+    hub = MetricsHub()
+    active = {"queued": True}
+    ticks = []
+
+    def is_active():
+        ticks.append(1)
+        if len(ticks) > 3:
+            active["queued"] = False
+        return active["queued"]
+
+    # 대기 중인 동안은 keep-alive(None)를 내보내고, 메트릭 없이 끝나면 스트림 종료
+    events = _collect(hub, "queued", is_active=is_active)
+    assert events and all(event is None for event in events)
+
+
+def test_closed_run_replays_buffer_then_ends():
+    hub = MetricsHub()
+    hub.publish("run", {"step": 1})
+    hub.publish("run", {"step": 2})
+    hub.close("run")
+    assert [event.id for event in _collect(hub, "run")] == [1, 2]
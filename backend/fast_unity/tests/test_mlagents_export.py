@@ -0,0 +1,79 @@
+import numpy as np
+import onnx
+import onnxruntime as ort
+import pytest
+
+from conftest import MODEL_ZOO
+from unity.train_util.mlagents_export import (
+    ACTION_MASKS,
+    DETERMINISTIC_DISCRETE_ACTIONS,
+    MLAGENTS_OPSET,
+    MLAGENTS_OUTPUT_NAMES,
+    export_mlagents_onnx,
+    mlagents_onnx_path_for,
+    validate_mlagents_onnx,
+)
+
+# Unity 센서 형태(이미지는 (H,W,C))와 이산 브랜치: MLAgentsGymWrapper.obs_shapes / branches에 해당
+DICT_OBS_SHAPES = [(84, 84, 3), (8,), (5,)]
+FLAT_OBS_SHAPES = [(8,), (5,)]
+SENSORS = {
+    "srl_dict": (DICT_OBS_SHAPES, [3, 6]),
+    "ppo_dict_logits": (DICT_OBS_SHAPES, [18]),
+    "dqn_flat": (FLAT_OBS_SHAPES, [2, 3, 2]),
+    "sac_flat": (FLAT_OBS_SHAPES, [5, 3]),  # Box 행동을 브랜치별 구간으로 나눔
+}
+unity_models = pytest.mark.parametrize("zoo_name", sorted(SENSORS))
+
+
+@pytest.fixture
+def exported(zoo_name, zoo_model, tmp_path):
+    obs_shapes, branches = SENSORS[zoo_name]
+    path = export_mlagents_onnx(zoo_model, str(tmp_path / "model.zip"), obs_shapes, branches, verify=False)
+    assert path == mlagents_onnx_path_for(str(tmp_path / "model.zip"))
+    return zoo_model, path, obs_shapes, branches
+
+
+@unity_models
+def test_exported_graph_has_the_mlagents_interface(exported):
+    model, path, obs_shapes, branches = exported
+    graph = onnx.load(path)
+    assert max(o.version for o in graph.opset_import if o.domain in ("", "ai.onnx")) <= MLAGENTS_OPSET
+    session = ort.InferenceSession(path, providers=["CPUExecutionProvider"])
+    assert [i.name for i in session.get_inputs()] == [f"obs_{i}" for i in range(len(obs_shapes))] + [ACTION_MASKS]
+    assert [o.name for o in session.get_outputs()] == MLAGENTS_OUTPUT_NAMES
+
+
+@unity_models
+def test_validator_accepts_export_and_matches_sb3_actions(exported):
+    model, path, obs_shapes, branches = exported
+    report = validate_mlagents_onnx(path, obs_shapes, branches, model=model)
+    assert report["ok"], report["errors"]
+    assert report["action_agreement"] == 1.0
+
+
+def test_masked_branch_value_is_never_chosen(tmp_path):
+    obs_shapes, branches = SENSORS["dqn_flat"]
+    path = export_mlagents_onnx(MODEL_ZOO["dqn_flat"](), str(tmp_path / "model.zip"), obs_shapes, branches, verify=False)
+    session = ort.InferenceSession(path, providers=["CPUExecutionProvider"])
+    rng = np.random.default_rng(0)
+    feed = {"obs_0": rng.standard_normal((32, 8)).astype(np.float32),
+            "obs_1": rng.standard_normal((32, 5)).astype(np.float32)}
+    masks = np.ones((32, sum(branches)), dtype=np.float32)
+    masks[:, 2 + 1] = 0.0  # 두 번째 브랜치의 값 1 금지
+    actions = session.run([DETERMINISTIC_DISCRETE_ACTIONS], {**feed, ACTION_MASKS: masks})[0]
+    assert not np.any(actions[:, 1] == 1)
+
+
+def test_export_rejects_branches_that_do_not_match_the_action_space(tmp_path):
+    obs_shapes, _ = SENSORS["dqn_flat"]
+    assert export_mlagents_onnx(MODEL_ZOO["dqn_flat"](), str(tmp_path / "model.zip"), obs_shapes, [3, 3]) is None
+    assert not (tmp_path / "model.mlagents.onnx").exists()
+
+
+@unity_models
+def test_validator_reports_wrong_sensor_shapes(exported):
+    model, path, obs_shapes, branches = exported
+    wrong = [tuple(s) + (1,) if len(s) == 1 else s for s in obs_shapes]
+    report = validate_mlagents_onnx(path, wrong, branches)
+    assert not report["ok"] and report["errors"]
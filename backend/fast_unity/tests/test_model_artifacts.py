@@ -0,0 +1,57 @@
+import asyncio
+import os
+
+import gymnasium as gym
+import pytest
+from stable_baselines3 import DQN
+
+from app.api.routes import artifact
+from unity.train_util.onnx_policy import export_onnx, load_onnx_policy
+from unity.train_util.slim_policy import load_slim_policy, save_slim_policy
+
+SIDECARS = [".zip", ".policy.zip", ".onnx", ".onnx.json", ".int8.onnx", ".int8.onnx.json",
+            ".int8.onnx.0.tmp", ".int8.onnx.0.tmp.json", ".mlagents.onnx", ".obs.npz", ".replay.pkl"]
+
+
+@pytest.fixture
+def cartpole_model(tmp_path, monkeypatch):
+    monkeypatch.setenv("INFERENCE_BACKEND", "onnx")
+    monkeypatch.setenv("INFERENCE_PRECISION", "fp32")
+    env = gym.make("CartPole-v1")
+    model = DQN("MlpPolicy", env, buffer_size=100, policy_kwargs=dict(net_arch=[16]))
+    path = str(tmp_path / "cartpole.zip")
+    model.save(path)
+    assert export_onnx(model, path) is not None
+    assert save_slim_policy(model, path) is not None
+    return env, path
+
+
+def test_loaders_use_sidecars_of_existing_model(cartpole_model):
+    env, path = cartpole_model
+    assert load_onnx_policy(path, env.observation_space, env.action_space) is not None
+    assert load_slim_policy(path, env.observation_space, env.action_space) is not None
+
+
+def test_loaders_ignore_sidecars_of_deleted_model(cartpole_model):
+    env, path = cartpole_model
+    # 체크포인트만 지워진 경우: 남은 사이드카를 최신으로 보지 않음
+    os.remove(path)
+    assert load_onnx_policy(path, env.observation_space, env.action_space) is None
+    assert load_slim_policy(path, env.observation_space, env.action_space) is None
+
+
+def test_delete_artifacts_removes_every_sidecar(tmp_path, monkeypatch):
+    models, logs = tmp_path / "models", tmp_path / "train_logs"
+    models.mkdir()
+    (logs / "run").mkdir(parents=True)
+    monkeypatch.setattr(artifact, "MODELS_PATH", models)
+    monkeypatch.setattr(artifact, "LOGS_PATH", logs)
+    for suffix in SIDECARS:
+        (models / f"run{suffix}").write_bytes(b"x")
+    (models / "other.onnx").write_bytes(b"x")
+
+    result = asyncio.run(artifact.delete_artifacts({"run_name": "run"}))
+
+    assert sorted(p.name for p in models.iterdir()) == ["other.onnx"]
+    assert not (logs / "run").exists()
+    assert len(result["deleted_items"]) == len(SIDECARS) + 1
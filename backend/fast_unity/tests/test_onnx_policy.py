@@ -0,0 +1,55 @@
+import gymnasium as gym
+import numpy as np
+import pytest
+
+from unity.train_util.onnx_policy import (
+    OnnxPolicy,
+    check_onnx_parity,
+    export_onnx,
+    policy_kind,
+    policy_outputs,
+    sample_observations,
+)
+
+
+@pytest.fixture
+def exported(zoo_model, tmp_path):
+    path = export_onnx(zoo_model, str(tmp_path / "model.zip"), verify=False)
+    assert path is not None
+    return zoo_model, OnnxPolicy(path, zoo_model.observation_space, zoo_model.action_space)
+
+
+def test_onnx_outputs_match_torch(exported):
+    model, onnx_policy = exported
+    obs = sample_observations(model.observation_space, 64, seed=1)
+
+    torch_outputs = policy_outputs(model, policy_kind(model), obs)
+    onnx_outputs, _ = onnx_policy.forward(obs)
+    assert len(onnx_outputs) == len(torch_outputs)
+    for torch_out, onnx_out in zip(torch_outputs, onnx_outputs):
+        np.testing.assert_allclose(onnx_out, torch_out, atol=1e-4, rtol=1e-3)
+
+    torch_actions, _ = model.predict(obs, deterministic=True)
+    onnx_actions, _ = onnx_policy.predict(obs, deterministic=True)
+    assert onnx_actions.shape == torch_actions.shape
+    if isinstance(model.action_space, gym.spaces.Box):
+        np.testing.assert_allclose(onnx_actions, torch_actions, atol=1e-3)
+    else:
+        assert (onnx_actions == torch_actions).all()
+
+
+def test_single_observation_predict_matches_torch(exported):
+    model, onnx_policy = exported
+    obs = sample_observations(model.observation_space, 1, seed=2)
+    obs = {k: v[0] for k, v in obs.items()} if isinstance(obs, dict) else obs[0]
+
+    torch_action, _ = model.predict(obs, deterministic=True)
+    onnx_action, _ = onnx_policy.predict(obs, deterministic=True)
+    np.testing.assert_allclose(np.asarray(onnx_action, dtype=np.float64), np.asarray(torch_action, dtype=np.float64),
+                               atol=1e-3)
+
+
+def test_parity_check_reports_agreement(exported):
+    model, onnx_policy = exported
+    report = check_onnx_parity(model, onnx_policy, n_samples=64)
+    assert report["ok"] and report["action_agreement"] == 1.0 and report["max_abs_diff"] < 1e-4
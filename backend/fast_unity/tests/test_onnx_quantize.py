@@ -0,0 +1,111 @@
+import json
+import os
+
+import gymnasium as gym
+import numpy as np
+import pytest
+from stable_baselines3 import DQN, PPO
+
+from conftest import FakeDictEnv
+from unity.train_util import onnx_quantize
+from unity.train_util.onnx_policy import sample_observations, export_onnx, quantized_onnx_path_for
+from unity.train_util.onnx_quantize import (
+    load_observation_set,
+    observation_set_path_for,
+    quantize_policy,
+    record_observations,
+    save_observation_set,
+)
+
+
+@pytest.fixture
+def exported(tmp_path):
+    model = DQN("MlpPolicy", gym.make("CartPole-v1"), buffer_size=100, policy_kwargs=dict(net_arch=[64, 64]))
+    model_path = str(tmp_path / "model.zip")
+    assert export_onnx(model, model_path, verify=False) is not None
+    return model, model_path, sample_observations(model.observation_space, 64, seed=0)
+
+
+def _quantize(model, model_path, observations, **kwargs):
+    return quantize_policy(model_path, model.observation_space, model.action_space, observations,
+                           n_latency_iters=5, **kwargs)
+
+
+def _leftovers(tmp_path):
+    return sorted(p.name for p in tmp_path.iterdir() if ".tmp" in p.name)
+
+
+def test_accepted_model_is_written_with_its_report(exported, tmp_path):
+    model, model_path, observations = exported
+    report = _quantize(model, model_path, observations, min_agreement=0.0, min_speedup=0.0)
+
+    assert report["accepted"] and report["errors"] == []
+    assert report["n_observations"] == 64 and 0.0 <= report["agreement"] <= 1.0
+    int8_path = quantized_onnx_path_for(model_path)
+    assert os.path.exists(int8_path)
+    with open(int8_path + ".json", encoding="utf-8") as f:
+        assert json.load(f)["quantization"]["agreement"] == report["agreement"]
+    assert _leftovers(tmp_path) == []
+
+
+@pytest.mark.parametrize("gate", [dict(min_agreement=1.01, min_speedup=0.0), dict(min_agreement=0.0, min_speedup=1e9)])
+def test_model_failing_a_gate_is_rejected(exported, tmp_path, gate):
+    model, model_path, observations = exported
+    report = _quantize(model, model_path, observations, **gate)
+
+    assert not report["accepted"]
+    assert not os.path.exists(quantized_onnx_path_for(model_path))
+    assert _leftovers(tmp_path) == []
+
+
+def test_candidate_failures_are_reported(exported, tmp_path, monkeypatch):
+    model, model_path, observations = exported
+    real_quantize = onnx_quantize.quantize_dynamic
+
+    def quantize_without_conv_support(fp32_path, path, op_types_to_quantize, **kwargs):
+        if "Conv" in op_types_to_quantize:
+            raise ValueError("Conv 미지원")
+        real_quantize(fp32_path, path, op_types_to_quantize=op_types_to_quantize, **kwargs)
+
+    monkeypatch.setattr(onnx_quantize, "quantize_dynamic", quantize_without_conv_support)
+    report = _quantize(model, model_path, observations, min_agreement=0.0, min_speedup=0.0)
+
+    assert report["accepted"] and report["quantized_ops"] == ["MatMul", "Gemm"]
+    assert report["errors"] == [{"quantized_ops": ["MatMul", "Gemm", "Conv"], "error": "ValueError: Conv 미지원"}]
+    with open(quantized_onnx_path_for(model_path) + ".json", encoding="utf-8") as f:
+        assert json.load(f)["quantization"]["errors"] == report["errors"]
+    assert _leftovers(tmp_path) == []
+
+
+def test_all_candidates_failing_is_an_error(exported, tmp_path, monkeypatch):
+    model, model_path, observations = exported
+
+    def broken(*args, **kwargs):
+        raise RuntimeError("깨진 그래프")
+
+    monkeypatch.setattr(onnx_quantize, "quantize_dynamic", broken)
+    report = _quantize(model, model_path, observations)
+
+    assert not report["accepted"]
+    assert len(report["errors"]) == 2 and "깨진 그래프" in report["error"]
+    assert _leftovers(tmp_path) == []
+
+
+def test_missing_fp32_model_is_an_error(tmp_path):
+    env = gym.make("CartPole-v1")
+    report = quantize_policy(str(tmp_path / "model.zip"), env.observation_space, env.action_space, np.zeros((1, 4)))
+    assert not report["accepted"] and "export_onnx" in report["error"]
+
+
+def test_recorded_observations_round_trip(tmp_path):
+    model = PPO("MultiInputPolicy", FakeDictEnv(), n_steps=32, batch_size=32, n_epochs=1, policy_kwargs=dict(net_arch=[16]))
+    model.learn(32)
+    observations = record_observations(model, n=16)
+    # VecTransposeImage를 거친 정책 입력 형태(C, H, W)로 기록
+    assert {k: v.shape for k, v in observations.items()} == {"obs_0": (16, 3, 84, 84), "obs_1": (16, 8), "obs_2": (16, 5)}
+    assert observations["obs_0"].dtype == np.uint8
+
+    path = observation_set_path_for(str(tmp_path / "model.zip"))
+    save_observation_set(path, observations)
+    loaded = load_observation_set(path)
+    assert all(np.array_equal(loaded[k], v) for k, v in observations.items())
@@ -0,0 +1,170 @@
+import multiprocessing
+import threading
+import time
+
+import numpy as np
+import pytest
+from gymnasium import spaces
+
+from unity.train_util.policy_server import (
+    PolicyEndpoint,
+    PolicyServer,
+    PolicyServerProcess,
+    RemotePolicy,
+    policy_server_main,
+)
+
+
+class CountingModel:
+    """관측 합을 행동으로 돌려주고 predict 한 번에 들어온 배치 크기를 기록하는 모델"""
+
+    def __init__(self):
+        self.observation_space = spaces.Box(-1.0, 1.0, (4,), np.float32)
+        self.action_space = spaces.Discrete(100)
+        self.batch_sizes = []
+        self.lock = threading.Lock()
+
+    def predict(self, observation, state=None, episode_start=None, deterministic=False):
+        observation = np.asarray(observation)
+        with self.lock:
+            self.batch_sizes.append(len(observation) if observation.ndim == 2 else 1)
+        time.sleep(0.002)
+        return observation.sum(axis=-1).astype(np.int64), state
+
+
+def load_counting_model(name, observation_space, action_space):
+    """PolicyServerProcess에 spawn으로 넘기는 모듈 수준 loader"""
+    if name == "missing":
+        return None
+    return CountingModel()
+
+
+def _start_in_thread(loader):
+    """policy_server_main을 스레드로 실행해 loader가 돌려준 모델을 테스트에서 볼 수 있게 함"""
+    ready, child_ready = multiprocessing.Pipe(duplex=False)
+    authkey = b"test"
+    threading.Thread(target=policy_server_main, args=(child_ready, authkey, loader, 32, 20.0), daemon=True).start()
+    return ready.recv(), authkey
+
+
+def _worker(connect_info, model, n_steps, barrier, results, index):
+    """test 워커 역할: test_model의 스텝 루프"""
+    remote = RemotePolicy(*connect_info, open_timeout=10, predict_timeout=10)
+    remote.open(("dqn", "model"), "model", model.observation_space, model.action_space)
+    barrier.wait()
+    ok = True
+    for step in range(n_steps):
+        observation = np.full(4, index + step, dtype=np.float32)
+        action, _ = remote.predict(observation, deterministic=True)
+        ok &= int(action) == 4 * (index + step)
+    remote.close()
+    results[index] = ok
+
+
+def test_remote_sessions_are_batched_across_workers():
+    n_workers, n_steps = 6, 40
+    model = CountingModel()
+    loads = []
+    connect_info = _start_in_thread(lambda name, obs_space, act_space: loads.append(name) or model)
+    barrier = threading.Barrier(n_workers)
+    results = [None] * n_workers
+    threads = [threading.Thread(target=_worker, args=(connect_info, model, n_steps, barrier, results, index))
+               for index in range(n_workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(30)
+
+    assert results == [True] * n_workers
+    # 모델은 한 번만 로드되고, 여러 워커의 요청이 한 번의 predict로 묶임
+    assert loads == ["model"]
+    batch_sizes = model.batch_sizes
+    assert sum(batch_sizes) == n_workers * n_steps
+    assert max(batch_sizes) == n_workers
+    assert np.mean(batch_sizes) > 2
+
+
+def test_server_process_serves_workers_and_reports_load_errors():
+    server = PolicyServerProcess(load_counting_model)
+    server.start()
+    try:
+        model = CountingModel()
+        remote = RemotePolicy(*server.connect_info, open_timeout=30, predict_timeout=10)
+        remote.open(("dqn", "model"), "model", model.observation_space, model.action_space)
+        action, _ = remote.predict(np.ones(4, dtype=np.float32), deterministic=True)
+        assert int(action) == 4
+        remote.close()
+
+        with pytest.raises(RuntimeError, match="모델을 로드할 수 없습니다"):
+            remote.open(("dqn", "missing"), "missing", model.observation_space, model.action_space)
+    finally:
+        server.stop()
+    assert not server.is_alive()
+
+
+def test_slow_load_does_not_block_other_models():
+    server = PolicyServer()
+    release, loads = threading.Event(), []
+
+    def slow_loader():
+        loads.append("slow")
+        release.wait(10)
+        return CountingModel()
+
+    clients = []
+    threads = [threading.Thread(target=lambda: clients.append(server.client("slow", slow_loader))) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.05)
+
+    # 다른 키의 모델은 느린 로드가 끝나기 전에 바로 열림
+    fast = server.client("fast", CountingModel)
+    assert fast.predict(np.ones(4, dtype=np.float32))[0] == 4
+    assert len(clients) == 0
+
+    release.set()
+    for thread in threads:
+        thread.join(10)
+    assert loads == ["slow"] and len(clients) == 2
+    assert clients[0]._entry is clients[1]._entry
+    for client in clients + [fast]:
+        client.close()
+    assert server.stats() == {}
+
+
+def test_failed_load_is_raised_to_every_waiting_session():
+    server = PolicyServer()
+    started = threading.Event()
+
+    def failing_loader():
+        started.set()
+        time.sleep(0.05)
+        raise OSError("broken checkpoint")
+
+    errors = []
+
+    def open_session():
+        try:
+            server.client("broken", failing_loader)
+        except OSError as e:
+            errors.append(str(e))
+
+    threads = [threading.Thread(target=open_session) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    assert errors == ["broken checkpoint"] * 3
+    # 실패한 키는 남지 않으므로 다음 세션이 다시 로드할 수 있음
+    assert server.client("broken", CountingModel).predict(np.ones(4, dtype=np.float32))[0] == 4
+
+
+def test_endpoint_reports_errors_to_the_worker():
+    replies = []
+    server = PolicyServer()
+    endpoint = PolicyEndpoint(server, loader=lambda *load_args: None, reply=replies.append)
+
+    assert endpoint.handle("policy_predict", (np.zeros(4), True))
+    assert endpoint.handle("policy_open", ("missing", (None, None)))
+    assert not endpoint.handle("metrics", {})
+    assert [status for status, _ in replies] == ["error", "error"]
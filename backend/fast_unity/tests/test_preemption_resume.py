@@ -0,0 +1,84 @@
+import os
+
+import gymnasium as gym
+import pytest
+from stable_baselines3 import DQN
+
+from unity.train.train_runner import restore_replay_buffer
+from unity.train_util.onnx_policy import onnx_path_for
+from unity.train_util.slim_policy import slim_path_for
+from unity.train_util.training_state import PauseResumeCallback, UnityTrainingState, replay_buffer_path_for
+
+
+def _train(path, preempted: bool):
+    state = UnityTrainingState()
+    state.is_preempted = preempted
+    model = DQN("MlpPolicy", gym.make("CartPole-v1"), buffer_size=500, learning_starts=100,
+                policy_kwargs=dict(net_arch=[16]))
+    model.learn(200, callback=PauseResumeCallback(state, None, save_path=path, run_id=None))
+    return model
+
+
+def _resume(path):
+    model = DQN("MlpPolicy", gym.make("CartPole-v1"), buffer_size=500, learning_starts=100,
+                policy_kwargs=dict(net_arch=[16]))
+    model.set_parameters(path)
+    model.num_timesteps = 200
+    return model
+
+
+def test_preemption_saves_replay_buffer_and_skips_exports(tmp_path):
+    path = str(tmp_path / "run.zip")
+    _train(path, preempted=True)
+
+    assert os.path.exists(path) and os.path.exists(replay_buffer_path_for(path))
+    assert not os.path.exists(slim_path_for(path)) and not os.path.exists(onnx_path_for(path))
+
+
+def test_resume_restores_the_saved_replay_buffer(tmp_path):
+    path = str(tmp_path / "run.zip")
+    trained = _train(path, preempted=True)
+
+    model = _resume(path)
+    assert restore_replay_buffer(model, path)
+    assert model.replay_buffer.size() == trained.replay_buffer.size() == 200
+    assert (model.replay_buffer.observations == trained.replay_buffer.observations).all()
+    assert model.learning_starts == 100
+    assert not os.path.exists(replay_buffer_path_for(path))
+
+
+def test_resume_without_buffer_postpones_learning_starts(tmp_path):
+    path = str(tmp_path / "run.zip")
+    _train(path, preempted=True)
+    os.remove(replay_buffer_path_for(path))
+
+    model = _resume(path)
+    assert not restore_replay_buffer(model, path)
+    assert model.learning_starts == 300
+
+
+def test_finished_run_exports_and_removes_stale_buffer(tmp_path):
+    path = str(tmp_path / "run.zip")
+    _train(path, preempted=True)
+    _train(path, preempted=False)
+
+    assert os.path.exists(slim_path_for(path)) and os.path.exists(onnx_path_for(path))
+    assert not os.path.exists(replay_buffer_path_for(path))
+
+
+def _disk_full(self, path, *args, **kwargs):
+    raise OSError("디스크 가득 참")
+
+
+@pytest.mark.parametrize("broken", ["save", "save_replay_buffer"])
+def test_preempted_run_fails_when_the_checkpoint_is_not_saved(tmp_path, monkeypatch, broken):
+    # 워커가 비정상 종료해야 스케줄러가 체크포인트 없이 다시 큐에 넣지 않음
+    monkeypatch.setattr(DQN, broken, _disk_full)
+    with pytest.raises(RuntimeError) as excinfo:
+        _train(str(tmp_path / "run.zip"), preempted=True)
+    assert isinstance(excinfo.value.__cause__, OSError)
+
+
+def test_finished_run_survives_a_failed_save(tmp_path, monkeypatch):
+    monkeypatch.setattr(DQN, "save", _disk_full)
+    _train(str(tmp_path / "run.zip"), preempted=False)
@@ -0,0 +1,216 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from app.schemas.training import TrainRequest
+from app.services import run_scheduler
+from app.services.run_scheduler import PREEMPTING, QUEUED, RUNNING, STOPPED, RunScheduler
+
+
+class FakeRunProcess:
+    """워커 프로세스 대신 finish()가 호출될 때까지 join()이 블로킹되는 가짜 워커"""
+    instances = {}
+
+    def __init__(self, kind, req, run_id, state, worker_id=0, cores=None, resume=False, on_message=None,
+                 policy_server=None):
+        self.run_id = run_id
+        self.policy_server = policy_server
+        self.resume = resume
+        self.cores = cores
+        self._done = threading.Event()
+        self._exitcode = 0
+        self.sent = []
+        FakeRunProcess.instances.setdefault(run_id, []).append(self)
+
+    def start(self):
+        pass
+
+    def send(self, command, value=""):
+        self.sent.append((command, value))
+        return True
+
+    def join(self, timeout=None):
+        self._done.wait(timeout)
+        return self._exitcode
+
+    def finish(self, exitcode=0):
+        self._exitcode = exitcode
+        self._done.set()
+
+
+def _wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "시간 초과"
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def scheduler(monkeypatch):
+    FakeRunProcess.instances = {}
+    monkeypatch.setattr(run_scheduler, "RunProcess", FakeRunProcess)
+    monkeypatch.setattr(run_scheduler, "_available_memory_mb", lambda: None)
+    monkeypatch.setenv("MAX_CONCURRENT_RUNS", "1")
+    sched = RunScheduler()
+    sched.notified = []
+    monkeypatch.setattr(sched, "_notify_finished", lambda job, status: sched.notified.append((job.run_id, status)))
+    return sched
+
+
+def _train(priority=0, algorithm="ppo", **hyperparams):
+    return TrainRequest(model_name="m", algorithm=algorithm, env_name="env", total_timesteps=100,
+                        hyperparams=hyperparams, priority=priority)
+
+
+def _preempt(sched):
+    low = sched.submit("train", _train(0), "low")
+    high = sched.submit("train", _train(5), "high")
+    assert low.status == PREEMPTING and high.status == QUEUED
+    assert low.state.is_stopped and low.state.is_preempted
+    return low, high
+
+
+def test_preempted_job_is_requeued_with_resume(scheduler):
+    low, high = _preempt(scheduler)
+    FakeRunProcess.instances["low"][0].finish(0)
+
+    _wait_for(lambda: high.status == RUNNING)
+    assert low.status == QUEUED and low.resume and low.preempt_count == 1
+    assert scheduler.get("low") is low
+    assert scheduler.notified == []
+
+
+def test_stop_during_preempt_is_not_requeued(scheduler):
+    low, high = _preempt(scheduler)
+    assert scheduler.request_stop(low)
+    assert low.status == STOPPED
+    FakeRunProcess.instances["low"][0].finish(0)
+
+    _wait_for(lambda: high.status == RUNNING)
+    assert scheduler.get("low") is None
+    assert len(FakeRunProcess.instances["low"]) == 1
+    # 선점된 워커는 완료 신호를 보내지 않으므로 스케줄러가 STOPPED 신호를 보냄
+    assert scheduler.notified == [("low", "STOPPED")]
+
+
+def test_preempted_job_that_fails_to_checkpoint_is_not_requeued(scheduler):
+    low, high = _preempt(scheduler)
+    FakeRunProcess.instances["low"][0].finish(1)
+
+    _wait_for(lambda: high.status == RUNNING)
+    assert scheduler.get("low") is None and not low.resume
+    assert len(FakeRunProcess.instances["low"]) == 1
+    assert scheduler.notified == [("low", "FAILED")]
+
+
+@pytest.mark.parametrize("stop, expected", [(False, "FAILED"), (True, "STOPPED")])
+def test_crashed_worker_is_reported(scheduler, stop, expected):
+    job = scheduler.submit("train", _train(0), "run")
+    if stop:
+        scheduler.request_stop(job)
+    FakeRunProcess.instances["run"][0].finish(1)
+
+    _wait_for(lambda: scheduler.get("run") is None)
+    _wait_for(lambda: scheduler.notified)
+    assert scheduler.notified == [("run", expected)]
+
+
+def test_stopped_job_is_not_preempted(scheduler):
+    low = scheduler.submit("train", _train(0), "low")
+    assert scheduler.request_stop(low)
+    high = scheduler.submit("train", _train(5), "high")
+    assert low.status == STOPPED and not low.state.is_preempted and high.status == QUEUED
+
+    FakeRunProcess.instances["low"][0].finish(0)
+    _wait_for(lambda: high.status == RUNNING)
+    assert scheduler.get("low") is None
+    # 사용자 중지는 워커(PauseResumeCallback)가 STOPPED 신호를 보냄
+    assert scheduler.notified == []
+
+
+class FakePolicyServerProcess:
+    started = 0
+
+    def __init__(self, loader):
+        self.loader = loader
+        self.alive = False
+        self.connect_info = None
+
+    def start(self):
+        FakePolicyServerProcess.started += 1
+        self.alive = True
+        self.connect_info = (f"address-{FakePolicyServerProcess.started}", b"key")
+
+    def is_alive(self):
+        return self.alive
+
+
+def test_test_jobs_connect_to_one_policy_server_process(scheduler, monkeypatch):
+    monkeypatch.setenv("POLICY_SERVER", "1")
+    FakePolicyServerProcess.started = 0
+    monkeypatch.setattr(run_scheduler, "PolicyServerProcess", FakePolicyServerProcess)
+    monkeypatch.setattr(run_scheduler, "_usable_cores", lambda: list(range(6)))
+    monkeypatch.setenv("MAX_CONCURRENT_RUNS", "3")
+    sched = RunScheduler()
+    sched._notify_finished = lambda job, status: None
+
+    sched.submit("test", SimpleNamespace(priority=0, algorithm="dqn", model_name="m"), "a")
+    sched.submit("test", SimpleNamespace(priority=0, algorithm="dqn", model_name="m"), "b")
+    sched.submit("train", _train(0), "train")
+
+    # test 작업들은 같은 서버 프로세스의 연결 정보를 받고, 학습 작업은 받지 않음
+    assert [FakeRunProcess.instances[run_id][0].policy_server for run_id in ("a", "b", "train")] == [
+        ("address-1", b"key"), ("address-1", b"key"), None]
+    # 서버 프로세스가 죽었으면 다음 test 작업 때 다시 띄움
+    sched._policy_server.alive = False
+    sched.submit("test", SimpleNamespace(priority=0, algorithm="dqn", model_name="m"), "c")
+    FakeRunProcess.instances["a"][0].finish(0)
+    _wait_for(lambda: sched.get("c").status == RUNNING)
+    assert FakeRunProcess.instances["c"][0].policy_server == ("address-2", b"key")
+
+
+@pytest.fixture
+def two_slots(scheduler, monkeypatch):
+    monkeypatch.setattr(run_scheduler, "_usable_cores", lambda: [0, 1, 2, 3])
+    monkeypatch.setenv("MAX_CONCURRENT_RUNS", "2")
+    sched = RunScheduler()
+    sched._notify_finished = lambda job, status: None
+    return sched
+
+
+def test_n_envs_takes_that_many_slots(two_slots):
+    sched = two_slots
+    wide = sched.submit("train", _train(0, "tsc", n_envs=2), "wide")
+    assert wide.status == RUNNING and wide.slot_ids == [0, 1]
+    # 두 슬롯의 코어를 모두 사용
+    assert FakeRunProcess.instances["wide"][0].cores == [0, 1, 2, 3]
+    assert sched.slots == [wide, wide]
+
+    narrow = sched.submit("train", _train(0), "narrow")
+    assert narrow.status == QUEUED
+    FakeRunProcess.instances["wide"][0].finish(0)
+    _wait_for(lambda: narrow.status == RUNNING)
+    assert sched.slots.count(None) == 1
+
+
+def test_n_envs_is_capped_by_slot_count(two_slots):
+    job = two_slots.submit("train", _train(0, "tsc", n_envs=8), "wide")
+    assert job.width == 2 and job.req.n_envs() == 2
+
+
+def test_wide_job_preempts_until_it_fits(two_slots):
+    sched = two_slots
+    first = sched.submit("train", _train(0), "first")
+    second = sched.submit("train", _train(0), "second")
+    wide = sched.submit("train", _train(5, "tsc", n_envs=2), "wide")
+    victim = second if second.status == PREEMPTING else first
+    assert victim.status == PREEMPTING and wide.status == QUEUED
+
+    FakeRunProcess.instances[victim.run_id][0].finish(0)
+    other = first if victim is second else second
+    _wait_for(lambda: other.status == PREEMPTING)
+    FakeRunProcess.instances[other.run_id][0].finish(0)
+    _wait_for(lambda: wide.status == RUNNING)
+    assert wide.slot_ids == [0, 1] and first.status == second.status == QUEUED
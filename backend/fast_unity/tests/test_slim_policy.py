@@ -0,0 +1,49 @@
+import os
+
+import gymnasium as gym
+import numpy as np
+import pytest
+
+from conftest import MODEL_ZOO
+from unity.train_util.onnx_policy import sample_observations
+from unity.train_util.slim_policy import SlimPolicy, load_slim_policy, save_slim_policy, slim_size_report
+
+
+@pytest.fixture
+def saved(zoo_model, tmp_path):
+    path = str(tmp_path / "model.zip")
+    zoo_model.save(path)
+    assert save_slim_policy(zoo_model, path) is not None
+    return zoo_model, path
+
+
+def test_slim_policy_predicts_like_the_full_model(saved):
+    model, path = saved
+    env = model.get_env()
+    slim = load_slim_policy(path, env.observation_space, env.action_space, device="cpu")
+    assert isinstance(slim, SlimPolicy)
+
+    full = type(model).load(path, device="cpu")
+    obs = sample_observations(model.observation_space, 32, seed=0)
+    full_actions, _ = full.predict(obs, deterministic=True)
+    slim_actions, _ = slim.predict(obs, deterministic=True)
+    np.testing.assert_allclose(slim_actions, full_actions, atol=1e-6)
+
+
+def test_slim_artifact_is_smaller_than_the_full_model(saved):
+    _, path = saved
+    report = slim_size_report(path)
+    assert report["slim_bytes"] < report["full_bytes"]
+
+
+def test_stale_or_mismatched_artifact_falls_back_to_the_full_model(tmp_path):
+    model = MODEL_ZOO["dqn_box"]()
+    path = str(tmp_path / "model.zip")
+    model.save(path)
+    slim_path = save_slim_policy(model, path)
+    env = model.get_env()
+
+    assert load_slim_policy(path, gym.spaces.Box(-1, 1, (3,)), env.action_space) is None
+    # 모델을 다시 저장하면 이전 .policy.zip은 쓰지 않음
+    os.utime(slim_path, (0, 0))
+    assert load_slim_policy(path, env.observation_space, env.action_space) is None
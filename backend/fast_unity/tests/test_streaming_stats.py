@@ -0,0 +1,66 @@
+import math
+
+import numpy as np
+import pytest
+
+from unity.train_util.streaming_stats import P2Quantile, StreamingStats, WindowMean
+
+
+@pytest.mark.parametrize("p", [0.05, 0.5, 0.95])
+@pytest.mark.parametrize("dist", ["normal", "exponential", "uniform"])
+def test_p2_quantile_tracks_numpy_quantile(p, dist):
+    rng = np.random.default_rng(0)
+    values = getattr(rng, dist)(size=5000)
+    sketch = P2Quantile(p)
+    for x in values:
+        sketch.update(x)
+    # P²는 근사값 → 표본 분포의 분위수 대비 표준편차의 일정 비율 안에 있으면 충분
+    assert sketch.value() == pytest.approx(np.quantile(values, p), abs=0.05 * values.std())
+
+
+def test_p2_quantile_is_exact_below_five_values():
+    sketch = P2Quantile(0.5)
+    assert math.isnan(sketch.value())
+    for x in (3.0, 1.0, 2.0):
+        sketch.update(x)
+    assert sketch.value() == 2.0
+
+
+def test_streaming_stats_match_numpy():
+    rng = np.random.default_rng(1)
+    values = rng.normal(10.0, 3.0, size=2000)
+    stats = StreamingStats()
+    for x in values:
+        stats.update(x)
+    stats.update(float("nan"))  # NaN은 무시
+
+    summary = stats.summary("r")
+    assert stats.count == len(values)
+    assert summary["r_mean"] == pytest.approx(values.mean())
+    assert summary["r_std"] ** 2 == pytest.approx(np.var(values))
+    assert summary["r_min"] == values.min() and summary["r_max"] == values.max()
+    for key, p in (("r_p5", 0.05), ("r_p50", 0.5), ("r_p95", 0.95)):
+        assert summary[key] == pytest.approx(np.quantile(values, p), abs=0.05 * values.std())
+
+
+def test_streaming_stats_reset_starts_a_new_interval():
+    stats = StreamingStats()
+    for x in range(100):
+        stats.update(x)
+    stats.reset()
+    assert stats.summary("r") == {}
+    for x in (1.0, 2.0):
+        stats.update(x)
+    assert stats.summary("r")["r_mean"] == 1.5
+    assert stats.std == pytest.approx(np.std([1.0, 2.0]))
+
+
+def test_window_mean_matches_mean_of_last_values():
+    rng = np.random.default_rng(2)
+    values = rng.normal(size=500)
+    window = WindowMean(100)
+    assert math.isnan(window.mean())
+    for i, x in enumerate(values):
+        window.update(x)
+        assert window.mean() == pytest.approx(values[max(0, i - 99):i + 1].mean())
+    assert len(window) == 100
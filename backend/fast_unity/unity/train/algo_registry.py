@@ -1,18 +1,27 @@
 import inspect
+import zipfile
+import torch as th
 from typing import Dict, Any
 from stable_baselines3 import PPO, A2C, DQN, SAC
 from stable_baselines3.common.base_class import BaseAlgorithm
+from stable_baselines3.common.preprocessing import preprocess_obs
+from stable_baselines3.common.save_util import json_to_data
+from stable_baselines3.common.vec_env import VecEnv
 import gymnasium as gym
 from app.schemas.training import TrainRequest
-from unity.train_util.feedback_wrapper import TeacherFeedbackWrapper
+from unity.train_util.feedback_wrapper import TeacherFeedbackWrapper, TeacherFeedbackVecWrapper
 from unity.train_util.sentiment_feedback_wrapper import SentimentLLMFeedback, SentimentLLMWrapper 
 from unity.train_util.gym_wrapper import MLAgentsGymWrapper
 from unity.train_util.dup_replay_buffer import DupReplayBuffer
 from unity.train_util.dup_dict_replay_buffer import DupDictReplayBuffer 
+from unity.train_util.compact_rollout_buffer import compact_rollout_buffer_class
+from unity.train_util.embedding_replay_buffer import EmbeddingDictReplayBuffer
 
-from unity.train_util.custom_extractor import AdvancedCombinedExtractorMultipleVectors
+from unity.train_util.custom_extractor import AdvancedCombinedExtractorMultipleVectors, IMAGE_KEY
 from unity.train_util.custom_policy import DiffrentRLPolicy
-from typing import Literal, Optional
+from unity.train_util.onnx_policy import OnnxPolicy, load_onnx_policy
+from unity.train_util.slim_policy import SlimPolicy, load_slim_policy
+from typing import Literal, Optional, Union
 
 def filter_kwargs(ctor, hp: Dict[str, Any], exclude: set = None) -> Dict[str, Any]:
     """
@@ -24,6 +33,16 @@ def filter_kwargs(ctor, hp: Dict[str, Any], exclude: set = None) -> Dict[str, An
     exclude = exclude or set()
     return {k: v for k, v in hp.items() if k in sig.parameters and k not in exclude}
 
+def _as_bool(hp: Dict[str, Any], key: str) -> bool:
+    """
+    on/off 하이퍼파라미터를 읽습니다. 프론트/Node API를 거치면 "true"/"false" 문자열로 오므로
+    True, "true", 1, "1"만 켜짐으로 봅니다. (bool("false")는 True라서 그대로 쓰면 안 됨)
+    """
+    value = (hp or {}).get(key, False)
+    if isinstance(value, str):
+        return value.strip().lower() in ("true", "1")
+    return value is True or (isinstance(value, int) and value == 1)
+
 # 모델 생성 시 하이퍼파라미터(hp)에 의해 덮어쓰여지면 안 되는 키워드 인자들의 공통 집합
 # 이 키들은 build 메소드 내에서 명시적으로 관리됩니다.
 COMMON_EXCLUDE_KEYS = {
@@ -34,6 +53,8 @@ COMMON_EXCLUDE_KEYS = {
     "device",
     "replay_buffer_class",
     "replay_buffer_kwargs",
+    "rollout_buffer_class",
+    "rollout_buffer_kwargs",
     "policy_kwargs"
 }
 class AlgoAdapter:
@@ -62,20 +83,45 @@ class AlgoAdapter:
     def learn(self, model: BaseAlgorithm, total_timesteps: int, callback=None):
         return model.learn(total_timesteps=total_timesteps, callback=callback)
     
-    def _load_teacher_model(self, hp: Dict[str, Any], env: MLAgentsGymWrapper) -> Optional[BaseAlgorithm]:
-        """하이퍼파라미터에서 teacher 모델 정보를 읽어 로드합니다."""
+    def _load_teacher_model(self, hp: Dict[str, Any], env: MLAgentsGymWrapper,
+                            allow_onnx: bool = True) -> Optional[Union[BaseAlgorithm, OnnxPolicy, SlimPolicy]]:
+        """
+        하이퍼파라미터에서 teacher 모델 정보를 읽어 로드합니다.
+        allow_onnx=False면 가중치를 복사해야 하는 경우처럼 torch 정책(추론 전용 아티팩트 또는 전체 모델)으로 로드합니다.
+        (SlimPolicy도 .policy로 torch 정책에 접근할 수 있음)
+        """
         teacher_name = hp.get("teacher_name")
         teacher_algo_name = hp.get("teacher_algo")
         
         if not teacher_name or not teacher_algo_name:
             return None
         teacher_algo_class = OG_ALGO_REGISTRY.get(teacher_algo_name)
-        return load_model(teacher_name, teacher_algo_class, env) if teacher_algo_class else None
+        return load_model(teacher_name, teacher_algo_class, env, allow_onnx=allow_onnx) if teacher_algo_class else None
     
  
 
 class OnPolicyAdapter(AlgoAdapter):
-    pass  
+    def build(self, req: TrainRequest, env: MLAgentsGymWrapper, hp: Dict[str, Any] = None) -> BaseAlgorithm:
+        if req.env_name != "cnn_car":
+            return super().build(req, env, hp)
+
+        policy_kwargs = dict(
+        features_extractor_class=AdvancedCombinedExtractorMultipleVectors,
+        features_extractor_kwargs=dict(cnn_output_dim=128),
+        net_arch=[256, 128]
+        )
+        kwargs = filter_kwargs(self.CLS.__init__, hp, exclude=COMMON_EXCLUDE_KEYS)
+
+        # 이미지 키를 uint8로 보관하는 롤아웃 버퍼 사용 (n_steps를 키워도 메모리 1/4, SB3가 이미 그렇게 저장하면 기본 버퍼)
+        return self.CLS(
+            policy=self.policy_set(req),
+            env=env,
+            **kwargs,
+            device="auto",
+            policy_kwargs=policy_kwargs,
+            rollout_buffer_class=compact_rollout_buffer_class(),
+            verbose=1,
+        )
 
 class OffPolicyAdapter(AlgoAdapter):
     
@@ -127,13 +173,21 @@ class TeacherStudentCosAdapter(AlgoAdapter):
         if not teacher_model:
             raise ValueError("tsc 알고리즘은 teacher 모델이 필요합니다.")
         
-        # TeacherFeedbackWrapper로 환경 래핑
-        wrapped_env = TeacherFeedbackWrapper(
-            env=env,
-            total_timesteps=req.total_timesteps,
-            teacher=teacher_model,
-            **filter_kwargs(TeacherFeedbackWrapper.__init__, hp)
-        )
+        # TeacherFeedbackWrapper로 환경 래핑 (환경이 여러 개면 teacher를 벡터 스텝당 한 번 부르는 VecEnv 버전)
+        if isinstance(env, VecEnv) and env.num_envs > 1:
+            wrapped_env = TeacherFeedbackVecWrapper(
+                venv=env,
+                total_timesteps=req.total_timesteps,
+                teacher=teacher_model,
+                **filter_kwargs(TeacherFeedbackVecWrapper.__init__, hp)
+            )
+        else:
+            wrapped_env = TeacherFeedbackWrapper(
+                env=env,
+                total_timesteps=req.total_timesteps,
+                teacher=teacher_model,
+                **filter_kwargs(TeacherFeedbackWrapper.__init__, hp)
+            )
         
         replay_buffer = DupDictReplayBuffer if req.env_name == "cnn_car" else DupReplayBuffer
         
@@ -154,14 +208,44 @@ class TeacherStudentCosAdapter(AlgoAdapter):
         return model   
 
 class SeparateRLAdapter(AlgoAdapter):
+    def _optimizer_kwargs(self, hp: Dict[str, Any]) -> Dict[str, Any]:
+        """cnn_lr/fc_lr가 주어지면 DiffrentRLPolicy가 CNN과 헤드를 별도 파라미터 그룹으로 학습합니다."""
+        if _as_bool(hp, "cache_cnn_embedding") and hp.get("cnn_unfreeze_fraction") is not None:
+            raise ValueError("cache_cnn_embedding과 cnn_unfreeze_fraction은 함께 사용할 수 없습니다.")
+        return {k: float(hp[k]) for k in ("cnn_lr", "fc_lr") if hp.get(k) is not None}
+
+    def _replay_buffer_setup(self, hp: Dict[str, Any], cnn_output_dim: int):
+        """cache_cnn_embedding이 켜져 있으면 이미지 대신 CNN 임베딩을 저장하는 버퍼를 사용합니다."""
+        if _as_bool(hp, "cache_cnn_embedding"):
+            return EmbeddingDictReplayBuffer, dict(handle_timeout_termination=True, embedding_dim=cnn_output_dim)
+        return DupDictReplayBuffer, dict(handle_timeout_termination=True)
+
+    def _freeze_cnn_and_cache(self, model: BaseAlgorithm) -> None:
+        """CNN을 완전히 고정하고, 리플레이 버퍼가 삽입 시점에 임베딩을 저장하도록 연결합니다."""
+        if not isinstance(model.replay_buffer, EmbeddingDictReplayBuffer):
+            return
+        policy = model.policy
+        extractor = policy.q_net.features_extractor
+        extractor.set_image_frozen(True)
+        image_space = policy.observation_space[IMAGE_KEY]
+
+        def encoder(images):
+            with th.no_grad():
+                obs = th.as_tensor(images, device=policy.device)
+                obs = preprocess_obs(obs, image_space, normalize_images=policy.normalize_images)
+                return extractor.encode_image(obs).cpu().numpy()
+
+        model.replay_buffer.set_encoder(encoder)
+        print(f"[{type(self).__name__}] CNN을 고정하고 리플레이 버퍼에 임베딩을 캐시합니다.")
+
     def build(self, req: TrainRequest, env: MLAgentsGymWrapper, hp: Dict[str, Any]) -> BaseAlgorithm:
      
 
         if req.env_name != "cnn_car":
             raise ValueError("SRL 알고리즘은 'cnn_car' 환경에서만 사용할 수 있습니다.")
 
-        # 1. 교사 모델 로드
-        teacher_model = self._load_teacher_model(hp, env)
+        # 1. 교사 모델 로드 (특징 추출기 가중치가 필요하므로 torch 모델)
+        teacher_model = self._load_teacher_model(hp, env, allow_onnx=False)
         if not teacher_model:
             raise ValueError("이 알고리즘은 특징 추출기 가중치를 복사할 teacher 모델이 필요합니다.")
 
@@ -169,19 +253,22 @@ class SeparateRLAdapter(AlgoAdapter):
         policy_kwargs = dict(
         features_extractor_class=AdvancedCombinedExtractorMultipleVectors,
         features_extractor_kwargs=dict(cnn_output_dim=128),
-        net_arch=[256, 128]
+        net_arch=[256, 128],
+        share_features_extractor=_as_bool(hp, "share_features_extractor"),
+        optimizer_kwargs=self._optimizer_kwargs(hp),
         )
 
 
         # 3. 모델 생성 (분리된 학습률을 사용하는 DiffrentRLPolicy 사용)
         # 명시적으로 설정된 인자들이 hp에 의해 덮어쓰여지는 것을 방지
         kwargs = filter_kwargs(self.CLS.__init__, hp, exclude=COMMON_EXCLUDE_KEYS)
+        replay_buffer, replay_buffer_kwargs = self._replay_buffer_setup(hp, cnn_output_dim=128)
         student_model = self.CLS(
             policy=DiffrentRLPolicy,
             env=env,
             policy_kwargs=policy_kwargs,
-            replay_buffer_class=DupDictReplayBuffer,
-            replay_buffer_kwargs=dict(handle_timeout_termination=True),
+            replay_buffer_class=replay_buffer,
+            replay_buffer_kwargs=replay_buffer_kwargs,
             verbose=1,
             **kwargs,
         )
@@ -192,6 +279,7 @@ class SeparateRLAdapter(AlgoAdapter):
         student_model.policy.q_net.features_extractor.load_state_dict(teacher_fe_state_dict)
         
         print("[SeparateRLAdapter] 교사 모델의 특징 추출기 가중치를 현재 모델로 복사했습니다.")
+        self._freeze_cnn_and_cache(student_model)
 
         return student_model
 
@@ -204,8 +292,8 @@ class SentimentLLMAdapter(SeparateRLAdapter):
         if not llm_handler:
             raise ValueError("이 알고리즘은 LLM 핸들러가 필요합니다.")
 
-        # 1. 교사 모델 로드 (특징 추출기 복사용)
-        teacher_model = self._load_teacher_model(hp, env)
+        # 1. 교사 모델 로드 (특징 추출기 복사용, torch 모델)
+        teacher_model = self._load_teacher_model(hp, env, allow_onnx=False)
         if not teacher_model:
             raise ValueError("이 알고리즘은 특징 추출기 가중치를 복사할 teacher 모델이 필요합니다.")
 
@@ -221,18 +309,21 @@ class SentimentLLMAdapter(SeparateRLAdapter):
         policy_kwargs = dict(
         features_extractor_class=AdvancedCombinedExtractorMultipleVectors,
         features_extractor_kwargs=dict(cnn_output_dim=128),
-        net_arch=[256, 128]
+        net_arch=[256, 128],
+        share_features_extractor=_as_bool(hp, "share_features_extractor"),
+        optimizer_kwargs=self._optimizer_kwargs(hp),
         )
 
 
         # 4. 모델 생성 (래핑된 환경과 커스텀 정책 사용)
         kwargs = filter_kwargs(self.CLS.__init__, hp, exclude=COMMON_EXCLUDE_KEYS)
+        replay_buffer, replay_buffer_kwargs = self._replay_buffer_setup(hp, cnn_output_dim=128)
         student_model = self.CLS(
             policy=DiffrentRLPolicy,
             env=wrapped_env,
             policy_kwargs=policy_kwargs,
-            replay_buffer_class=DupDictReplayBuffer,
-            replay_buffer_kwargs=dict(handle_timeout_termination=True),
+            replay_buffer_class=replay_buffer,
+            replay_buffer_kwargs=replay_buffer_kwargs,
             verbose=1,
             **kwargs,
         )
@@ -241,6 +332,7 @@ class SentimentLLMAdapter(SeparateRLAdapter):
         teacher_fe_state_dict = teacher_model.policy.q_net.features_extractor.state_dict()
         student_model.policy.q_net.features_extractor.load_state_dict(teacher_fe_state_dict)
         print("[SentimentLLMAdapter] 교사 모델의 특징 추출기 가중치를 학생 모델로 복사했습니다.")
+        self._freeze_cnn_and_cache(student_model)
 
         return student_model
 
@@ -264,16 +356,41 @@ OG_ALGO_REGISTRY: dict[str, type[BaseAlgorithm]] = {
     
     "srl": DQN,
 }
-def load_model(model_name:str, model_algo: BaseAlgorithm, env: MLAgentsGymWrapper):
+def load_model(model_name:str, model_algo: BaseAlgorithm, env: MLAgentsGymWrapper, allow_onnx: bool = True):
     model_path = "models/"+ model_name
+    # teacher는 매 스텝 호출되므로 내보낸 ONNX 정책이 있으면 onnxruntime(CPU)으로 추론
+    if allow_onnx:
+        onnx_policy = load_onnx_policy(model_path, env.observation_space, env.action_space)
+        if onnx_policy is not None:
+            return onnx_policy
+    # 추론 전용 아티팩트(.policy.zip)가 있으면 옵티마이저/타깃 네트워크/리플레이 버퍼 설정 없이 정책만 로드
+    slim_policy = load_slim_policy(model_path, env.observation_space, env.action_space)
+    if slim_policy is not None:
+        return slim_policy
     # 모델 로드 시 커스텀 클래스를 찾을 수 있도록 custom_objects를 전달합니다.
     # 이는 저장된 모델이 커스텀 정책이나 특징 추출기를 사용할 때 필요합니다.
+    # 저장된 policy_kwargs 위에 덮어써야 optimizer_kwargs(cnn_lr → 파라미터 그룹 2개)와
+    # share_features_extractor가 유지되어 옵티마이저 상태가 그대로 로드됩니다.
     custom_objects = {
-        "policy_kwargs": dict(
-            features_extractor_class=AdvancedCombinedExtractorMultipleVectors,
-            features_extractor_kwargs=dict(cnn_output_dim=128),
-            net_arch=[256, 128]
-        ),
+        "policy_kwargs": {
+            **_saved_policy_kwargs(model_path),
+            "features_extractor_class": AdvancedCombinedExtractorMultipleVectors,
+            "features_extractor_kwargs": dict(cnn_output_dim=128),
+            "net_arch": [256, 128],
+        },
         "policy_class": DiffrentRLPolicy,
     }
-    return model_algo.load(model_path, env=env, custom_objects=custom_objects)
\ No newline at end of file
+    return model_algo.load(model_path, env=env, custom_objects=custom_objects)
+
+
+def _saved_policy_kwargs(model_path: str) -> Dict[str, Any]:
+    """체크포인트(.zip)의 data에서 policy_kwargs만 읽습니다. (가중치는 읽지 않음, 읽을 수 없으면 빈 dict)"""
+    path = model_path if model_path.endswith(".zip") else model_path + ".zip"
+    try:
+        with zipfile.ZipFile(path) as archive:
+            data = json_to_data(archive.read("data").decode())
+    except Exception as e:
+        print(f"[load_model][WARN] {path}의 policy_kwargs를 읽지 못했습니다: {e}")
+        return {}
+    policy_kwargs = data.get("policy_kwargs")
+    return dict(policy_kwargs) if isinstance(policy_kwargs, dict) else {}
\ No newline at end of file
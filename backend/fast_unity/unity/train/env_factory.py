@@ -3,6 +3,7 @@ import json
 from typing import Tuple, Optional
 from pathlib import Path
 from stable_baselines3.common.monitor import Monitor
+from stable_baselines3.common.vec_env import DummyVecEnv
 #from stable_baselines3.common.logger import configure
 from app.schemas.training import TrainRequest,TestRequest
 
@@ -12,13 +13,17 @@ from unity.train_util.sidechannel import RLSideChannel
 
 from unity.train_util.training_state import UnityInferenceState
 
+# 한 작업이 Unity 환경을 여러 개 띄울 때 추가 환경의 worker_id 간격 (슬롯 worker_id와 포트가 겹치지 않도록)
+ENV_WORKER_STRIDE = 100
 
 
 
         
-def make_env(req: TrainRequest, side_channel : RLSideChannel=None) ->MLAgentsGymWrapper:
+def make_env(req: TrainRequest, side_channel : RLSideChannel=None, worker_id: int = 0, n_envs: int = 1):
     
     # 사이드 채널을 이용하여 파라미터 보내자
+    if n_envs > 1:
+        return _make_vec_env(req, side_channel, worker_id, n_envs)
     
     env_path = "unity/envs/"+ req.env_name +"/env.x86_64"
     use_dict_obs = False
@@ -27,7 +32,7 @@ def make_env(req: TrainRequest, side_channel : RLSideChannel=None) ->MLAgentsGym
         act_mode = "binning"    
     if req.env_name == "cnn_car":
         use_dict_obs = True
-    env = MLAgentsGymWrapper(unity_env_path = env_path,side_channels=side_channel, use_dict_obs = use_dict_obs, act_mode=act_mode)
+    env = MLAgentsGymWrapper(unity_env_path = env_path, worker_id=worker_id, side_channels=side_channel, use_dict_obs = use_dict_obs, act_mode=act_mode)
     if env==None:
         raise RuntimeError("환경이 생성되지 못하였습니다")
     if  not side_channel == []:
@@ -36,7 +41,23 @@ def make_env(req: TrainRequest, side_channel : RLSideChannel=None) ->MLAgentsGym
     side_channel.send_command("init",msg )
     return env
 
-def make_env_inference(req : TestRequest, side_channel: RLSideChannel=[])-> MLAgentsGymWrapper:
+def _make_vec_env(req: TrainRequest, side_channel: RLSideChannel, worker_id: int, n_envs: int) -> DummyVecEnv:
+    """
+    Unity 환경 n_envs개를 DummyVecEnv로 묶습니다. (TeacherFeedbackVecWrapper로 teacher를 벡터 스텝당 한 번만 호출)
+    - 0번 환경은 제어용 side_channel(일시정지/재개/피드백)을 그대로 쓰고, 나머지는 init만 보내는 별도 채널을 씁니다.
+    - i번 환경의 worker_id는 worker_id + ENV_WORKER_STRIDE * i
+    """
+    envs = [make_env(req, side_channel, worker_id)]
+    try:
+        for i in range(1, n_envs):
+            envs.append(make_env(req, RLSideChannel(), worker_id + ENV_WORKER_STRIDE * i))
+    except Exception:
+        for env in envs:
+            env.close()
+        raise
+    return DummyVecEnv([lambda env=env: env for env in envs])
+
+def make_env_inference(req : TestRequest, side_channel: RLSideChannel=[], worker_id: int = 0)-> MLAgentsGymWrapper:
     
     env_path = "unity/envs/"+ req.env_name +"/env.x86_64"
     
@@ -46,7 +67,7 @@ def make_env_inference(req : TestRequest, side_channel: RLSideChannel=[])-> MLAg
         act_mode = "binning"
     if req.env_name == "cnn_car":
         use_dict_obs = True
-    env = MLAgentsGymWrapper(env_path, side_channels=side_channel, use_dict_obs=use_dict_obs, act_mode=act_mode)
+    env = MLAgentsGymWrapper(env_path, worker_id=worker_id, side_channels=side_channel, use_dict_obs=use_dict_obs, act_mode=act_mode)
     if env==None:
         raise RuntimeError("환경이 생성되지 못하였습니다")
     if  not side_channel == []:
@@ -9,8 +9,11 @@ from unity.train_util.gym_wrapper import MLAgentsGymWrapper
 from unity.train.algo_registry import OG_ALGO_REGISTRY
 from unity.train_util.custom_policy import DiffrentRLPolicy
 from unity.train_util.custom_extractor import AdvancedCombinedExtractorMultipleVectors
+from unity.train_util.onnx_policy import OnnxPolicy, load_onnx_policy
+from unity.train_util.slim_policy import SlimPolicy, load_slim_policy
+from typing import Union
 
-def load_model(req: TestRequest, env : MLAgentsGymWrapper) ->BaseAlgorithm:
+def load_model(req: TestRequest, env : MLAgentsGymWrapper) -> Union[BaseAlgorithm, OnnxPolicy, SlimPolicy]:
     algo = ALGOTRANS.get(req.algorithm, req.algorithm)
     algoClass =None
     print("---알고리즘")
@@ -21,6 +24,14 @@ def load_model(req: TestRequest, env : MLAgentsGymWrapper) ->BaseAlgorithm:
     except:
         return
     model_path = "/app/models/"+ req.model_name + ".zip"
+    # 내보낸 ONNX 정책이 있으면 onnxruntime(CPU)으로 추론 (INFERENCE_BACKEND=torch면 사용 안 함)
+    onnx_policy = load_onnx_policy(model_path, env.observation_space, env.action_space)
+    if onnx_policy is not None:
+        return onnx_policy
+    # 추론 전용 아티팩트(.policy.zip)가 있으면 옵티마이저/타깃 네트워크 없이 정책만 로드
+    slim_policy = load_slim_policy(model_path, env.observation_space, env.action_space)
+    if slim_policy is not None:
+        return slim_policy
     custom_objects = {
         "policy": {
             "DiffrentRLPolicy": DiffrentRLPolicy,
@@ -31,6 +42,25 @@ def load_model(req: TestRequest, env : MLAgentsGymWrapper) ->BaseAlgorithm:
     model = algoClass.load(path=model_path, env=env, custom_objects=custom_objects)
     return model
     
+class _SpacesEnv(gym.Env):
+    """관측/행동 공간만 가진 env. PolicyServerProcess가 워커의 Unity env 없이 모델을 로드할 때 씁니다."""
+
+    def __init__(self, observation_space: gym.Space, action_space: gym.Space):
+        self.observation_space = observation_space
+        self.action_space = action_space
+
+    def reset(self, *, seed=None, options=None):
+        raise RuntimeError("_SpacesEnv는 모델 로드용이라 실행할 수 없습니다.")
+
+    def step(self, action):
+        raise RuntimeError("_SpacesEnv는 모델 로드용이라 실행할 수 없습니다.")
+
+
+def load_model_for_spaces(req: TestRequest, observation_space: gym.Space,
+                          action_space: gym.Space) -> Union[BaseAlgorithm, OnnxPolicy, SlimPolicy, None]:
+    """워커 env의 관측/행동 공간만으로 load_model과 같은 방식으로 모델을 로드합니다. (PolicyServerProcess의 loader용)"""
+    return load_model(req, _SpacesEnv(observation_space, action_space))
+
 ALGOTRANS: dict[str,str] = {
     "tsc":"dqn",
     
@@ -0,0 +1,170 @@
+import multiprocessing
+import os
+import threading
+from multiprocessing.connection import Connection
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+from app.schemas.training import TrainRequest, TestRequest
+from unity.train_util.training_state import SharedRunState
+
+# CUDA/torch와 uvicorn 스레드가 있는 프로세스에서 fork는 안전하지 않으므로 spawn 사용
+_CTX = multiprocessing.get_context("spawn")
+
+
+def _listen_commands(conn: Connection, side_channel, llm_handler) -> None:
+    """API 프로세스에서 온 제어 명령을 워커의 사이드 채널/LLM 핸들러에 전달합니다."""
+    while True:
+        try:
+            command, value = conn.recv()
+        except (EOFError, OSError):
+            break
+        if command == "feedback":
+            if llm_handler is not None:
+                llm_handler.AddMessage(value)
+        else:
+            side_channel.send_command(command, value)
+
+
+def _apply_cpu_quota(cores: Optional[List[int]]) -> None:
+    """워커(와 워커가 띄우는 Unity 프로세스)를 지정된 코어에 고정하고 torch 스레드 수를 맞춥니다."""
+    if not cores:
+        return
+    if hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+    import torch
+    torch.set_num_threads(len(cores))
+
+
+def load_test_policy(req: TestRequest, observation_space: Any, action_space: Any) -> Any:
+    """PolicyServer 프로세스에서 test 작업의 모델을 로드합니다. (PolicyServerProcess의 loader)"""
+    from unity.train.inference import load_model_for_spaces
+    return load_model_for_spaces(req, observation_space, action_space)
+
+
+def run_worker_main(kind: str, req: Union[TrainRequest, TestRequest], run_id: str,
+                    state: SharedRunState, conn: Connection, worker_id: int = 0,
+                    cores: Optional[List[int]] = None, resume: bool = False,
+                    policy_server: Optional[Tuple[Any, bytes]] = None) -> None:
+    """
+    워커 프로세스 진입점. 학습(train) 또는 추론(test)을 이 프로세스 안에서 실행합니다.
+    - SB3 루프, torch, Unity 통신이 API 프로세스의 GIL과 경쟁하지 않습니다.
+    - 사이드 채널과 LLM 핸들러는 Unity 환경과 같은 프로세스에 있어야 하므로 여기서 생성합니다.
+    - worker_id는 Unity 통신 포트(5005 + worker_id)를 정하므로 동시 실행 작업마다 달라야 합니다.
+    - policy_server(주소, authkey)가 있으면 test 작업은 PolicyServer 프로세스에 연결해 추론합니다.
+    """
+    _apply_cpu_quota(cores)
+
+    # 학습/추론 모듈은 워커 프로세스에서만 필요하므로 여기서 import
+    from unity.train.train_runner import run_training, test_model
+    from unity.train_util.sentiment_feedback_wrapper import SentimentLLMFeedback
+    from unity.train_util.sidechannel import RLSideChannel
+    from unity.train_util.policy_server import RemotePolicy
+
+    side_channel = RLSideChannel()
+    llm_handler = None
+    if kind == "train":
+        def unpause_simulation():
+            """LLM 피드백 처리 후 학습을 재개하는 콜백"""
+            if state.is_paused:
+                state.set_paused(False)
+
+        llm_handler = SentimentLLMFeedback(unpause_callback=unpause_simulation)
+
+    send_lock = threading.Lock()
+
+    def send(command: str, value: Any) -> None:
+        with send_lock:
+            conn.send((command, value))
+
+    def send_metrics(payload: Dict[str, Any]) -> None:
+        """메트릭을 API 프로세스(MetricsHub)로 보냅니다. 실시간 대시보드 스트림용"""
+        try:
+            send("metrics", payload)
+        except (BrokenPipeError, EOFError, OSError):
+            pass
+
+    # POLICY_SERVER=1이면 test 작업의 추론을 PolicyServer 프로세스에 맡김 (다른 test 작업과 배치)
+    remote_policy = RemotePolicy(*policy_server) if kind == "test" and policy_server is not None else None
+
+    listener = threading.Thread(target=_listen_commands, args=(conn, side_channel, llm_handler), daemon=True)
+    listener.start()
+
+    try:
+        if kind == "train":
+            run_training(req, state, side_channel, run_id, llm_handler=llm_handler,
+                         worker_id=worker_id, resume=resume, metrics_sink=send_metrics)
+        else:
+            test_model(req, state, side_channel, run_id, worker_id=worker_id, remote_policy=remote_policy)
+    finally:
+        # 워커 프로세스는 종료 시 데몬 스레드가 바로 사라지므로 남은 완료 콜백을 먼저 전송 (메트릭은 버림)
+        from unity.train_util.event_bus import get_event_bus
+        if not get_event_bus().close(timeout=30):
+            print(f"[run_worker][WARN] 전송하지 못한 이벤트가 남아 있습니다: {get_event_bus().stats()}")
+        if llm_handler is not None:
+            llm_handler.close()
+        conn.close()
+
+
+class RunProcess:
+    """
+    API 프로세스 쪽에서 하나의 워커 프로세스를 관리하는 핸들.
+    - 상태 플래그(pause/stop 등)는 SharedRunState(공유 메모리)로 주고받고,
+    - 사이드 채널 명령(stop, resume, simSpeed)과 LLM 피드백은 파이프로 보냅니다.
+    - 워커가 파이프로 보낸 메시지(메트릭 등)는 리더 스레드가 on_message(command, value)로 전달합니다.
+    """
+    def __init__(self, kind: str, req: Union[TrainRequest, TestRequest], run_id: str, state: SharedRunState,
+                 worker_id: int = 0, cores: Optional[List[int]] = None, resume: bool = False,
+                 on_message: Optional[Callable[[str, Any], None]] = None,
+                 policy_server: Optional[Tuple[Any, bytes]] = None):
+        self.kind = kind
+        self.run_id = run_id
+        self.on_message = on_message
+        self._conn, child_conn = _CTX.Pipe()
+        self._lock = threading.Lock()
+        self.process = _CTX.Process(
+            target=run_worker_main,
+            args=(kind, req, run_id, state, child_conn, worker_id, cores, resume, policy_server),
+            name=f"{kind}-{run_id}",
+            daemon=True,
+        )
+        self._child_conn: Optional[Connection] = child_conn
+        self._reader: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self.process.start()
+        # 자식에게 넘긴 끝은 부모에서 닫아야 자식 종료 시 EOF가 전달됨
+        self._child_conn.close()
+        self._child_conn = None
+        self._reader = threading.Thread(target=self._read_messages, name=f"reader-{self.run_id}", daemon=True)
+        self._reader.start()
+
+    def _read_messages(self) -> None:
+        while True:
+            try:
+                command, value = self._conn.recv()
+            except (EOFError, OSError):
+                break
+            if self.on_message is not None:
+                try:
+                    self.on_message(command, value)
+                except Exception as e:
+                    print(f"[RunProcess][WARN] 워커 메시지 처리 실패 ({command}): {e}")
+
+    def send(self, command: str, value: str = "") -> bool:
+        """워커에 명령을 보냅니다. 워커가 이미 종료되었으면 False를 반환합니다."""
+        with self._lock:
+            try:
+                self._conn.send((command, value))
+                return True
+            except (BrokenPipeError, EOFError, OSError):
+                return False
+
+    def join(self, timeout: Optional[float] = None) -> Optional[int]:
+        """워커 종료를 기다린 뒤 종료 코드를 반환합니다. (블로킹, executor에서 호출)"""
+        self.process.join(timeout)
+        if not self.process.is_alive():
+            # 워커가 남긴 메시지를 리더 스레드가 모두 읽은 뒤(EOF) 파이프를 닫음
+            if self._reader is not None:
+                self._reader.join(5)
+            self._conn.close()
+        return self.process.exitcode
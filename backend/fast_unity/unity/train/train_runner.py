@@ -1,47 +1,107 @@
 import os
 import time
-import requests
 
 from app.schemas.training import  TrainRequest, TestRequest
 from unity.train_util.sidechannel import RLSideChannel
-from unity.train_util.training_state import UnityTrainingState, UnityInferenceState, PauseResumeCallback,CustomExplorationCallback
-from unity.train_util.logger_callback import EpisodeCSVCallback
+from unity.train_util.training_state import UnityTrainingState, UnityInferenceState, PauseResumeCallback,CustomExplorationCallback, CnnUnfreezeCallback, replay_buffer_path_for
+from unity.train_util.logger_callback import EpisodeLogCallback
 from unity.train_util.real_time_log_callback import StreamTrainMetricsCallback
 from unity.train_util.gym_wrapper import MLAgentsGymWrapper
 from unity.train_util.sentiment_feedback_wrapper import SentimentLLMFeedback
 from unity.train_util.custom_extractor import AdvancedCombinedExtractorMultipleVectors
 from unity.train.env_factory import make_env, make_env_inference
 from unity.train.inference import load_model
-from unity.train.algo_registry import ALGORITHM_REGISTRY, AlgoAdapter
-from typing import Literal, Optional
+from unity.train.algo_registry import ALGORITHM_REGISTRY, AlgoAdapter, _as_bool
+from unity.train_util.event_bus import get_event_bus
+from unity.train_util.metric_store import MetricStore, MetricStoreOutputFormat, metric_db_path
+from unity.train_util.async_logger import configure_async_logger
+from unity.train_util.step_feedback import attach_step_feedback
+from unity.train_util.policy_server import RemotePolicy
+from unity.train_util.embedding_replay_buffer import EmbeddingDictReplayBuffer
+from typing import Callable, Literal, Optional
 from contextlib import suppress
 
 
-from stable_baselines3.common.logger import configure
+from stable_baselines3.common.base_class import BaseAlgorithm
+from stable_baselines3.common.off_policy_algorithm import OffPolicyAlgorithm
+from stable_baselines3.common.save_util import load_from_zip_file
 
-def run_training(req:TrainRequest , state: UnityTrainingState, side_channel :RLSideChannel, experiment_id : str,service, llm_handler: Optional[SentimentLLMFeedback] = None):
+
+def restore_replay_buffer(model: BaseAlgorithm, model_path: str) -> bool:
+    """
+    선점 때 저장한 리플레이 버퍼를 복원합니다. (off-policy 전용)
+    버퍼가 없으면 빈 버퍼로 곧바로 업데이트하지 않도록 learning_starts를 복원된 스텝만큼 미룹니다.
+    """
+    if not isinstance(model, OffPolicyAlgorithm):
+        return False
+    path = replay_buffer_path_for(model_path)
+    if os.path.exists(path):
+        fresh = model.replay_buffer
+        try:
+            model.load_replay_buffer(path)
+            if isinstance(fresh, EmbeddingDictReplayBuffer):
+                model.replay_buffer.set_encoder(fresh.encoder)
+            os.remove(path)
+            print(f"[run_training] 리플레이 버퍼를 복원했습니다 ({model.replay_buffer.size()}개 전이)")
+            return True
+        except Exception as e:
+            model.replay_buffer = fresh
+            print(f"[run_training][WARN] 리플레이 버퍼 복원 실패: {e}")
+    model.learning_starts += model.num_timesteps
+    return False
+
+def run_training(req:TrainRequest , state: UnityTrainingState, side_channel :RLSideChannel, experiment_id : str, on_finish: Optional[Callable[[], None]] = None, llm_handler: Optional[SentimentLLMFeedback] = None,
+                 worker_id: int = 0, resume: bool = False, metrics_sink: Optional[Callable[[dict], None]] = None):
     
     
     env = None
+    metric_store = None
+    logger = None
     model_save_path = "models/"+ req.model_name+".zip"
     
     try :
-        env = make_env(req = req, side_channel = side_channel)
+        # tsc는 n_envs > 1이면 Unity 환경 여러 개를 VecEnv로 묶어 TeacherFeedbackVecWrapper로 학습
+        n_envs = req.n_envs()
+        env = make_env(req = req, side_channel = side_channel, worker_id = worker_id, n_envs = n_envs)
         adapter : AlgoAdapter= ALGORITHM_REGISTRY[req.algorithm]
+
+        # 선점 후 재시작: 체크포인트를 먼저 읽어 피드백 래퍼도 진행 스텝부터 시작하게 함 (hp의 start_step)
+        resume_timesteps = 0
+        checkpoint_params = None
+        if resume and os.path.exists(model_save_path):
+            data, checkpoint_params, _ = load_from_zip_file(model_save_path, device="cpu")
+            resume_timesteps = int(data.get("num_timesteps", 0))
+        hp = {**req.hyperparams, "start_step": resume_timesteps}
         
         # 알고리즘에 따라 build 메서드 호출 방식 분기
         if req.algorithm == "hf-llm":
-            model = adapter.build(req, env, req.hyperparams, llm_handler)
+            model = adapter.build(req, env, hp, llm_handler)
         else:
-            model = adapter.build(req, env, req.hyperparams)
+            model = adapter.build(req, env, hp)
+
+        # 같은 구성으로 만든 모델에 체크포인트 가중치/옵티마이저와 진행 스텝을 복원
+        if checkpoint_params is not None:
+            model.set_parameters(checkpoint_params, exact_match=True, device=model.device)
+            model.num_timesteps = resume_timesteps
+            print(f"[run_training] 체크포인트에서 이어서 학습합니다 ({resume_timesteps}/{req.total_timesteps} 스텝)")
+            restore_replay_buffer(model, model_save_path)
+        # Dup 계열 리플레이 버퍼는 피드백 래퍼가 쓰는 스텝별 표에서 cnt/보정 목록을 읽음
+        replay_buffer = getattr(model, "replay_buffer", None)
+        if hasattr(replay_buffer, "step_feedback"):
+            replay_buffer.step_feedback = attach_step_feedback(model.get_env())
         log_path = "train_logs/"+ req.model_name+"/"
         # Docker Compose에서 설정한 환경 변수에서 API 서버의 기본 URL을 가져옵니다.
         base_api_server_url = os.getenv("API_SERVER_URL")
         metrics_endpoint = f"{base_api_server_url}/training-metrics" if base_api_server_url else None
+        # 스텝 범위/다운샘플링 조회용 시계열 저장소 (이어서 학습할 때는 기존 기록 유지)
+        metric_store = MetricStore(metric_db_path(log_path), reset=resume_timesteps == 0)
         
-        callbacks =[PauseResumeCallback(state, side_channel, verbose=1, save_path=model_save_path, run_id = service.current_run_id), 
-                EpisodeCSVCallback(log_path, filename= req.model_name + ".csv"),
-                StreamTrainMetricsCallback(run_id= experiment_id, http_endpoint_url=metrics_endpoint, verbose=1)]
+        # productive_pause: 일시정지 중에도 리플레이 버퍼로 학습 (off-policy 전용)
+        pause_replay_ratio = float(req.hyperparams.get("pause_replay_ratio", 1.0)) if _as_bool(req.hyperparams, "productive_pause") else None
+        callbacks =[PauseResumeCallback(state, side_channel, verbose=1, save_path=model_save_path, run_id = experiment_id,
+                                        pause_replay_ratio=pause_replay_ratio), 
+                EpisodeLogCallback(log_path, append=resume_timesteps > 0, metric_store=metric_store),
+                StreamTrainMetricsCallback(run_id= experiment_id, http_endpoint_url=metrics_endpoint, local_sink=metrics_sink, verbose=1)]
         
         #---콜백 추가때문에 어쩔 수 없이---
         exploration_callback = CustomExplorationCallback(
@@ -53,24 +113,54 @@ def run_training(req:TrainRequest , state: UnityTrainingState, side_channel :RLS
         if(req.algorithm == "tsc"):
             callbacks.append(exploration_callback)
         #----
-        logger = configure(log_path, ["stdout","csv","tensorboard"])
+        # cnn_lr=0으로 고정한 CNN을 일정 시점에 해제 (srl / hf-llm)
+        unfreeze_fraction = req.hyperparams.get("cnn_unfreeze_fraction")
+        if req.algorithm in ("srl", "hf-llm") and unfreeze_fraction is not None:
+            callbacks.append(CnnUnfreezeCallback(
+                total_timesteps=req.total_timesteps,
+                unfreeze_fraction=float(unfreeze_fraction),
+                cnn_lr=float(req.hyperparams.get("cnn_unfreeze_lr", 0.000005)),
+                verbose=1,
+            ))
+        # CSV/TensorBoard/MetricStore 기록은 백그라운드 스레드에서 (stdout은 LOG_STDOUT_INTERVAL 간격으로 제한 가능)
+        logger = configure_async_logger(log_path, ["stdout","csv","tensorboard"],
+                                        async_formats=[MetricStoreOutputFormat(metric_store)])
         model.set_logger(logger)
-        model.learn(total_timesteps= req.total_timesteps, callback = callbacks)
+        model.learn(total_timesteps= req.total_timesteps - resume_timesteps, callback = callbacks,
+                    reset_num_timesteps= resume_timesteps == 0)
         # init sidechannel message
     
     finally:
-        service.finish_train_callback()
+        # 남은 로그를 모두 기록하고 닫음 (MetricStoreOutputFormat이 metric_store도 닫음)
+        if logger is not None:
+            with suppress(Exception):
+                logger.close()
+        if metric_store is not None:
+            with suppress(Exception):
+                metric_store.close()
+
+        if on_finish is not None:
+            on_finish()
 
         if 'env' in locals():
             with suppress(Exception):
                 env.close()  # 이미 종료됐으면 조용히 무시
 
 
-def test_model(req: TestRequest, state : UnityInferenceState, side_channel: RLSideChannel, run_id:str):
+def test_model(req: TestRequest, state : UnityInferenceState, side_channel: RLSideChannel, run_id:str, worker_id: int = 0,
+               remote_policy: Optional[RemotePolicy] = None):
     env = None
+    model = None
     try: 
-        env = make_env_inference(req = req,side_channel=side_channel)
-        model = load_model(req, env)
+        env = make_env_inference(req = req,side_channel=side_channel, worker_id=worker_id)
+        if remote_policy is not None:
+            # PolicyServer 프로세스가 같은 모델을 쓰는 test 작업들의 관측을 마이크로 배치로 묶어 추론
+            try:
+                model = remote_policy.open((req.algorithm, req.model_name), req, env.observation_space, env.action_space)
+            except Exception as e:
+                print(f"[test_model][WARN] PolicyServer를 사용할 수 없어 직접 로드합니다: {e}")
+        if model is None:
+            model = load_model(req, env)
         done = False
         for _ in range(req.episodesnum):
             if state.is_stopped:
@@ -78,13 +168,8 @@ def test_model(req: TestRequest, state : UnityInferenceState, side_channel: RLSi
             done = False
             obs, info = env.reset()
             while not done:
-                while state.is_paused:
-                    print("[SB3] 추론 일시정지 중...") 
-                    if state.is_stopped:
-                        break
-                    time.sleep(0.1)
-                
-                if state.is_stopped:
+                # 일시정지면 재개/정지 신호가 올 때까지 블로킹, 정지면 종료
+                if not state.wait_while_paused(lambda: print("[SB3] 추론 일시정지 중...")):
                     break
 
                 action, _states = model.predict(obs, deterministic=False)
@@ -96,16 +181,16 @@ def test_model(req: TestRequest, state : UnityInferenceState, side_channel: RLSi
                 print(f"에피소드 종료. 보상: {reward}")
             
     finally:
+        if remote_policy is not None:
+            remote_policy.close()
+        state.ack()
         base_api_server_url = os.getenv("API_SERVER_URL")
         if base_api_server_url and run_id:
             endpoint = f"{base_api_server_url}/callbacks/{run_id}/test-completed"
-            try:
-                # 중지되었는지, 정상 완료되었는지 상태를 구분하여 전송
-                status_payload = {"status": "STOPPED" if state.is_stopped else "COMPLETED"}
-                print(f"[test_model] 테스트 완료 신호({status_payload['status']})를 보냅니다 -> {endpoint}")
-                requests.post(endpoint, json=status_payload, timeout=5)
-            except requests.RequestException as e:
-                print(f"[test_model][ERROR] Node.js API 서버로 완료 신호 전송 실패: {e}")
+            # 중지되었는지, 정상 완료되었는지 상태를 구분하여 전송
+            status_payload = {"status": "STOPPED" if state.is_stopped else "COMPLETED"}
+            print(f"[test_model] 테스트 완료 신호({status_payload['status']})를 보냅니다 -> {endpoint}")
+            get_event_bus().publish(endpoint, status_payload, droppable=False)
 
         try:
             if env:
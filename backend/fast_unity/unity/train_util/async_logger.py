@@ -0,0 +1,119 @@
+import os
+import queue
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from stable_baselines3.common.logger import KVWriter, Logger, make_output_format
+
+
+class AsyncOutputFormat(KVWriter):
+    """
+    SB3 logger.dump()의 키/값 스냅샷을 큐에 넣고, 백그라운드 스레드에서 내부 출력 형식(CSV, TensorBoard 등)에 기록합니다.
+
+    - 학습 스레드는 dict 복사 후 큐에 넣기만 하므로 디스크 I/O가 스텝 시간에 끼어들지 않습니다.
+    - 큐가 가득 차면(max_queue) 기록 스레드가 따라잡을 때까지 학습 스레드가 기다립니다. (로그는 버리지 않음)
+    - flush()는 큐에 쌓인 스냅샷이 모두 기록될 때까지 기다리고, close()는 flush 후 내부 출력 형식을 닫습니다.
+    """
+
+    def __init__(self, formats: List[KVWriter], max_queue: int = 256):
+        self.formats = formats
+        self._queue: "queue.Queue[Optional[tuple]]" = queue.Queue(maxsize=max_queue)
+        self._thread = threading.Thread(target=self._run, name="sb3-log-writer", daemon=True)
+        self._closed = False
+        self._thread.start()
+
+    def write(self, key_values: Dict[str, Any], key_excluded: Dict[str, Any], step: int = 0) -> None:
+        if self._closed:
+            return
+        # Logger.dump()가 호출 직후 dict를 비우므로 복사해서 넘김
+        self._queue.put((dict(key_values), dict(key_excluded), step))
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                key_values, key_excluded, step = item
+                for fmt in self.formats:
+                    try:
+                        fmt.write(key_values, key_excluded, step)
+                    except Exception as e:
+                        print(f"[AsyncOutputFormat][WARN] {type(fmt).__name__} 기록 실패: {e}")
+            finally:
+                self._queue.task_done()
+
+    def flush(self) -> None:
+        if self._thread.is_alive():
+            self._queue.join()
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+        for fmt in self.formats:
+            try:
+                fmt.close()
+            except Exception as e:
+                print(f"[AsyncOutputFormat][WARN] {type(fmt).__name__} 닫기 실패: {e}")
+
+
+class RateLimitedOutputFormat(KVWriter):
+    """min_interval초에 한 번만 내부 출력 형식(stdout 표 등)에 기록합니다. 나머지 dump는 건너뜁니다."""
+
+    def __init__(self, fmt: KVWriter, min_interval: float):
+        self.fmt = fmt
+        self.min_interval = min_interval
+        self._last_write: Optional[float] = None
+
+    def write(self, key_values: Dict[str, Any], key_excluded: Dict[str, Any], step: int = 0) -> None:
+        now = time.monotonic()
+        if self._last_write is not None and now - self._last_write < self.min_interval:
+            return
+        self._last_write = now
+        self.fmt.write(key_values, key_excluded, step)
+
+    def close(self) -> None:
+        self.fmt.close()
+
+
+def configure_async_logger(
+    folder: str,
+    format_strings: List[str],
+    async_formats: Optional[List[KVWriter]] = None,
+    stdout_interval: Optional[float] = None,
+) -> Logger:
+    """
+    stable_baselines3.common.logger.configure와 같은 형식 문자열을 받아 Logger를 만듭니다.
+    - "stdout"은 학습 스레드에서 바로 출력하며, stdout_interval(초)을 주면 그 간격으로만 출력합니다.
+      (None이면 LOG_STDOUT_INTERVAL 환경 변수, 0이면 제한 없음)
+    - 나머지 형식("csv", "tensorboard", "log", "json")과 async_formats는 AsyncOutputFormat 하나로 묶어 백그라운드에서 기록합니다.
+    """
+    os.makedirs(folder, exist_ok=True)
+    if stdout_interval is None:
+        stdout_interval = float(os.getenv("LOG_STDOUT_INTERVAL", "0"))
+
+    output_formats: List[KVWriter] = []
+    background: List[KVWriter] = []
+    for fmt in format_strings:
+        if fmt == "stdout":
+            writer = make_output_format(fmt, folder)
+            if stdout_interval > 0:
+                writer = RateLimitedOutputFormat(writer, stdout_interval)
+            output_formats.append(writer)
+        else:
+            background.append(make_output_format(fmt, folder))
+    background.extend(async_formats or [])
+    if background:
+        output_formats.append(AsyncOutputFormat(background))
+    return Logger(folder=folder, output_formats=output_formats)
+
+
+def flush_logger(logger: Logger) -> None:
+    """AsyncOutputFormat에 쌓인 스냅샷이 모두 기록될 때까지 기다립니다."""
+    for fmt in logger.output_formats:
+        if isinstance(fmt, AsyncOutputFormat):
+            fmt.flush()
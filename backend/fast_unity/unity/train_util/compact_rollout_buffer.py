@@ -0,0 +1,57 @@
+from typing import Optional, Type, Union
+
+import numpy as np
+import torch as th
+from gymnasium import spaces
+from stable_baselines3.common.buffers import DictRolloutBuffer
+from stable_baselines3.common.preprocessing import is_image_space
+
+
+def _parent_stores_float32() -> bool:
+    """설치된 SB3의 DictRolloutBuffer가 uint8 이미지 관측을 float32로 저장하는지 (2.6 등). 작은 버퍼로 확인합니다."""
+    probe = DictRolloutBuffer(1, spaces.Dict({"image": spaces.Box(0, 255, (1, 1, 1), np.uint8)}),
+                              spaces.Discrete(2), device="cpu")
+    return probe.observations["image"].dtype != np.uint8
+
+
+class CompactDictRolloutBuffer(DictRolloutBuffer):
+    """
+    이미지 관측 키를 uint8 그대로 저장하는 Dict 롤아웃 버퍼 (PPO/A2C용).
+
+    - Dockerfile이 고정한 SB3 2.6의 DictRolloutBuffer는 모든 관측 키를 float32로 저장하므로
+      cnn_car의 이미지 키(obs_0)가 필요한 메모리의 4배를 차지합니다. (최신 SB3는 관측 공간 dtype을 그대로 씀)
+    - 부모 reset()이 만든 배열 중 이미지 키만 관측 공간 dtype(uint8)으로 다시 할당하고, 나머지(행동 dtype 포함)는 부모를 따릅니다.
+      (np.zeros는 페이지를 실제로 쓰기 전까지 메모리를 차지하지 않으므로 잠시 만든 float32 배열은 피크를 만들지 않음)
+    - 미니배치도 uint8 텐서로 넘기며, float 변환과 0~255 → 0~1 정규화는 기존과 동일하게 정책의 preprocess_obs가 담당합니다.
+    - 부모가 이미 uint8로 저장하는 SB3에서는 필요 없으므로 compact_rollout_buffer_class()로 골라 씁니다.
+    """
+
+    def __init__(
+        self,
+        buffer_size: int,
+        observation_space: spaces.Dict,
+        action_space: spaces.Space,
+        device: Union[th.device, str] = "auto",
+        gae_lambda: float = 1,
+        gamma: float = 0.99,
+        n_envs: int = 1,
+    ):
+        # reset()이 부모 생성자 안에서 호출되므로 이미지 키를 먼저 계산합니다.
+        self.image_keys = {
+            key for key, subspace in observation_space.spaces.items()
+            if is_image_space(subspace, check_channels=False)
+        }
+        super().__init__(buffer_size, observation_space, action_space, device,
+                         gae_lambda=gae_lambda, gamma=gamma, n_envs=n_envs)
+
+    def reset(self) -> None:
+        super().reset()
+        for key in self.image_keys:
+            dtype = self.observation_space[key].dtype
+            if self.observations[key].dtype != dtype:
+                self.observations[key] = np.zeros((self.buffer_size, self.n_envs, *self.obs_shape[key]), dtype=dtype)
+
+
+def compact_rollout_buffer_class() -> Optional[Type[DictRolloutBuffer]]:
+    """SB3가 이미지 관측을 float32로 저장하면 CompactDictRolloutBuffer, 아니면 None(SB3 기본 버퍼)"""
+    return CompactDictRolloutBuffer if _parent_stores_float32() else None
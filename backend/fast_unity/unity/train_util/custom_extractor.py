@@ -69,6 +69,9 @@ import torch.nn as nn
 from stable_baselines3.common.torch_layers import BaseFeaturesExtractor
 from typing import Dict
 
+# cnn_car에서 이미지(RenderTexture)가 들어오는 관측 키
+IMAGE_KEY = "obs_0"
+
 class AdvancedCombinedExtractorMultipleVectors(BaseFeaturesExtractor):
     """
     이미지(obs_1)와 여러 벡터(obs_0, obs_2 등) 입력을 처리하는 커스텀 특징 추출기.
@@ -84,8 +87,8 @@ class AdvancedCombinedExtractorMultipleVectors(BaseFeaturesExtractor):
         # 각 관측(obs_0, obs_1, obs_2)에 대해 반복
         for key, subspace in observation_space.spaces.items():
             # 1. 이미지 관측(obs_1) 처리
-            if key == "obs_0":
-                n_input_channels = subspace.shape[0] # SB3가 (C, H, W)로 바꿔줌
+            if key == IMAGE_KEY:
+                n_input_channels = subspace.shape[0] # MLAgentsGymWrapper가 (C, H, W)로 제공
                 cnn = nn.Sequential(
                     nn.Conv2d(n_input_channels, 32, kernel_size=5, stride=2, padding=2),
                     nn.ReLU(),
@@ -128,11 +131,31 @@ class AdvancedCombinedExtractorMultipleVectors(BaseFeaturesExtractor):
         # 3. 모든 특징 벡터를 합친 최종 차원 설정
         self._features_dim = total_concat_size
 
+        # CNN 고정 여부 (True면 no_grad로 순전파하여 역전파 그래프를 만들지 않음)
+        self.image_frozen = False
+
+    def set_image_frozen(self, frozen: bool) -> None:
+        """이미지 CNN을 고정/해제합니다. 고정 시 requires_grad=False로 바꿔 그래디언트 계산을 생략합니다."""
+        self.image_frozen = frozen
+        self.extractors[IMAGE_KEY].requires_grad_(not frozen)
+
+    def encode_image(self, image: torch.Tensor) -> torch.Tensor:
+        """정규화된 이미지 배치 (N, C, H, W)를 CNN 임베딩 (N, cnn_output_dim)으로 변환합니다."""
+        return self.extractors[IMAGE_KEY](image)
+
     def forward(self, observations: Dict[str, torch.Tensor]) -> torch.Tensor:
         encoded_tensor_list = []
         # 각 관측(obs_0, obs_1, obs_2)을 맞는 처리기로 처리
         for key, extractor in self.extractors.items():
-            encoded_tensor_list.append(extractor(observations[key]))
+            obs = observations[key]
+            # 리플레이 버퍼에 캐시된 CNN 임베딩 (N, cnn_output_dim)은 CNN을 건너뜀
+            if key == IMAGE_KEY and obs.dim() == 2:
+                encoded_tensor_list.append(obs)
+            elif key == IMAGE_KEY and self.image_frozen:
+                with torch.no_grad():
+                    encoded_tensor_list.append(extractor(obs))
+            else:
+                encoded_tensor_list.append(extractor(obs))
         
         # 모든 처리된 특징 벡터를 하나로 결합
         return torch.cat(encoded_tensor_list, dim=1)
@@ -1,29 +1,121 @@
-from stable_baselines3.dqn.policies import DQNPolicy, MultiInputPolicy
+from stable_baselines3.dqn.policies import DQNPolicy, MultiInputPolicy, QNetwork
+from stable_baselines3.common.preprocessing import preprocess_obs
 from stable_baselines3 import DQN
 import torch
 
+from unity.train_util.custom_extractor import IMAGE_KEY
+
+
+class CachedEmbeddingQNetwork(QNetwork):
+    """
+    리플레이 버퍼에 캐시된 CNN 임베딩을 그대로 받을 수 있는 QNetwork.
+    - 이미지 키가 (N, C, H, W) 이미지면 기존과 동일하게 전처리(/255) 후 CNN을 통과합니다.
+    - 이미지 키가 (N, cnn_output_dim) 임베딩이면 전처리 없이 벡터 MLP/헤드만 계산합니다.
+    """
+    # 온라인/타깃 네트워크가 특징 추출기를 공유할 때 True (parameters()가 헤드만 반환)
+    shares_features_extractor: bool = False
+
+    def parameters(self, recurse: bool = True):
+        # DQN의 polyak_update는 q_net/q_net_target의 parameters()를 zip하므로,
+        # 공유된 추출기는 제외해야 자기 자신을 덮어쓰지 않고 헤드만 동기화됩니다.
+        if not self.shares_features_extractor:
+            return super().parameters(recurse)
+        return (p for n, p in self.named_parameters(recurse=recurse) if not n.startswith("features_extractor."))
+
+    def extract_features(self, obs, features_extractor):
+        if not isinstance(obs, dict) or IMAGE_KEY not in obs or obs[IMAGE_KEY].dim() != 2:
+            return super().extract_features(obs, features_extractor)
+
+        rest = {k: v for k, v in obs.items() if k != IMAGE_KEY}
+        preprocessed_obs = preprocess_obs(rest, self.observation_space, normalize_images=self.normalize_images)
+        preprocessed_obs[IMAGE_KEY] = obs[IMAGE_KEY].float()
+        return features_extractor(preprocessed_obs)
 
 
 class DiffrentRLPolicy(MultiInputPolicy):
-    def __init__(self, *args, **kwargs):
+    """
+    share_features_extractor=True이면 q_net과 q_net_target이 하나의 특징 추출기를 공유합니다.
+    - CNN이 고정되었거나 아주 느리게 학습될 때 타깃용 CNN 사본을 두지 않아 메모리를 줄입니다.
+    - 타깃 동기화(polyak_update)는 헤드(q_net.q_net)에만 적용됩니다.
+    """
+    def __init__(self, *args, share_features_extractor: bool = False, **kwargs):
+        # _build()가 부모 생성자 안에서 호출되므로 먼저 설정합니다.
+        self.share_features_extractor = share_features_extractor
         super().__init__(*args, **kwargs)
         print("Using custom DQN Policy with different RL.")
 
-    def make_optimizer(self) -> None:
+    def _build(self, lr_schedule) -> None:
+        self.q_net = self.make_q_net()
+        shared = self.q_net.features_extractor if self.share_features_extractor else None
+        self.q_net_target = self.make_q_net(features_extractor=shared)
+        self.q_net.shares_features_extractor = self.q_net_target.shares_features_extractor = shared is not None
+        self.q_net_target.load_state_dict(self.q_net.state_dict())
+        self.q_net_target.set_training_mode(False)
+
+        self.make_optimizer(lr_schedule)
+
+    def make_q_net(self, features_extractor=None) -> CachedEmbeddingQNetwork:
+        # 상태 사전(state_dict) 구조는 QNetwork와 동일하므로 기존 모델도 그대로 로드됩니다.
+        net_args = self._update_features_extractor(self.net_args, features_extractor=features_extractor)
+        return CachedEmbeddingQNetwork(**net_args).to(self.device)
+
+    def _get_constructor_parameters(self):
+        data = super()._get_constructor_parameters()
+        data.update(share_features_extractor=self.share_features_extractor)
+        return data
+
+    def make_optimizer(self, lr_schedule) -> None:
+        """
+        optimizer_kwargs에 cnn_lr가 있으면 CNN과 나머지(벡터 MLP + 헤드)를 별도 파라미터 그룹으로 나눕니다.
+        - cnn 그룹은 cnn_lr로 고정되며, 0이면 CNN을 고정(requires_grad=False)합니다.
+        - fc 그룹은 fc_lr가 주어지면 그 값으로 고정, 아니면 SB3 learning_rate 스케줄을 따릅니다.
+        - cnn_lr가 없으면 기존과 동일한 단일 그룹 옵티마이저를 만듭니다. (기존 체크포인트 호환)
+        """
         # 기본 옵티마이저 클래스/kwargs는 self.optimizer_class/self.optimizer_kwargs
-        cnn_params = list(self.features_extractor.parameters())
-        # q_net은 features → mlp(head) → q
-        head_params = [p for n, p in self.q_net.named_parameters() if "features_extractor" not in n]
+        # (policy_kwargs와 같은 dict이므로 pop하지 않고 복사본에서 꺼냄)
+        optimizer_kwargs = dict(self.optimizer_kwargs)
+        cnn_lr = optimizer_kwargs.pop("cnn_lr", None)
+        fc_lr = optimizer_kwargs.pop("fc_lr", None)
+        # 공유 모드에서는 q_net.parameters()가 헤드만 반환하므로 named_parameters를 사용
+        named_params = list(self.q_net.named_parameters())
 
-        cnn_lr = self.optimizer_kwargs.pop("cnn_lr", 0.000005)
-        fc_lr  = self.optimizer_kwargs.pop("fc_lr", 0.00002)
+        if cnn_lr is None:
+            self.optimizer = self.optimizer_class(
+                [p for _, p in named_params],
+                lr=lr_schedule(1),
+                **optimizer_kwargs,
+            )
+            return
 
+        # q_net은 features(CNN + 벡터 MLP) → mlp(head) → q
+        cnn_prefix = f"features_extractor.extractors.{IMAGE_KEY}."
+        cnn_params = [p for n, p in named_params if n.startswith(cnn_prefix)]
+        head_params = [p for n, p in named_params if not n.startswith(cnn_prefix)]
+
+        fc_group = {"params": head_params, "name": "fc"}
+        if fc_lr is not None:
+            fc_group.update(lr=fc_lr, fixed_lr=fc_lr)
         self.optimizer = self.optimizer_class(
             [
-                {"params": cnn_params,  "lr": cnn_lr, "name": "cnn"},
-                {"params": head_params, "lr": fc_lr,  "name": "fc"},
+                {"params": cnn_params, "lr": cnn_lr, "fixed_lr": cnn_lr, "name": "cnn"},
+                fc_group,
             ],
-            **self.optimizer_kwargs,
+            lr=lr_schedule(1),
+            **optimizer_kwargs,
         )
-        
+        # DQN.train()의 _update_learning_rate가 모든 그룹의 lr을 덮어쓰므로 step 직전에 되돌림
+        self.optimizer.register_step_pre_hook(_restore_fixed_lrs)
+        self.set_cnn_lr(cnn_lr)
+
+    def set_cnn_lr(self, cnn_lr: float) -> None:
+        """cnn 그룹의 학습률을 바꿉니다. 0이면 CNN을 고정하고, 양수면 다시 학습시킵니다. (해제 스케줄용)"""
+        for group in self.optimizer.param_groups:
+            if group.get("name") == "cnn":
+                group["lr"] = group["fixed_lr"] = cnn_lr
+        self.q_net.features_extractor.set_image_frozen(cnn_lr <= 0)
+
 
+def _restore_fixed_lrs(optimizer, args, kwargs) -> None:
+    for group in optimizer.param_groups:
+        if "fixed_lr" in group:
+            group["lr"] = group["fixed_lr"]
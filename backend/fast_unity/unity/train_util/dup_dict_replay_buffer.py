@@ -3,16 +3,27 @@ from typing import Any, Dict, List, Union
 import numpy as np
 from stable_baselines3.common.buffers import DictReplayBuffer
 
+from unity.train_util.dup_replay_buffer import FeedbackPatchMixin
 
-class DupDictReplayBuffer(DictReplayBuffer):
+
+class DupDictReplayBuffer(FeedbackPatchMixin, DictReplayBuffer):
     """
     '동적 카운트(cnt)'에 따라 동일 트랜지션을 여러 번 저장하는 커스텀 ReplayBuffer. (Dict 관측용)
 
-    - TeacherFeedbackWrapper가 info["tfw_cnt"]에 넣어준 값을 읽어
+    - TeacherFeedbackWrapper가 step_feedback 표에 써 준 cnt를 읽어
       해당 스텝을 동일하게 cnt번 반복 저장합니다.
-    - 현재 구현은 단일 환경(n_envs=1) 사용을 가정합니다.
+    - 늦게 도착한 피드백(step_feedback.patches)은 이미 저장된 전이에 반영합니다. (FeedbackPatchMixin)
+    - n_envs > 1이면 TeacherFeedbackVecWrapper가 환경별로 쓴 cnt만큼 해당 환경의 전이만 복사합니다.
     """
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._init_feedback_patch()
+
+    def _transition_arrays(self) -> List[np.ndarray]:
+        return [*self.observations.values(), *self.next_observations.values(),
+                self.actions, self.rewards, self.dones, self.timeouts]
+
     def add(
         self,
         obs: Dict[str, np.ndarray],
@@ -22,19 +33,14 @@ class DupDictReplayBuffer(DictReplayBuffer):
         done: np.ndarray,
         infos: List[Dict[str, Any]],
     ) -> None:
-        if self.n_envs != 1:
-            raise NotImplementedError(
-                "DupDictReplayBuffer는 현재 n_envs=1만 지원합니다."
-            )
-
-        # 기본값: 1회 저장
-        cnt = 1
-        if isinstance(infos, (list, tuple)) and len(infos) > 0 and isinstance(infos[0], dict):
-            try:
-                cnt = int(infos[0].get("tfw_cnt", 1))
-            except Exception:
-                cnt = 1
-
-        # 동일 전이를 cnt번 반복 저장
-        for _ in range(max(1, cnt)):
-            super().add(obs, next_obs, action, reward, done, infos)
\ No newline at end of file
+        if self.n_envs == 1:
+            # 동일 전이를 cnt번 반복 저장
+            for _ in range(self._step_cnt()):
+                super().add(obs, next_obs, action, reward, done, infos)
+                self._record_step()
+        else:
+            # 환경마다 cnt가 다르므로 한 번 저장한 뒤 환경별 복사본을 따로 씀
+            super().add(obs, next_obs, action, reward, done, infos)
+            self._record_step()
+            self._queue_env_copies()
+        self._apply_feedback_patches()
@@ -1,19 +1,129 @@
-from typing import Any, Dict, List, Union
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Tuple, Union
 
 import numpy as np
 from stable_baselines3.common.buffers import ReplayBuffer
 
+from unity.train_util.step_feedback import StepFeedbackTable
 
-class DupReplayBuffer(ReplayBuffer):
+
+class FeedbackPatchMixin(ABC):
+    """
+    피드백 래퍼가 쓰는 StepFeedbackTable(step_feedback)을 읽어 cnt만큼 반복 저장하고,
+    늦게 도착한 피드백으로 이미 저장된 전이를 보정하는 기능. (DupReplayBuffer / DupDictReplayBuffer 공용)
+
+    - step_feedback은 학습 시작 전에 attach_step_feedback(model.get_env())로 연결합니다. (없으면 cnt=1, 보정 없음)
+    - 표의 step 값을 버퍼 (위치, 환경)별로 기록합니다.
+    - 표의 patches 목록의 (대상 스텝, 셰이핑 보상, cnt)마다 대상 전이의 보상에 셰이핑 보상을 더하고,
+      cnt - 1개의 복사본을 추가로 저장합니다. (대상 전이가 이미 덮어쓰였으면 무시)
+    - n_envs > 1이면 버퍼 한 행에 환경 수만큼 칸이 있으므로, 환경별 복사본을 대기 목록에 모았다가
+      n_envs개가 모일 때마다 한 행으로 씁니다. (SB3는 (위치, 환경)을 균등하게 샘플링하므로 칸의 환경 번호는 무관)
+    """
+    step_feedback: Optional[StepFeedbackTable] = None
+
+    def _init_feedback_patch(self) -> None:
+        self.step_ids = np.full((self.buffer_size, self.n_envs), -1, dtype=np.int64)
+        # 아직 행으로 쓰지 못한 복사본 (원본 위치, 원본 환경, 원본 스텝)
+        self._pending_copies: List[Tuple[int, int, int]] = []
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # 표는 실행 중인 환경에 묶여 있으므로 save_replay_buffer에 포함하지 않음 (불러온 뒤 다시 연결)
+        state = self.__dict__.copy()
+        state.pop("step_feedback", None)
+        return state
+
+    @abstractmethod
+    def _transition_arrays(self) -> List[np.ndarray]:
+        """복사본을 만들 때 (위치, 환경) 단위로 함께 옮길 전이 배열 목록"""
+
+    def _step_cnt(self) -> int:
+        table = self.step_feedback
+        if table is None or not table.valid[0]:
+            return 1
+        return max(1, int(table.cnt[0]))
+
+    def _record_step(self) -> None:
+        # super().add() 직후 호출: 방금 저장한 위치는 self.pos - 1
+        table = self.step_feedback
+        row = (self.pos - 1) % self.buffer_size
+        if table is None:
+            self.step_ids[row] = -1
+        else:
+            self.step_ids[row] = np.where(table.valid, table.step, -1)
+
+    def _queue_env_copies(self) -> None:
+        """n_envs > 1: 방금 저장한 행에서 cnt > 1인 환경의 전이를 cnt - 1개씩 복사 대기열에 넣습니다."""
+        table = self.step_feedback
+        if table is None:
+            return
+        row = (self.pos - 1) % self.buffer_size
+        for env in np.flatnonzero(table.valid & (table.cnt > 1)):
+            self._queue_copies(row, int(env), int(table.cnt[env]) - 1)
+        self._flush_copies()
+
+    def _queue_copies(self, row: int, env: int, n: int) -> None:
+        if getattr(self, "optimize_memory_usage", False):
+            # next_obs를 다음 칸과 공유하므로 복사본을 만들 수 없음
+            return
+        self._pending_copies.extend([(row, env, int(self.step_ids[row, env]))] * n)
+
+    def _flush_copies(self) -> None:
+        pending = self._pending_copies
+        while len(pending) >= self.n_envs:
+            batch, pending[:] = pending[:self.n_envs], pending[self.n_envs:]
+            # 그사이 덮어쓰인 원본은 제외
+            batch = [(row, env, step) for row, env, step in batch if self.step_ids[row, env] == step]
+            if len(batch) < self.n_envs:
+                pending[:0] = batch
+                continue
+            rows = np.array([row for row, _, _ in batch])
+            envs = np.array([env for _, env, _ in batch])
+            if self.pos in rows:
+                # 원본 행을 덮어쓰게 되므로 복사 중단
+                pending.clear()
+                return
+            dst = self.pos
+            for array in self._transition_arrays():
+                array[dst] = array[rows, envs]
+            self.step_ids[dst] = self.step_ids[rows, envs]
+            self.pos += 1
+            if self.pos == self.buffer_size:
+                self.full = True
+                self.pos = 0
+
+    def _apply_feedback_patches(self) -> None:
+        if self.step_feedback is None:
+            return
+        for patches in self.step_feedback.patches:
+            for target_step, shaped, cnt in patches:
+                rows, envs = np.nonzero(self.step_ids == target_step)
+                if len(rows) == 0:
+                    continue
+                self.rewards[rows, envs] += shaped
+                self._queue_copies(int(rows[0]), int(envs[0]), max(1, cnt) - len(rows))
+        self._flush_copies()
+
+
+class DupReplayBuffer(FeedbackPatchMixin, ReplayBuffer):
     """
     '동적 카운트(cnt)'에 따라 동일 트랜지션을 여러 번 저장하는 커스텀 ReplayBuffer.
 
-    - TeacherFeedbackWrapper가 info["tfw_cnt"]에 넣어준 값을 읽어
+    - TeacherFeedbackWrapper가 step_feedback 표에 써 준 cnt를 읽어
       해당 스텝을 동일하게 cnt번 반복 저장합니다.
-    - 현재 구현은 단일 환경(n_envs=1) 사용을 가정합니다.
-      (Unity 실행을 single-env로 돌리는 일반적인 설정에 부합)
+    - 늦게 도착한 피드백(step_feedback.patches)은 이미 저장된 전이에 반영합니다. (FeedbackPatchMixin)
+    - n_envs > 1이면 TeacherFeedbackVecWrapper가 환경별로 쓴 cnt만큼 해당 환경의 전이만 복사합니다.
     """
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._init_feedback_patch()
+
+    def _transition_arrays(self) -> List[np.ndarray]:
+        arrays = [self.observations, self.actions, self.rewards, self.dones, self.timeouts]
+        if not self.optimize_memory_usage:
+            arrays.append(self.next_observations)
+        return arrays
+
     def add(
         self,
         obs: Union[np.ndarray, Dict[str, np.ndarray]],
@@ -23,23 +133,14 @@ class DupReplayBuffer(ReplayBuffer):
         done: np.ndarray,
         infos: List[Dict[str, Any]],
     ) -> None:
-        # 멀티 환경일 경우에는 per-env로 쪼개어 중복 삽입하는 로직을 별도로 구현해야 합니다.
-        if self.n_envs != 1:
-            raise NotImplementedError(
-                "DupReplayBuffer는 현재 n_envs=1만 지원합니다. "
-                "멀티 환경을 쓰려면 per-env로 분기하여 add 호출을 확장하세요."
-            )
-
-        # 기본값: 1회 저장
-        cnt = 1
-        if isinstance(infos, (list, tuple)) and len(infos) > 0 and isinstance(infos[0], dict):
-            try:
-                cnt = int(infos[0].get("tfw_cnt", 1))
-            except Exception:
-                cnt = 1
-
-        cnt = max(1, cnt)
-
-        # 동일 전이를 cnt번 반복 저장
-        for _ in range(cnt):
+        if self.n_envs == 1:
+            # 동일 전이를 cnt번 반복 저장
+            for _ in range(self._step_cnt()):
+                super().add(obs, next_obs, action, reward, done, infos)
+                self._record_step()
+        else:
+            # 환경마다 cnt가 다르므로 한 번 저장한 뒤 환경별 복사본을 따로 씀
             super().add(obs, next_obs, action, reward, done, infos)
+            self._record_step()
+            self._queue_env_copies()
+        self._apply_feedback_patches()
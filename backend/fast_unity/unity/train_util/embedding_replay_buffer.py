@@ -0,0 +1,94 @@
+from typing import Any, Callable, Dict, List, Optional, Union
+
+import numpy as np
+import torch as th
+from gymnasium import spaces
+
+from unity.train_util.dup_dict_replay_buffer import DupDictReplayBuffer
+from unity.train_util.custom_extractor import IMAGE_KEY
+
+
+class EmbeddingDictReplayBuffer(DupDictReplayBuffer):
+    """
+    이미지 대신 고정(frozen)된 CNN의 임베딩을 저장하는 DupDictReplayBuffer. (SRL / hf-llm용)
+
+    - 삽입 시점에 encoder로 이미지(obs_0)를 cnn_output_dim 벡터로 바꿔 저장합니다.
+      그래디언트 스텝에서는 CNN을 다시 돌리지 않고 벡터 MLP와 헤드만 계산합니다.
+    - encoder는 모델 생성 후(교사 가중치 복사 후) set_encoder로 연결합니다.
+    - 직전 next_obs의 임베딩을 기억해 두었다가 다음 obs가 같으면 재사용합니다.
+    """
+
+    def __init__(
+        self,
+        buffer_size: int,
+        observation_space: spaces.Dict,
+        action_space: spaces.Space,
+        device: Union[th.device, str] = "auto",
+        n_envs: int = 1,
+        optimize_memory_usage: bool = False,
+        handle_timeout_termination: bool = True,
+        embedding_dim: int = 128,
+    ):
+        # 이미지 키의 저장 공간을 임베딩 크기의 float32 벡터로 교체
+        embedded_space = spaces.Dict({
+            key: (spaces.Box(-np.inf, np.inf, shape=(embedding_dim,), dtype=np.float32)
+                  if key == IMAGE_KEY else subspace)
+            for key, subspace in observation_space.spaces.items()
+        })
+        super().__init__(
+            buffer_size,
+            embedded_space,
+            action_space,
+            device=device,
+            n_envs=n_envs,
+            optimize_memory_usage=optimize_memory_usage,
+            handle_timeout_termination=handle_timeout_termination,
+        )
+        self.encoder: Optional[Callable[[np.ndarray], np.ndarray]] = None
+        self._last_next_image: Optional[np.ndarray] = None
+        self._last_next_embedding: Optional[np.ndarray] = None
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # encoder는 모델에 묶인 클로저이므로 save_replay_buffer에 포함하지 않음 (불러온 뒤 set_encoder로 다시 연결)
+        state = super().__getstate__()
+        state.update(encoder=None, _last_next_image=None, _last_next_embedding=None)
+        return state
+
+    def set_encoder(self, encoder: Callable[[np.ndarray], np.ndarray]) -> None:
+        """uint8 이미지 배치 (n_envs, C, H, W) → 임베딩 (n_envs, embedding_dim) 변환 함수를 등록합니다."""
+        self.encoder = encoder
+        self._last_next_image = None
+        self._last_next_embedding = None
+
+    def _embed(self, obs: Dict[str, np.ndarray], is_next: bool) -> Dict[str, np.ndarray]:
+        image = obs[IMAGE_KEY]
+        if (not is_next and self._last_next_image is not None
+                and np.array_equal(image, self._last_next_image)):
+            embedding = self._last_next_embedding
+        else:
+            embedding = self.encoder(image)
+
+        if is_next:
+            self._last_next_image = np.array(image, copy=True)
+            self._last_next_embedding = embedding
+
+        embedded = dict(obs)
+        embedded[IMAGE_KEY] = embedding
+        return embedded
+
+    def add(
+        self,
+        obs: Dict[str, np.ndarray],
+        next_obs: Dict[str, np.ndarray],
+        action: np.ndarray,
+        reward: np.ndarray,
+        done: np.ndarray,
+        infos: List[Dict[str, Any]],
+    ) -> None:
+        if self.encoder is None:
+            raise RuntimeError("EmbeddingDictReplayBuffer에 encoder가 설정되지 않았습니다.")
+
+        # 중복 저장(tfw_cnt)과 무관하게 임베딩은 전이당 한 번만 계산
+        obs = self._embed(obs, is_next=False)
+        next_obs = self._embed(next_obs, is_next=True)
+        super().add(obs, next_obs, action, reward, done, infos)
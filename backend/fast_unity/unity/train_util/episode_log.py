@@ -0,0 +1,126 @@
+import glob
+import os
+import time
+from datetime import datetime
+from typing import Dict, List
+
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+
+EPISODE_LOG_DIR = "episodes"
+
+EPISODE_SCHEMA = pa.schema([
+    ("ts", pa.int64()),              # 현재 timesteps
+    ("episode_index", pa.int64()),   # 진행된 에피소드 누계
+    ("env_index", pa.int16()),       # 어떤 벡터환경 인덱스에서 끝났는지
+    ("episode_reward", pa.float64()),
+    ("episode_length", pa.int32()),
+    ("wall_time", pa.float64()),     # epoch 초 (CSV로 내보낼 때만 문자열로 변환)
+    ("feedback_pos", pa.int32()),    # 에피소드 동안 받은 긍정/부정/중립 피드백 수 (피드백 래퍼가 없으면 0)
+    ("feedback_neg", pa.int32()),
+    ("feedback_neutral", pa.int32()),
+])
+
+
+def episode_log_dir(log_dir: str) -> str:
+    return os.path.join(log_dir, EPISODE_LOG_DIR)
+
+
+def _segments(log_dir: str) -> List[str]:
+    return sorted(glob.glob(os.path.join(episode_log_dir(log_dir), "part-*.arrows")))
+
+
+class EpisodeLogWriter:
+    """
+    에피소드 기록을 Arrow IPC 스트림 세그먼트(episodes/part-00000.arrows ...)에 컬럼형으로 저장합니다.
+
+    - 행을 메모리에 모았다가 flush_rows개 또는 flush_interval초마다 레코드 배치 하나로 쓰고 fsync합니다.
+      비정상 종료 시에도 마지막으로 완성된 배치까지는 읽을 수 있습니다.
+    - 학습 세션(시작/이어서 학습)마다 새 세그먼트를 만들고, 새로 학습하면(append=False) 기존 세그먼트를 지웁니다.
+    """
+
+    def __init__(self, log_dir: str, append: bool = False, flush_rows: int = 256, flush_interval: float = 5.0):
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        directory = episode_log_dir(log_dir)
+        os.makedirs(directory, exist_ok=True)
+        existing = _segments(log_dir)
+        if not append:
+            for path in existing:
+                os.remove(path)
+            existing = []
+        self.path = os.path.join(directory, f"part-{len(existing):05d}.arrows")
+        self._file = open(self.path, "wb")
+        self._writer = pa.ipc.new_stream(self._file, EPISODE_SCHEMA)
+        self._columns: Dict[str, list] = {name: [] for name in EPISODE_SCHEMA.names}
+        self._last_flush = time.monotonic()
+
+    def add(self, **row) -> None:
+        for name, column in self._columns.items():
+            column.append(row.get(name))
+        if len(self._columns["ts"]) >= self.flush_rows or time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self) -> None:
+        if self._writer is None:
+            return
+        if self._columns["ts"]:
+            batch = pa.RecordBatch.from_pydict(self._columns, schema=EPISODE_SCHEMA)
+            self._writer.write_batch(batch)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            for column in self._columns.values():
+                column.clear()
+        self._last_flush = time.monotonic()
+
+    def close(self) -> None:
+        if self._writer is None:
+            return
+        self.flush()
+        self._writer.close()
+        self._file.close()
+        self._writer = None
+
+
+def read_episode_log(log_dir: str) -> pa.Table:
+    """모든 세그먼트를 하나의 테이블로 읽습니다. (쓰는 중이거나 잘린 마지막 배치는 건너뜀)"""
+    batches = []
+    for path in _segments(log_dir):
+        with open(path, "rb") as f:
+            try:
+                reader = pa.ipc.open_stream(f)
+                for batch in reader:
+                    batches.append(batch)
+            except (pa.ArrowInvalid, OSError):
+                continue
+    return pa.Table.from_batches(batches, schema=EPISODE_SCHEMA)
+
+
+def count_episodes(log_dir: str) -> int:
+    return read_episode_log(log_dir).num_rows
+
+
+def has_episode_log(log_dir: str) -> bool:
+    return bool(_segments(log_dir))
+
+
+def export_episode_csv(log_dir: str, csv_path: str) -> str:
+    """
+    컬럼형 에피소드 기록을 CSV로 내보냅니다. (다운로드 요청 시에만 호출)
+    세그먼트보다 최신인 CSV가 이미 있으면 다시 만들지 않습니다.
+    """
+    segments = _segments(log_dir)
+    if os.path.exists(csv_path) and segments and \
+            os.path.getmtime(csv_path) >= max(os.path.getmtime(path) for path in segments):
+        return csv_path
+
+    table = read_episode_log(log_dir)
+    wall_time = [
+        datetime.fromtimestamp(value).isoformat(timespec="seconds") if value is not None else None
+        for value in table.column("wall_time").to_pylist()
+    ]
+    table = table.set_column(table.schema.get_field_index("wall_time"), "wall_time", pa.array(wall_time, pa.string()))
+    tmp_path = csv_path + ".tmp"
+    pa_csv.write_csv(table, tmp_path, pa_csv.WriteOptions(quoting_style="none"))
+    os.replace(tmp_path, csv_path)
+    return csv_path
@@ -0,0 +1,190 @@
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, Optional
+
+import requests
+
+
+class _Event:
+    __slots__ = ("endpoint", "payload", "droppable", "max_retries")
+
+    def __init__(self, endpoint: str, payload: Dict[str, Any], droppable: bool, max_retries: int):
+        self.endpoint = endpoint
+        self.payload = payload
+        self.droppable = droppable
+        self.max_retries = max_retries
+
+
+class EventBus:
+    """
+    Node.js API 서버로 보내는 HTTP 이벤트(메트릭, 완료 콜백)를 백그라운드 스레드에서 전송하는 버스.
+
+    - publish()는 큐에 넣기만 하므로 학습 스레드(Unity 스텝)가 네트워크 지연에 막히지 않습니다.
+    - 완료 콜백(droppable=False)은 별도의 우선 큐에 들어가 대기 중인 메트릭보다 먼저 전송됩니다.
+      메트릭 재시도 대기 중에 완료 콜백이 들어오면 그 메트릭은 포기합니다.
+    - 메트릭(droppable)은 엔드포인트별로 합쳐져 아직 전송되지 않은 것 중 가장 최신 값 하나만 남습니다.
+    - 실패하면 지수 백오프로 재시도합니다. 메트릭은 적게, 완료 콜백은 여러 번 재시도합니다.
+    - 메트릭 엔드포인트가 max_queue개를 넘으면 가장 오래된 메트릭부터 버립니다. 완료 콜백은 버리지 않습니다.
+    - 프로세스 종료 전에 close()로 메트릭은 버리고 남은 완료 콜백만 전송해야 합니다.
+    """
+
+    def __init__(
+        self,
+        max_queue: int = 1000,
+        timeout: float = 5.0,
+        backoff: float = 0.5,
+        max_backoff: float = 8.0,
+    ):
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+        self._priority: Deque[_Event] = deque()
+        self._metrics: "OrderedDict[str, _Event]" = OrderedDict()
+        self._cond = threading.Condition()
+        self._inflight = 0
+        self._closing = False
+        self._session: Optional[requests.Session] = None
+        self._thread: Optional[threading.Thread] = None
+
+        self.sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.failed = 0
+        self.retried = 0
+
+    def publish(self, endpoint: str, payload: Dict[str, Any], droppable: bool = True,
+                max_retries: Optional[int] = None) -> None:
+        """이벤트를 큐에 넣습니다. droppable=False(완료 콜백 등)는 큐가 가득 차도 버리지 않습니다."""
+        if max_retries is None:
+            max_retries = 1 if droppable else 5
+        event = _Event(endpoint, payload, droppable, max_retries)
+        with self._cond:
+            if not droppable:
+                self._priority.append(event)
+            elif self._closing:
+                self.dropped += 1
+                return
+            elif endpoint in self._metrics:
+                # 아직 전송 전인 같은 엔드포인트의 메트릭은 최신 값으로 교체
+                self._metrics[endpoint] = event
+                self.coalesced += 1
+            else:
+                if len(self._metrics) >= self.max_queue:
+                    self._metrics.popitem(last=False)
+                    self.dropped += 1
+                self._metrics[endpoint] = event
+            self._cond.notify_all()
+        self._ensure_started()
+
+    def stats(self) -> Dict[str, int]:
+        with self._cond:
+            return {
+                "queue_depth": len(self._priority) + len(self._metrics) + self._inflight,
+                "sent": self.sent,
+                "dropped": self.dropped,
+                "coalesced": self.coalesced,
+                "failed": self.failed,
+                "retried": self.retried,
+            }
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """큐가 빌 때까지 기다립니다. 시간 초과면 False"""
+        with self._cond:
+            return self._cond.wait_for(
+                lambda: not self._priority and not self._metrics and self._inflight == 0, timeout)
+
+    def close(self, timeout: Optional[float] = None) -> bool:
+        """
+        프로세스 종료 직전에 호출합니다. 대기 중인 메트릭은 버리고(재시도 중인 메트릭도 포기)
+        완료 콜백만 전송될 때까지 기다립니다. 시간 초과면 False
+        """
+        with self._cond:
+            self._closing = True
+            self.dropped += len(self._metrics)
+            self._metrics.clear()
+            self._cond.notify_all()
+        return self.flush(timeout)
+
+    # ---- 내부 ----
+    def _ensure_started(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._cond:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="event-bus", daemon=True)
+                self._thread.start()
+
+    def _next_event(self) -> _Event:
+        with self._cond:
+            self._cond.wait_for(lambda: self._priority or self._metrics)
+            if self._priority:
+                event = self._priority.popleft()
+            else:
+                _, event = self._metrics.popitem(last=False)
+            self._inflight = 1
+            return event
+
+    def _run(self) -> None:
+        self._session = requests.Session()
+        while True:
+            event = self._next_event()
+            result = self._deliver(event)
+            with self._cond:
+                self._inflight = 0
+                if result is None:
+                    self.dropped += 1
+                elif result:
+                    self.sent += 1
+                else:
+                    self.failed += 1
+                self._cond.notify_all()
+
+    def _should_abandon(self, event: _Event) -> bool:
+        # 재시도를 기다리는 메트릭이 완료 콜백이나 종료를 막지 않도록 함
+        return event.droppable and (self._closing or bool(self._priority))
+
+    def _deliver(self, event: _Event) -> Optional[bool]:
+        """성공 True, 실패 False, 메트릭을 중간에 포기하면 None"""
+        delay = self.backoff
+        for attempt in range(event.max_retries + 1):
+            try:
+                resp = self._session.post(event.endpoint, json=event.payload, timeout=self.timeout)
+                if resp.status_code < 500:
+                    if resp.status_code >= 400:
+                        # 요청 자체가 잘못된 경우는 재시도해도 같으므로 포기
+                        print(f"[EventBus][WARN] {event.endpoint} 응답 {resp.status_code}")
+                    return resp.status_code < 400
+                error = f"HTTP {resp.status_code}"
+            except requests.RequestException as e:
+                error = str(e)
+
+            if attempt == event.max_retries:
+                print(f"[EventBus][ERROR] 이벤트 전송 실패 ({attempt + 1}회 시도) -> {event.endpoint}: {error}")
+                return False
+            with self._cond:
+                if self._should_abandon(event):
+                    return None
+                self.retried += 1
+                # 백오프 중에도 완료 콜백/종료가 들어오면 바로 깨어남
+                self._cond.wait_for(lambda: self._should_abandon(event), min(delay, self.max_backoff))
+                if self._should_abandon(event):
+                    return None
+            delay *= 2
+        return False
+
+
+_bus: Optional[EventBus] = None
+_bus_lock = threading.Lock()
+
+
+def get_event_bus() -> EventBus:
+    """프로세스마다 하나의 EventBus를 사용합니다. (API 프로세스 / 각 학습·추론 워커 프로세스)"""
+    global _bus
+    if _bus is None:
+        with _bus_lock:
+            if _bus is None:
+                _bus = EventBus()
+    return _bus
@@ -0,0 +1,316 @@
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+import openai
+
+try:
+    import fcntl
+except ImportError:  # Windows: 파일 잠금 없이 병합만 함
+    fcntl = None
+
+# 점수는 LLM 프롬프트와 같은 척도: 0.0(매우 긍정) ~ 1.0(매우 부정/위험)
+# "천천히", "감속", "brake"처럼 현재 행동에 따라 칭찬도 지적도 되는 지시는 넣지 않습니다. (캐시/LLM이 행동 설명과 함께 판단)
+FEEDBACK_LEXICON: Dict[str, float] = {
+    # 긍정
+    "좋아": 0.1, "좋다": 0.1, "좋네": 0.1, "좋았": 0.1, "잘했": 0.05, "잘한다": 0.05, "잘하네": 0.05, "잘해": 0.1,
+    "최고": 0.0, "완벽": 0.0, "훌륭": 0.0, "굿": 0.1, "나이스": 0.1, "그렇지": 0.15, "맞아": 0.15, "옳지": 0.1,
+    "good": 0.1, "nice": 0.1, "great": 0.05, "perfect": 0.0, "excellent": 0.0, "well done": 0.05,
+    "good job": 0.05, "awesome": 0.0, "yes": 0.2, "correct": 0.15, "keep going": 0.2, "keep it up": 0.1,
+    # 중립
+    "괜찮": 0.4, "보통": 0.5, "그냥": 0.5, "글쎄": 0.5, "애매": 0.55,
+    "ok": 0.4, "okay": 0.4, "fine": 0.4, "meh": 0.55, "so so": 0.5, "not bad": 0.35,
+    # 부정
+    "안 좋": 0.8, "안좋": 0.8, "별로": 0.7, "나빠": 0.8, "나쁘": 0.8, "못했": 0.8, "못하": 0.75, "틀렸": 0.8, "아니야": 0.75,
+    "아니": 0.7, "안돼": 0.8, "안 돼": 0.8, "하지마": 0.8, "하지 마": 0.8, "느려": 0.7, "너무 빨라": 0.75, "빨라": 0.7,
+    "늦게": 0.7, "일찍": 0.65, "벗어": 0.85, "이탈": 0.85,
+    "충돌": 1.0, "박았": 1.0, "부딪": 1.0, "위험": 0.95, "사고": 1.0, "최악": 1.0,
+    "bad": 0.8, "no": 0.75, "wrong": 0.8, "stop": 0.75, "don't": 0.75, "too fast": 0.75, "too slow": 0.7,
+    "careful": 0.7, "off track": 0.85, "off the road": 0.85,
+    "crash": 1.0, "crashed": 1.0, "collision": 1.0, "dangerous": 0.95, "terrible": 1.0, "awful": 1.0, "worst": 1.0,
+}
+
+_NEGATION_PREFIXES = ("not ", "never ", "isn't ", "wasn't ")
+
+# 이 점수 이하/이상을 긍정/부정 신호로 봄 (둘 다 있으면 어휘 사전으로 판단하지 않음)
+_POSITIVE_MAX = 0.3
+_NEGATIVE_MIN = 0.6
+
+
+def normalize_message(message: str) -> str:
+    """캐시 키용 정규화: 소문자, 앞뒤 공백/문장부호 제거, 연속 공백 하나로"""
+    text = re.sub(r"\s+", " ", message.lower()).strip()
+    return re.sub(r"^[^\w가-힣]+|[^\w가-힣]+$", "", text)
+
+
+class FeedbackScorer:
+    """사용자 메시지(+행동 설명)를 부정 정도 점수 [0.0, 1.0]로 바꾸는 인터페이스. 판단할 수 없으면 None"""
+    name = "base"
+
+    def score(self, message: str, action_description: str) -> Optional[float]:
+        raise NotImplementedError
+
+
+class LexiconFeedbackScorer(FeedbackScorer):
+    """
+    내장 어휘 사전으로 오프라인 채점합니다. (한국어/영어 짧은 표현)
+    - 긴 표현부터 겹치지 않게 찾고, 찾은 표현 점수의 평균을 반환합니다. 하나도 없으면 None.
+    - 영어는 단어 전체가 같을 때만, 한국어는 어절 첫머리에서만 매칭합니다. ("know"의 no, "자브레이크"처럼 단어 중간은 제외)
+    - 긍정 표현과 부정 표현이 함께 있으면("좋은데 너무 빨라") None을 반환해 LLM이 판단하게 합니다.
+    - 영어 표현 앞의 not/never는 점수를 뒤집습니다. 한국어 부정 표현("안 좋")은 사전에 직접 넣습니다.
+    - 행동 설명은 쓰지 않으므로, 뜻이 행동에 따라 달라지는 지시("천천히")는 사전에 없고 None이 됩니다.
+    """
+    name = "lexicon"
+
+    def __init__(self, lexicon: Optional[Dict[str, float]] = None):
+        self.lexicon = dict(FEEDBACK_LEXICON if lexicon is None else lexicon)
+        alternatives = []
+        for phrase in sorted(self.lexicon, key=len, reverse=True):
+            pattern = re.escape(phrase)
+            if phrase.isascii():
+                # 영어는 단어 경계에서만 매칭 ("no"가 "now"/"know"/"nothing"에 걸리지 않도록)
+                pattern = rf"(?<![\w']){pattern}(?![\w'])"
+            else:
+                # 한국어는 어미/조사가 붙으므로 어절 첫머리에서만 매칭 ("좋아요"는 매칭, "안좋"의 "좋"은 제외)
+                pattern = rf"(?<![\w가-힣]){pattern}"
+            alternatives.append(pattern)
+        self._pattern = re.compile("|".join(alternatives))
+
+    def score(self, message: str, action_description: str = "") -> Optional[float]:
+        text = normalize_message(message)
+        scores = []
+        for match in self._pattern.finditer(text):
+            value = self.lexicon[match.group(0)]
+            if text[:match.start()].endswith(_NEGATION_PREFIXES):
+                value = 1.0 - value
+            scores.append(value)
+        if not scores:
+            return None
+        if min(scores) <= _POSITIVE_MAX and max(scores) >= _NEGATIVE_MIN:
+            return None
+        return sum(scores) / len(scores)
+
+
+class CachedFeedbackScorer(FeedbackScorer):
+    """
+    (정규화한 행동 설명, 메시지) → 점수 캐시. 배포 환경마다 JSON 파일(FEEDBACK_CACHE_PATH)로 저장되어 재시작 후에도 유지됩니다.
+    - 같은 메시지라도 행동에 따라 LLM 점수가 다르므로("천천히"는 감속 중이면 긍정) 행동 설명도 키에 넣습니다.
+    - 저장은 save_interval초에 한 번으로 묶고, close() 때 남은 변경을 씁니다.
+    - 여러 워커 프로세스가 같은 파일을 쓰므로, 저장할 때 파일 잠금(.lock)을 잡고 디스크의 항목을 다시 읽어
+      병합한 뒤 프로세스마다 고유한 임시 파일에 써서 교체합니다.
+    """
+    name = "cache"
+
+    def __init__(self, path: Optional[str] = None, max_entries: int = 10000, save_interval: float = 5.0):
+        self.path = path or os.environ.get("FEEDBACK_CACHE_PATH", "feedback_cache.json")
+        self.max_entries = max_entries
+        self.save_interval = save_interval
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._last_save = time.monotonic()
+        self._entries: Dict[str, float] = self._read_file()
+
+    def _read_file(self) -> Dict[str, float]:
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                # 행동 설명이 키에 없던 이전 형식의 항목은 버림
+                return {str(k): float(v) for k, v in json.load(f).items() if "\t" in str(k)}
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError, AttributeError) as e:
+            print(f"[CachedFeedbackScorer][WARN] 캐시 파일을 읽지 못했습니다: {e}")
+            return {}
+
+    @contextmanager
+    def _file_lock(self) -> Iterator[None]:
+        if fcntl is None:
+            yield
+            return
+        with open(self.path + ".lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @staticmethod
+    def cache_key(message: str, action_description: str = "") -> str:
+        message = normalize_message(message)
+        if not message:
+            return ""
+        # 정규화하면 탭이 남지 않으므로 구분자로 사용
+        return f"{normalize_message(action_description)}\t{message}"
+
+    def score(self, message: str, action_description: str = "") -> Optional[float]:
+        return self._entries.get(self.cache_key(message, action_description))
+
+    def put(self, message: str, action_description: str, value: float) -> None:
+        key = self.cache_key(message, action_description)
+        if not key:
+            return
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = float(value)
+            # 가장 오래 전에 저장된 항목부터 제거
+            while len(self._entries) > self.max_entries:
+                del self._entries[next(iter(self._entries))]
+            self._dirty = True
+        if time.monotonic() - self._last_save >= self.save_interval:
+            self.save()
+
+    def save(self) -> None:
+        with self._lock:
+            if not self._dirty:
+                return
+            entries = dict(self._entries)
+            self._dirty = False
+            self._last_save = time.monotonic()
+        directory = os.path.dirname(self.path) or "."
+        try:
+            os.makedirs(directory, exist_ok=True)
+            with self._file_lock():
+                # 다른 프로세스가 그사이 저장한 항목을 유지하고, 같은 키는 이 프로세스의 값으로 덮어씀
+                merged = self._read_file()
+                for key, value in entries.items():
+                    merged.pop(key, None)
+                    merged[key] = value
+                while len(merged) > self.max_entries:
+                    del merged[next(iter(merged))]
+                fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=os.path.basename(self.path), suffix=".tmp")
+                try:
+                    with os.fdopen(fd, "w", encoding="utf-8") as f:
+                        json.dump(merged, f, ensure_ascii=False)
+                    os.replace(tmp_path, self.path)
+                except BaseException:
+                    os.unlink(tmp_path)
+                    raise
+        except OSError as e:
+            print(f"[CachedFeedbackScorer][WARN] 캐시 저장 실패: {e}")
+            return
+        with self._lock:
+            # 이 프로세스가 저장 뒤에 넣은 항목은 유지
+            for key, value in self._entries.items():
+                if entries.get(key) != value:
+                    merged.pop(key, None)
+                    merged[key] = value
+            while len(merged) > self.max_entries:
+                del merged[next(iter(merged))]
+            self._entries = merged
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class LLMFeedbackScorer(FeedbackScorer):
+    """원격 LLM(gpt-4o-mini)으로 채점합니다. 실패하거나 시간이 초과되면 None"""
+    name = "llm"
+
+    system_prompt = """
+        당신은 강화학습 에이전트의 행동과 그에 대한 사용자 피드백을 분석하는 시스템입니다.
+        주어진 피드백이 에이전트의 행동에 대해 얼마나 부정적인지를 [0.0, 1.0] 사이의 연속적인 값으로 평가해주세요.
+        - 0.0: 매우 긍정적 (올바른 행동)
+        - 0.1 ~ 0.3: 다소 긍정적
+        - 0.4 ~ 0.6: 중립적이거나 불분명함
+        - 0.7 ~ 0.9: 다소 부정적 (약간의 실수)
+        - 1.0: 매우 부정적이거나 위험함 (큰 실수, 충돌 등)
+
+        다른 설명 없이 {"feedback": [결과 값]} 형태의 JSON으로만 반환하시오.
+        결과 값은 0.0과 1.0 사이의 실수(float)여야 합니다.
+        """
+
+    def __init__(self, timeout: float = 10.0, model: str = "gpt-4o-mini"):
+        self.model = model
+        self.client = openai.OpenAI(api_key=os.environ.get("OPENAI_API_KEY"), timeout=timeout, max_retries=1)
+
+    def score(self, message: str, action_description: str) -> Optional[float]:
+        full_prompt = (
+            f"에이전트가 방금 '{action_description}' 행동을 했습니다.\n"
+            f"이에 대한 사용자 피드백은 다음과 같습니다: '{message}'"
+        )
+        try:
+            completion = self.client.chat.completions.create(
+                model=self.model,
+                messages=[
+                    {"role": "system", "content": self.system_prompt},
+                    {"role": "user", "content": full_prompt},
+                ],
+                response_format={"type": "json_object"},
+                temperature=0.0,
+            )
+            content = completion.choices[0].message.content
+            response_data = json.loads(content)
+            feedback_score = float(response_data["feedback"])
+
+            if not (0.0 <= feedback_score <= 1.0):
+                raise ValueError("피드백 점수는 0.0과 1.0 사이여야 합니다.")
+            return feedback_score
+        except (openai.APIError, ValueError, IndexError, json.JSONDecodeError, KeyError, TypeError) as e:
+            print(f"[LLMFeedbackScorer] API 호출 또는 응답 처리 중 오류 발생: {e}")
+            return None
+
+
+class ChainedFeedbackScorer(FeedbackScorer):
+    """
+    캐시 → 로컬 어휘 사전 → 원격 LLM 순으로 채점합니다.
+    - score_local()은 캐시와 로컬 채점기만 사용하므로 마이크로초 단위로 끝납니다. (None이면 원격 채점 필요)
+    - 원격 LLM 결과는 캐시에 저장해 같은 표현은 다음부터 로컬에서 바로 채점됩니다.
+    - remote가 None이면(OPENAI_API_KEY 없음 등) 완전히 오프라인으로 동작합니다.
+    """
+    name = "chain"
+
+    def __init__(self, cache: Optional[CachedFeedbackScorer] = None,
+                 local: Optional[List[FeedbackScorer]] = None,
+                 remote: Optional[FeedbackScorer] = None):
+        self.cache = cache
+        self.local = list(local or [])
+        self.remote = remote
+        self.hits: Dict[str, int] = {}
+        self.last_source: Optional[str] = None
+
+    def _hit(self, source: str) -> None:
+        self.hits[source] = self.hits.get(source, 0) + 1
+        self.last_source = source
+
+    def score_local(self, message: str, action_description: str = "") -> Optional[float]:
+        if self.cache is not None:
+            value = self.cache.score(message, action_description)
+            if value is not None:
+                self._hit(self.cache.name)
+                return value
+        for scorer in self.local:
+            value = scorer.score(message, action_description)
+            if value is not None:
+                self._hit(scorer.name)
+                return value
+        return None
+
+    def score_remote(self, message: str, action_description: str) -> Optional[float]:
+        if self.remote is None:
+            return None
+        value = self.remote.score(message, action_description)
+        if value is not None:
+            self._hit(self.remote.name)
+            if self.cache is not None:
+                self.cache.put(message, action_description, value)
+        return value
+
+    def score(self, message: str, action_description: str) -> Optional[float]:
+        value = self.score_local(message, action_description)
+        if value is None:
+            value = self.score_remote(message, action_description)
+        return value
+
+    def close(self) -> None:
+        if self.cache is not None:
+            self.cache.save()
+
+
+def default_feedback_scorer(timeout: float = 10.0) -> ChainedFeedbackScorer:
+    """배포 캐시 + 내장 어휘 사전 + (OPENAI_API_KEY가 있으면) gpt-4o-mini"""
+    remote = LLMFeedbackScorer(timeout=timeout) if os.environ.get("OPENAI_API_KEY") else None
+    return ChainedFeedbackScorer(cache=CachedFeedbackScorer(), local=[LexiconFeedbackScorer()], remote=remote)
@@ -1,8 +1,11 @@
 
+from bisect import bisect_right
 from typing import Callable, Optional, Tuple, Union
 import gymnasium as gym
 import numpy as np
 from typing import Dict
+from stable_baselines3.common.vec_env import VecEnv, VecEnvWrapper
+from unity.train_util.step_feedback import FeedbackScheduleMixin, StepFeedbackTable, StepFeedbackWriterMixin
 
 def cnt_for_fb(fb: int, steps_since_warmup: int, total_remaining_steps: int) -> int:
     """'동적 카운트' 전략: 학습 진행도(스텝 기반)에 따라 피드백 강도를 조절"""
@@ -53,14 +56,137 @@ def action_distance(i, j, actions, max_dist=2.0):
     return cosine_dist / max_dist
 
 
+class FeedbackTables:
+    """
+    이산 행동 쌍(학생, 교사)의 거리/피드백 행렬과 스텝별 cnt 스케줄을 미리 계산해 둔 표.
+
+    - distance[i, j] = action_distance(i, j), feedback[i, j] = to_feedback(distance[i, j]) (행동 수 x 행동 수)
+    - cnt는 학습 진행도에 따라 단조 감소하므로 피드백 값마다 cnt가 바뀌는 스텝 경계만 저장합니다.
+      (cnt_for_fb를 이진 탐색으로 평가해 만들므로 원래 함수와 결과가 같습니다)
+    - 스텝마다 하는 일은 행렬 조회와 경계 탐색뿐이며, lookup_batch는 여러 환경을 배열 연산으로 한 번에 처리합니다.
+    """
+
+    def __init__(self, weighted_map: Dict[int, Vector3], thresholds: Tuple[float, float],
+                 total_timesteps: int, warmup_end_step: int):
+        n_actions = max(weighted_map) + 1
+        self.distance = np.array([[action_distance(i, j, weighted_map) for j in range(n_actions)]
+                                  for i in range(n_actions)], dtype=np.float64)
+        pos_th, neu_th = thresholds
+        self.feedback = np.where(self.distance <= pos_th, 1, np.where(self.distance <= neu_th, 0, -1)).astype(np.int8)
+
+        self.total_timesteps = total_timesteps
+        self.warmup_end_step = warmup_end_step
+        # 피드백 값(-1, 0, 1) → (cnt가 바뀌는 스텝 목록, 그 스텝부터의 cnt)
+        self.cnt_schedule = {fb: self._cnt_schedule(fb) for fb in (-1, 0, 1)}
+
+    def _cnt_at(self, fb: int, step: int) -> int:
+        steps_since_warmup = max(0, step - self.warmup_end_step)
+        total_remaining_steps = max(1, self.total_timesteps - step)
+        return cnt_for_fb(fb, steps_since_warmup, total_remaining_steps)
+
+    def _cnt_schedule(self, fb: int) -> Tuple[list, list]:
+        # total_timesteps 다음 스텝부터는 진행도가 1로 고정되므로 거기까지만 보면 됨 (SB3는 total_timesteps를 넘겨 스텝할 수 있음)
+        start, end = self.warmup_end_step, max(self.warmup_end_step, self.total_timesteps) + 1
+        steps, values = [start], [self._cnt_at(fb, start)]
+        final = self._cnt_at(fb, end)
+        while values[-1] > final:
+            # values[-1]보다 작아지는 첫 스텝을 이진 탐색
+            lo, hi = steps[-1], end
+            while lo + 1 < hi:
+                mid = (lo + hi) // 2
+                if self._cnt_at(fb, mid) < values[-1]:
+                    hi = mid
+                else:
+                    lo = mid
+            steps.append(hi)
+            values.append(self._cnt_at(fb, hi))
+        return steps, values
+
+    def cnt(self, fb: int, step: int) -> int:
+        steps, values = self.cnt_schedule[fb]
+        return values[max(0, bisect_right(steps, step) - 1)]
+
+    def lookup(self, student: int, teacher: int, step: int) -> Tuple[int, int]:
+        """(피드백, cnt)"""
+        fb = int(self.feedback[student, teacher])
+        return fb, self.cnt(fb, step)
+
+    def cnt_batch(self, fb: np.ndarray, steps: np.ndarray) -> np.ndarray:
+        cnt = np.ones(len(fb), dtype=np.int64)
+        for value, (schedule_steps, schedule_values) in self.cnt_schedule.items():
+            mask = fb == value
+            if mask.any():
+                idx = np.maximum(np.searchsorted(schedule_steps, steps[mask], side="right") - 1, 0)
+                cnt[mask] = np.asarray(schedule_values)[idx]
+        return cnt
+
+    def lookup_batch(self, students: np.ndarray, teachers: np.ndarray, steps: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """환경별 (피드백, cnt) 배열"""
+        fb = self.feedback[students, teachers]
+        return fb, self.cnt_batch(fb, steps)
+
+
+class _FeedbackTablesMixin:
+    """
+    TeacherFeedbackWrapper / TeacherFeedbackVecWrapper 공용: 행동 벡터 가중치(wx/wy/wp)와 임계값으로 FeedbackTables를 관리합니다.
+    가중치나 임계값을 바꾸면 다음 스텝에서 표를 다시 만듭니다.
+    """
+    total_timesteps: int
+    warmup_end_step: int
+
+    def _init_feedback_tables(self, thresholds: Tuple[float, float]) -> None:
+        self._pos_th, self._neu_th = thresholds
+        # 벡터 가중치
+        self._wx = 1
+        self._wy = 1
+        self._wp = 1
+        self._tables: Optional[FeedbackTables] = None
+
+    def _weight_property(name: str):
+        def getter(self):
+            return getattr(self, name)
+
+        def setter(self, value):
+            setattr(self, name, value)
+            self._tables = None
+        return property(getter, setter)
+
+    wx = _weight_property("_wx")
+    wy = _weight_property("_wy")
+    wp = _weight_property("_wp")
+    pos_th = _weight_property("_pos_th")
+    neu_th = _weight_property("_neu_th")
+    del _weight_property
 
-class TeacherFeedbackWrapper(gym.Wrapper):
+    @property
+    def weighted_map(self) -> Dict[int, Vector3]:
+        return self.apply(action_map)
+
+    @property
+    def tables(self) -> FeedbackTables:
+        if self._tables is None:
+            self._tables = FeedbackTables(self.weighted_map, (self._pos_th, self._neu_th),
+                                          self.total_timesteps, self.warmup_end_step)
+        return self._tables
+
+    def apply(self, action_map: Dict[int, Vector3]) -> Dict[int,Vector3]:
+        """
+        action_map: {action_index: (steer_x, steer_y, pedal_signed)}
+        return:     같은 키를 가지되 각 요소에 가중치가 곱해진 dict
+        """
+        weighted = {}
+        for k, (x, y, p) in action_map.items():
+            weighted[k] = (x * self.wx, y * self.wy, p * self.wp)
+        return weighted    
+
+
+class TeacherFeedbackWrapper(_FeedbackTablesMixin, FeedbackScheduleMixin, StepFeedbackWriterMixin, gym.Wrapper):
     """
     SB3 호환 Unity Gym 환경용 보상-셰이핑 + 정보부착 래퍼.
 
     - 교사(teacher) 행동과 학생(action) 차이를 바탕으로
       (1) 추가 보상(= FEEDBACK_WEIGHT * fb)을 즉시 부여하고,
-      (2) info에 'tfw_feedback', 'tfw_cnt' 등을 넣어줍니다.
+      (2) step_feedback 표(StepFeedbackTable)의 자기 행에 피드백/cnt/셰이핑 보상을 씁니다. (info는 그대로 전달)
     - 이산/연속 행동공간 모두 지원합니다.
     - WARMUP_EPISODES 동안은 피드백을 비활성화합니다(원 코드와 동일: *에피소드 기준*).
     - total_episodes_hint를 이용해 cnt_for_fb의 '진행도'를 계산합니다.
@@ -77,40 +203,21 @@ class TeacherFeedbackWrapper(gym.Wrapper):
         warmup_fraction: float = 0.05,
         thresholds: Tuple[float, float] = (0.1, 0.4),
         verbose: int = 1,
+        start_step: int = 0,
     ):
         super().__init__(env)
         self.teacher = teacher
-        self.total_timesteps = total_timesteps
-        self.feedback_weight = float(feedback_weight)
-        self.warmup_end_step = int(total_timesteps * warmup_fraction)
-        self.pos_th, self.neu_th = thresholds
-        self.verbose = int(verbose)
+        self._init_feedback_schedule(total_timesteps, feedback_weight, warmup_fraction, verbose, start_step)
+        self._init_feedback_tables(thresholds)
+        self._init_step_feedback()
 
         # 내부 상태
         self._episode_idx = 0           # 0부터 시작
         self._last_obs = None
-        self._total_step = 0
         # 통계
         self._fb_pos = 0
         self._fb_neu = 0
         self._fb_neg = 0
-        
-        # 벡터 가중치
-        self.wx = 1
-        self.wy = 1
-        self.wp = 1
-        self.weighted_map = self.apply(action_map)
-
-        
-    def apply(self, action_map: Dict[int, Vector3]) -> Dict[int,Vector3]:
-        """
-        action_map: {action_index: (steer_x, steer_y, pedal_signed)}
-        return:     같은 키를 가지되 각 요소에 가중치가 곱해진 dict
-        """
-        weighted = {}
-        for k, (x, y, p) in action_map.items():
-            weighted[k] = (x * self.wx, y * self.wy, p * self.wp)
-        return weighted    
 
     # ──────────────────────────────────────────────────────────────────────────
     # 유틸
@@ -164,19 +271,14 @@ class TeacherFeedbackWrapper(gym.Wrapper):
             if isinstance(self.action_space, gym.spaces.Discrete):
                 stud = int(action if not isinstance(action, np.ndarray) else int(action.item()))
                 teach = int(teacher_action if not isinstance(teacher_action, np.ndarray) else int(teacher_action.item()))
-                #  여기서 코사인 적용 시키기.
-                dist = action_distance(stud, teach, self.weighted_map)
-                fb = to_feedback(dist, self.pos_th, self.neu_th)
+                # 미리 계산한 코사인 거리 기반 피드백 표와 스텝별 cnt 스케줄 조회
+                fb, cnt = self.tables.lookup(stud, teach, self._total_step)
             else:
                 stud = np.asarray(action).reshape(-1)
                 teach = np.asarray(teacher_action).reshape(-1)
                 dist = self._cosine_distance(stud, teach)
-                fb = to_feedback(dist, self.pos_th, self.neu_th)
-
-            # 스텝 기반으로 cnt 계산
-            steps_since_warmup = max(0, self._total_step - self.warmup_end_step)
-            total_remaining_steps = max(1, self.total_timesteps - self._total_step)
-            cnt = cnt_for_fb(fb, steps_since_warmup, total_remaining_steps)
+                fb = to_feedback(dist, self._pos_th, self._neu_th)
+                cnt = self.tables.cnt(fb, self._total_step)
 
             # 보상 셰이핑
             shaped = self.feedback_weight * float(fb) * (1 - (self._total_step / self.total_timesteps))
@@ -198,12 +300,115 @@ class TeacherFeedbackWrapper(gym.Wrapper):
         # 다음 관찰 대입
         self._last_obs = next_obs
 
-        # info 확장: (피드백/증폭카운트/셰이핑 등)
-        info = dict(info) if info is not None else {}
-        info.update({
-            "tfw_feedback": fb,
-            "tfw_cnt": int(cnt),
-            "tfw_shaped_reward": shaped,
-            "tfw_is_warmup": is_warmup,
-        })
+        # 피드백/증폭카운트/셰이핑 기록 (info dict는 복사하지 않음)
+        self.step_feedback.write(self.step_feedback_index, self._total_step, fb, cnt, shaped, is_warmup)
         return next_obs, reward, terminated, truncated, info
+
+
+class TeacherFeedbackVecWrapper(_FeedbackTablesMixin, FeedbackScheduleMixin, VecEnvWrapper):
+    """
+    TeacherFeedbackWrapper의 VecEnv 버전.
+
+    - 벡터 스텝마다 쌓인 관찰 (n_envs, ...)로 teacher를 한 번만 호출합니다. (전이당 teacher 비용이 n_envs에 반비례)
+    - 피드백/cnt/셰이핑 보상은 FeedbackTables.lookup_batch 등 배열 연산으로 모든 환경을 한 번에 계산해
+      보상에 더하고 step_feedback 표(StepFeedbackTable, 환경당 한 행)에 필드 단위로 한 번에 씁니다.
+    - 스텝 수(진행도)는 SB3 num_timesteps처럼 전체 환경의 전이 수로 셉니다.
+    """
+    def __init__(
+        self,
+        venv: VecEnv,
+        teacher: Optional[Union[Callable[[np.ndarray], Union[int, np.ndarray]], object]] = None,
+        total_timesteps: int = 1_000_000,
+        feedback_weight: float = 0.05,
+        warmup_fraction: float = 0.05,
+        thresholds: Tuple[float, float] = (0.1, 0.4),
+        verbose: int = 1,
+        start_step: int = 0,
+    ):
+        super().__init__(venv)
+        self.teacher = teacher
+        self._init_feedback_schedule(total_timesteps, feedback_weight, warmup_fraction, verbose, start_step)
+        self._init_feedback_tables(thresholds)
+
+        self._discrete = isinstance(self.action_space, gym.spaces.Discrete)
+        self._last_obs = None
+        self._actions: Optional[np.ndarray] = None
+        # 환경별 에피소드 피드백 통계 (+ / 0 / -)
+        self._fb_counts = np.zeros((self.num_envs, 3), dtype=np.int64)
+        self.step_feedback = StepFeedbackTable(self.num_envs)
+
+    def _call_teacher(self, obs) -> Optional[np.ndarray]:
+        if self.teacher is None:
+            return None
+        if hasattr(self.teacher, "predict"):
+            act, _ = self.teacher.predict(obs, deterministic=True)
+            return np.asarray(act)
+        if callable(self.teacher):
+            return np.asarray(self.teacher(obs))
+        return None
+
+    @staticmethod
+    def _cosine_distance_batch(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+        a = np.asarray(a, dtype=np.float32).reshape(len(a), -1)
+        b = np.asarray(b, dtype=np.float32).reshape(len(b), -1)
+        na, nb = np.linalg.norm(a, axis=1), np.linalg.norm(b, axis=1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            dist = 1.0 - np.sum(a * b, axis=1) / (na * nb)
+        dist = np.where((na == 0.0) | (nb == 0.0), 1.0, dist)
+        return np.where((na == 0.0) & (nb == 0.0), 0.0, dist)
+
+    def reset(self):
+        obs = self.venv.reset()
+        self._last_obs = obs
+        return obs
+
+    def step_async(self, actions: np.ndarray) -> None:
+        self._actions = np.asarray(actions)
+        self.venv.step_async(actions)
+
+    def step_wait(self):
+        n_envs = self.num_envs
+        # 이번 벡터 스텝의 환경별 스텝 번호 (전체 전이 수 기준)
+        steps = self._total_step + np.arange(1, n_envs + 1)
+        self._total_step += n_envs
+
+        fb = np.zeros(n_envs, dtype=np.int64)
+        cnt = np.ones(n_envs, dtype=np.int64)
+        shaped = np.zeros(n_envs, dtype=np.float32)
+        is_warmup = steps < self.warmup_end_step
+        active = ~is_warmup
+        # 웜업 중이면 teacher를 호출하지 않음
+        teacher_actions = self._call_teacher(self._last_obs) if active.any() else None
+        if teacher_actions is not None:
+            if self._discrete:
+                stud = self._actions.reshape(n_envs).astype(np.int64)
+                teach = teacher_actions.reshape(n_envs).astype(np.int64)
+                fb_all, cnt_all = self.tables.lookup_batch(stud, teach, steps)
+            else:
+                dist = self._cosine_distance_batch(self._actions, teacher_actions)
+                fb_all = np.where(dist <= self._pos_th, 1, np.where(dist <= self._neu_th, 0, -1))
+                cnt_all = self.tables.cnt_batch(fb_all, steps)
+            fb = np.where(active, fb_all, 0)
+            cnt = np.where(active, cnt_all, 1)
+            # 보상 셰이핑
+            shaped = (self.feedback_weight * fb * (1 - steps / self.total_timesteps)).astype(np.float32)
+            np.add.at(self._fb_counts, (np.flatnonzero(active), 1 - fb[active]), 1)
+
+        obs, rewards, dones, infos = self.venv.step_wait()
+        rewards = rewards + shaped
+        self._last_obs = obs
+
+        table = self.step_feedback
+        table.step[:] = steps
+        table.feedback[:] = fb
+        table.cnt[:] = cnt
+        table.shaped_reward[:] = shaped
+        table.is_warmup[:] = is_warmup
+        table.valid[:] = True
+
+        for i in np.flatnonzero(dones):
+            if self.verbose > 0:
+                pos, neu, neg = self._fb_counts[i]
+                print(f"[TFW] env{i} FB(+ {pos} / 0 {neu} / - {neg})")
+            self._fb_counts[i] = 0
+        return obs, rewards, dones, infos
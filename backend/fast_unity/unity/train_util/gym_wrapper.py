@@ -37,15 +37,25 @@ class MLAgentsGymWrapper(gym.Env):
 
         self.behavior_name = list(self.unity_env.behavior_specs)[0]
         spec = self.unity_env.behavior_specs[self.behavior_name]
+        # Unity 센서 순서/형태 그대로 (이미지는 (H,W,C)) - ML-Agents 형식 ONNX 내보내기에 사용
+        self.obs_shapes = [tuple(o.shape) for o in spec.observation_specs]
 
         # ------ obs space
         if self.use_dict_obs:
             obs_spaces = {}
+            # 이미지는 처음부터 (C,H,W)로 선언 → SB3가 VecTransposeImage를 끼우지 않음
+            # 매 스텝 새 배열을 만들지 않도록 출력 버퍼를 미리 할당 (2개를 번갈아 사용:
+            # DummyVecEnv의 terminal_observation이 직후 reset에 덮이지 않게 하기 위함)
+            self._image_bufs = {}
+            self._image_scratch = {}
+            self._buf_idx = 0
             for i, o in enumerate(spec.observation_specs):
                 key = f"obs_{i}"
-                if len(o.shape) == 3:  # (H,W,C)
+                if len(o.shape) == 3:  # Unity는 (H,W,C)
                     h,w,c = o.shape
-                    obs_spaces[key] = spaces.Box(0, 255, shape=(h,w,c), dtype=np.uint8)
+                    obs_spaces[key] = spaces.Box(0, 255, shape=(c,h,w), dtype=np.uint8)
+                    self._image_bufs[key] = [np.empty((c,h,w), dtype=np.uint8) for _ in range(2)]
+                    self._image_scratch[key] = np.empty((c,h,w), dtype=np.float32)
                 else:
                     obs_spaces[key] = spaces.Box(-np.inf, np.inf, shape=o.shape, dtype=np.float32)
             self.observation_space = spaces.Dict(obs_spaces)
@@ -73,10 +83,16 @@ class MLAgentsGymWrapper(gym.Env):
     def _pack_obs(self, steps):
         if self.use_dict_obs:
             out = {}
+            self._buf_idx ^= 1
             for i, arr in enumerate(steps.obs):
                 key = f"obs_{i}"
-                if arr.ndim == 4:  # (N,H,W,C)
-                    out[key] = (arr[0] * 255).clip(0,255).astype(np.uint8)
+                if arr.ndim == 4:  # (N,H,W,C) → (C,H,W) uint8 버퍼에 직접 기록
+                    scratch = self._image_scratch[key]
+                    np.multiply(arr[0].transpose(2, 0, 1), 255, out=scratch)
+                    np.clip(scratch, 0, 255, out=scratch)
+                    buf = self._image_bufs[key][self._buf_idx]
+                    np.copyto(buf, scratch, casting="unsafe")
+                    out[key] = buf
                 else:
                     out[key] = arr[0].astype(np.float32, copy=False)
             return out
@@ -1,70 +1,82 @@
-# callback_episode_csv.py
-import csv
-import os
-from datetime import datetime
+# callback_episode_log.py
+import time
+import numpy as np
 from stable_baselines3.common.callbacks import BaseCallback
 
-class EpisodeCSVCallback(BaseCallback):
+from unity.train_util.episode_log import EpisodeLogWriter, count_episodes
+from unity.train_util.step_feedback import attach_step_feedback
+
+class EpisodeLogCallback(BaseCallback):
     """
     dones가 True 될 때마다 infos[i]["episode"]에서
-    에피소드 리워드/길이를 읽어 CSV에 기록합니다.
+    에피소드 리워드/길이를 읽어 컬럼형 에피소드 기록(Arrow IPC)에 저장합니다.
+    - 피드백 래퍼가 있으면 step_feedback 표의 feedback 값으로 에피소드별 긍정/부정/중립 피드백 수도 함께 기록합니다.
+    - CSV는 다운로드 요청 시에만 export_episode_csv로 만들어집니다.
     """
-    def __init__(self, save_dir: str , filename: str): #uuid등을 붙여서 기록해야함.
+    def __init__(self, save_dir: str, append: bool = False, metric_store=None):
         super().__init__()
         self.save_dir = save_dir
-        self.filename = filename
-        self.file = None
-        self.writer = None
+        # 에피소드 리워드/길이를 시계열 저장소(MetricStore)에도 기록
+        self.metric_store = metric_store
+        # 선점 후 이어서 학습할 때는 기존 기록 뒤에 이어 씀
+        self.append = append
+        self.log_writer = None
         self.episode_count = 0
+        self._feedback_counts = None  # (n_envs, 3): 긍정/부정/중립
+        self._feedback_mask = None  # (n_envs,) bool: 매 스텝 재사용하는 마스크 버퍼
+        self._feedback_columns = ()  # _feedback_counts의 열 뷰 (긍정/부정/중립)
+        self._step_feedback = None
 
     def _on_training_start(self) -> None:
-        os.makedirs(self.save_dir, exist_ok=True)
-        path = os.path.join(self.save_dir, self.filename)
-        self.file = open(path, "w", newline="", encoding="utf-8")
-        self.writer = csv.writer(self.file)
-        # 원하는 컬럼 추가/수정 가능
-        self.writer.writerow([
-            "ts",                 # 현재 timesteps
-            
-            "episode_index",      # 진행된 에피소드 누계
-            "env_index",          # 어떤 벡터환경 인덱스에서 끝났는지
-            "episode_reward",
-            "episode_length",
-            "wall_time"           # 벽시계 시각(로그 시점)
-        ])
+        if self.append:
+            self.episode_count = count_episodes(self.save_dir)
+        self.log_writer = EpisodeLogWriter(self.save_dir, append=self.append)
+        self._feedback_counts = np.zeros((self.training_env.num_envs, 3), dtype=np.int32)
+        self._feedback_mask = np.zeros(self.training_env.num_envs, dtype=bool)
+        self._feedback_columns = tuple(self._feedback_counts[:, i] for i in range(3))
+        self._step_feedback = attach_step_feedback(self.training_env)
 
     def _on_step(self) -> bool:
         # VecEnv 기준
         dones = self.locals.get("dones", [])
         infos = self.locals.get("infos", [])
 
-        if self.num_timesteps % 100== 0:
-            
-            
-            payload = {
-                "step": self.num_timesteps,
-                "logs": self.logger.name_to_value.copy()
-            }
-            #print("Metric")
-            #print(payload)
-            
+        table = self._step_feedback
+        if table is not None:
+            # 열 인덱스: 긍정 0 / 부정 1 / 중립 2
+            # 매 스텝 호출되므로 미리 만든 마스크 버퍼에 out=으로 쓰고 카운트 열에 제자리로 더함 (새 배열 할당 없음)
+            mask = self._feedback_mask
+            for counts, compare in zip(self._feedback_columns, (np.greater, np.less, np.equal)):
+                compare(table.feedback, 0, out=mask)
+                np.logical_and(mask, table.valid, out=mask)
+                np.add(counts, mask, out=counts)
+
         for env_idx, done in enumerate(dones):
             if done:
                 ep_info = infos[env_idx].get("episode")
                 if ep_info is not None:
                     self.episode_count += 1
-                    self.writer.writerow([
-                        self.num_timesteps,
-                        self.episode_count,
-                        env_idx,
-                        ep_info.get("r", None),
-                        ep_info.get("l", None),
-                        datetime.now().isoformat(timespec="seconds"),
-                    ])
+                    pos, neg, neutral = self._feedback_counts[env_idx].tolist()
+                    self.log_writer.add(
+                        ts=self.num_timesteps,
+                        episode_index=self.episode_count,
+                        env_index=env_idx,
+                        episode_reward=ep_info.get("r"),
+                        episode_length=ep_info.get("l"),
+                        wall_time=time.time(),
+                        feedback_pos=pos,
+                        feedback_neg=neg,
+                        feedback_neutral=neutral,
+                    )
+                    if self.metric_store is not None:
+                        self.metric_store.append(self.num_timesteps, {
+                            "episode/reward": ep_info.get("r"),
+                            "episode/length": ep_info.get("l"),
+                        })
+                self._feedback_counts[env_idx] = 0
         return True
 
     def _on_training_end(self) -> None:
-        if self.file is not None:
-            self.file.flush()
-            self.file.close()
-            self.file = None
+        if self.log_writer is not None:
+            self.log_writer.close()
+            self.log_writer = None
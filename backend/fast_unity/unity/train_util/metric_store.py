@@ -0,0 +1,284 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from stable_baselines3.common.logger import KVWriter
+
+METRIC_DB_NAME = "metrics.sqlite"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS keys (
+    id   INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS chunks (
+    key_id     INTEGER NOT NULL,
+    seq        INTEGER NOT NULL,
+    first_step INTEGER NOT NULL,
+    last_step  INTEGER NOT NULL,
+    first_wall REAL    NOT NULL,
+    last_wall  REAL    NOT NULL,
+    n          INTEGER NOT NULL,
+    steps      BLOB    NOT NULL,
+    walls      BLOB    NOT NULL,
+    vals       BLOB    NOT NULL,
+    PRIMARY KEY (key_id, seq)
+) WITHOUT ROWID;
+"""
+
+_CHUNK_COLUMNS = "key_id, seq, first_step, last_step, first_wall, last_wall, n, steps, walls, vals"
+
+
+def metric_db_path(log_dir: str) -> str:
+    return os.path.join(log_dir, METRIC_DB_NAME)
+
+
+class _OpenChunk:
+    """키별로 아직 chunk_size만큼 차지 않은 마지막 청크 (flush 때마다 같은 (key_id, seq) 행을 덮어씀)"""
+    __slots__ = ("seq", "steps", "walls", "vals", "dirty")
+
+    def __init__(self, seq: int):
+        self.seq = seq
+        self.steps: List[int] = []
+        self.walls: List[float] = []
+        self.vals: List[float] = []
+        self.dirty = False
+
+
+class MetricStore:
+    """
+    실행(run) 하나의 스칼라 메트릭을 저장하는 시계열 저장소. (train_logs/<model_name>/metrics.sqlite)
+
+    - 키마다 포인트를 chunk_size개씩 묶어 (step, wall, value) 세 개의 numpy 배열 BLOB으로 저장하는 컬럼형 구조입니다.
+      청크는 키별 순번(seq)으로 구분합니다. (일시정지 중 같은 스텝에 여러 번 기록해도 청크끼리 덮어쓰지 않음)
+      범위 조회는 겹치는 청크 몇 개만 읽어 np.frombuffer로 이어 붙이므로 1천만 스텝 실행도 수 ms 안에 끝납니다.
+    - 쓰기는 메모리의 열린 청크에 추가했다가 flush_interval초마다(또는 청크가 차면) 한 트랜잭션으로 커밋합니다. (WAL 모드)
+    - query()는 스텝/시간 범위와 최대 포인트 수를 받아 LTTB 또는 min/max 버킷으로 줄여서 반환합니다.
+    - 학습 스레드(에피소드 콜백)와 로그 기록 스레드(MetricStoreOutputFormat)가 함께 쓰므로 쓰기는 락으로 보호합니다.
+    """
+
+    def __init__(self, path: str, reset: bool = False, readonly: bool = False,
+                 chunk_size: int = 1024, flush_interval: float = 1.0):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.flush_interval = flush_interval
+        if readonly:
+            self._conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+        else:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            if reset:
+                for suffix in ("", "-wal", "-shm"):
+                    if os.path.exists(path + suffix):
+                        os.remove(path + suffix)
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(_SCHEMA)
+        self._next_seq: Dict[int, int] = dict(
+            self._conn.execute("SELECT key_id, MAX(seq) + 1 FROM chunks GROUP BY key_id")
+        )
+        self._key_ids: Dict[str, int] = {
+            name: key_id for key_id, name in self._conn.execute("SELECT id, name FROM keys")
+        }
+        self._open: Dict[int, _OpenChunk] = {}
+        self._last_flush = time.monotonic()
+        self._lock = threading.RLock()
+
+    # ---- 쓰기 ----
+    def _key_id(self, name: str) -> int:
+        key_id = self._key_ids.get(name)
+        if key_id is None:
+            self._conn.execute("INSERT OR IGNORE INTO keys (name) VALUES (?)", (name,))
+            key_id = self._conn.execute("SELECT id FROM keys WHERE name = ?", (name,)).fetchone()[0]
+            self._key_ids[name] = key_id
+        return key_id
+
+    def append(self, step: int, values: Dict[str, Any], wall: Optional[float] = None) -> None:
+        """숫자 값만 저장합니다. (문자열, NaN 등은 무시)"""
+        wall = time.time() if wall is None else wall
+        full = False
+        with self._lock:
+            for name, value in values.items():
+                if isinstance(value, (bool, np.bool_)) or not isinstance(value, (int, float, np.integer, np.floating)):
+                    continue
+                value = float(value)
+                if value != value:
+                    continue
+                key_id = self._key_id(name)
+                chunk = self._open.get(key_id)
+                if chunk is None:
+                    seq = self._next_seq.get(key_id, 0)
+                    self._next_seq[key_id] = seq + 1
+                    chunk = self._open[key_id] = _OpenChunk(seq)
+                chunk.steps.append(int(step))
+                chunk.walls.append(wall)
+                chunk.vals.append(value)
+                chunk.dirty = True
+                full = full or len(chunk.steps) >= self.chunk_size
+            if full or time.monotonic() - self._last_flush >= self.flush_interval:
+                self.flush()
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self) -> None:
+        rows = []
+        for key_id, chunk in list(self._open.items()):
+            if not chunk.dirty:
+                continue
+            steps = np.asarray(chunk.steps, dtype=np.int64)
+            walls = np.asarray(chunk.walls, dtype=np.float64)
+            vals = np.asarray(chunk.vals, dtype=np.float64)
+            rows.append((key_id, chunk.seq, int(steps[0]), int(steps[-1]), float(walls[0]), float(walls[-1]), len(steps),
+                         steps.tobytes(), walls.tobytes(), vals.tobytes()))
+            chunk.dirty = False
+            if len(chunk.steps) >= self.chunk_size:
+                # 가득 찬 청크는 확정하고 다음 포인트부터 새 청크 시작
+                del self._open[key_id]
+        if rows:
+            with self._conn:
+                self._conn.executemany(
+                    f"INSERT OR REPLACE INTO chunks ({_CHUNK_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+        self._last_flush = time.monotonic()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is None:
+                return
+            self._flush_locked()
+            self._conn.close()
+            self._conn = None
+
+    # ---- 조회 ----
+    def keys(self) -> List[str]:
+        return sorted(self._key_ids)
+
+    def _load(self, key_id: int, step_range, time_range) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        (step_lo, step_hi), (time_lo, time_hi) = step_range, time_range
+        clause, params = "", [key_id]
+        for column, bound, op in (("last_step", step_lo, ">="), ("first_step", step_hi, "<="),
+                                  ("last_wall", time_lo, ">="), ("first_wall", time_hi, "<=")):
+            if bound is not None:
+                clause += f" AND {column} {op} ?"
+                params.append(bound)
+        rows = self._conn.execute(
+            f"SELECT steps, walls, vals FROM chunks WHERE key_id = ?{clause} "
+            "ORDER BY seq", params
+        ).fetchall()
+        if not rows:
+            empty = np.empty(0)
+            return empty.astype(np.int64), empty, empty
+        steps = np.concatenate([np.frombuffer(row[0], dtype=np.int64) for row in rows])
+        walls = np.concatenate([np.frombuffer(row[1], dtype=np.float64) for row in rows])
+        vals = np.concatenate([np.frombuffer(row[2], dtype=np.float64) for row in rows])
+
+        # 경계 청크에서 범위 밖 포인트 제거
+        mask = np.ones(len(steps), dtype=bool)
+        if step_lo is not None:
+            mask &= steps >= step_lo
+        if step_hi is not None:
+            mask &= steps <= step_hi
+        if time_lo is not None:
+            mask &= walls >= time_lo
+        if time_hi is not None:
+            mask &= walls <= time_hi
+        if not mask.all():
+            steps, walls, vals = steps[mask], walls[mask], vals[mask]
+        return steps, walls, vals
+
+    def query(
+        self,
+        keys: Iterable[str],
+        step_range: Tuple[Optional[int], Optional[int]] = (None, None),
+        time_range: Tuple[Optional[float], Optional[float]] = (None, None),
+        max_points: Optional[int] = 1000,
+        method: str = "lttb",
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        키별 {"step": [...], "wall_time": [...], "value": [...], "total": 범위 내 전체 포인트 수}를 반환합니다.
+        method="lttb"는 곡선 모양을 보존하는 샘플링, "minmax"는 버킷별 최소/최대값(스파이크 보존)입니다.
+        """
+        if method not in ("lttb", "minmax"):
+            raise ValueError(f"지원하지 않는 다운샘플링 방식입니다: {method}")
+        self.flush()
+        result = {}
+        for name in keys:
+            key_id = self._key_ids.get(name)
+            if key_id is None:
+                continue
+            steps, walls, vals = self._load(key_id, step_range, time_range)
+            total = len(steps)
+            if max_points and total > max_points:
+                if method == "lttb":
+                    idx = lttb_indices(steps.astype(np.float64), vals, max_points)
+                else:
+                    idx = minmax_indices(steps, vals, max(1, max_points // 2))
+                steps, walls, vals = steps[idx], walls[idx], vals[idx]
+            result[name] = {
+                "step": steps.tolist(),
+                "wall_time": walls.tolist(),
+                "value": vals.tolist(),
+                "total": total,
+            }
+        return result
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets 다운샘플링. 선택된 포인트의 인덱스를 반환합니다."""
+    size = len(x)
+    if n_out >= size or n_out < 3:
+        return np.arange(size)
+
+    # 첫/마지막 점을 제외한 구간을 n_out - 2개의 버킷으로 나누고, 버킷 평균은 한 번에 계산
+    edges = np.linspace(1, size - 1, n_out - 1).astype(np.int64)
+    bounds = np.append(edges, size)
+    counts = np.diff(bounds)
+    avg_x = np.add.reduceat(x, bounds[:-1]) / counts
+    avg_y = np.add.reduceat(y, bounds[:-1]) / counts
+
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, size - 1
+    prev = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        px, py = x[prev], y[prev]
+        # 이전 선택점, 현재 버킷 후보, 다음 버킷 평균이 이루는 삼각형 넓이가 최대인 점
+        area = np.abs((px - avg_x[i + 1]) * (y[start:end] - py) - (px - x[start:end]) * (avg_y[i + 1] - py))
+        prev = start + int(area.argmax())
+        selected[i + 1] = prev
+    return selected
+
+
+def minmax_indices(steps: np.ndarray, vals: np.ndarray, n_buckets: int) -> np.ndarray:
+    """스텝 구간을 n_buckets개로 나눠 버킷마다 최소/최대 포인트의 인덱스를 반환합니다. (스텝 순)"""
+    lo, hi = int(steps[0]), int(steps[-1])
+    bucket = ((steps - lo) * n_buckets) // (hi - lo + 1)
+    # 버킷 → 값 순으로 정렬하면 각 버킷의 첫 원소가 최소, 마지막 원소가 최대
+    order = np.lexsort((vals, bucket))
+    sorted_buckets = bucket[order]
+    first = np.flatnonzero(np.r_[True, sorted_buckets[1:] != sorted_buckets[:-1]])
+    last = np.r_[first[1:] - 1, len(order) - 1]
+    return np.unique(np.concatenate([order[first], order[last]]))
+
+
+class MetricStoreOutputFormat(KVWriter):
+    """SB3 logger.dump() 때마다 숫자 메트릭을 MetricStore에 기록하는 출력 형식"""
+
+    def __init__(self, store: MetricStore):
+        self.store = store
+
+    def write(self, key_values: Dict[str, Any], key_excluded: Dict[str, Any], step: int = 0) -> None:
+        values = {
+            key: value for key, value in key_values.items()
+            if not (key_excluded.get(key) and "metric_store" in key_excluded[key])
+        }
+        self.store.append(step, values)
+
+    def close(self) -> None:
+        self.store.close()
@@ -0,0 +1,282 @@
+import inspect
+import os
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import torch as th
+import torch.nn as nn
+from gymnasium import spaces
+from stable_baselines3.common.base_class import BaseAlgorithm
+
+from unity.train_util.onnx_policy import KIND_LOGITS, KIND_Q, KIND_SQUASHED, OnnxExportModule, policy_kind
+
+try:
+    import onnxruntime as ort
+except ImportError:
+    ort = None
+
+# com.unity.ml-agents(Sentis) 추론 런타임이 요구하는 모델 API 버전과 텐서 이름
+MLAGENTS_MODEL_VERSION = 3
+MLAGENTS_OPSET = 15  # Sentis가 지원하는 최대 opset
+ACTION_MASKS = "action_masks"
+VERSION_NUMBER = "version_number"
+MEMORY_SIZE = "memory_size"
+DISCRETE_ACTIONS = "discrete_actions"
+DISCRETE_ACTION_OUTPUT_SHAPE = "discrete_action_output_shape"
+DETERMINISTIC_DISCRETE_ACTIONS = "deterministic_discrete_actions"
+MLAGENTS_OUTPUT_NAMES = [VERSION_NUMBER, MEMORY_SIZE, DISCRETE_ACTIONS, DISCRETE_ACTION_OUTPUT_SHAPE,
+                         DETERMINISTIC_DISCRETE_ACTIONS]
+
+
+def mlagents_onnx_path_for(model_path: str) -> str:
+    """models/foo.zip(또는 models/foo) → models/foo.mlagents.onnx"""
+    root, ext = os.path.splitext(model_path)
+    return (root if ext == ".zip" else model_path) + ".mlagents.onnx"
+
+
+def mlagents_input_shape(unity_shape: Sequence[int]) -> Tuple[int, ...]:
+    """Unity 센서 형태 → ONNX 입력 형태 (이미지는 (H,W,C) → (C,H,W), Sentis는 NCHW)"""
+    if len(unity_shape) == 3:
+        h, w, c = unity_shape
+        return c, h, w
+    return tuple(unity_shape)
+
+
+class _MLAgentsExportModule(nn.Module):
+    """
+    SB3 정책을 ML-Agents 추론 런타임 입출력 형식으로 감쌉니다.
+
+    - 입력: obs_0, obs_1, ... (Unity 센서 순서, 이미지는 [0, 1] float NCHW), action_masks (브랜치별 마스크를 이어 붙인 것)
+    - 관측은 MLAgentsGymWrapper와 같이 변환합니다. (Dict: 이미지 *255 후 uint8 절삭 / 평탄화: (H,W,C) 순서로 이어 붙임)
+    - 평탄화한 Discrete 행동(act_mode="discrete")은 _flat_index_to_branches와 같은 순서로 브랜치별 행동으로 나누고,
+      Box 행동(act_mode="binning")은 MLAgentsGymWrapper._bin과 같이 브랜치별 구간으로 나눕니다.
+    - 출력: version_number, memory_size, discrete_actions(샘플), discrete_action_output_shape, deterministic_discrete_actions
+    """
+
+    def __init__(self, model: BaseAlgorithm, kind: str, obs_shapes: Sequence[Sequence[int]], branches: Sequence[int]):
+        super().__init__()
+        observation_space = model.observation_space
+        self.dict_obs = isinstance(observation_space, spaces.Dict)
+        obs_keys = [f"obs_{i}" for i in range(len(obs_shapes))] if self.dict_obs else None
+        self.policy_module = OnnxExportModule(model.policy, kind, obs_keys)
+        self.kind = kind
+        self.image_inputs = [len(shape) == 3 for shape in obs_shapes]
+        self.binning = isinstance(model.action_space, spaces.Box)
+
+        # ML-Agents 런타임이 읽는 상수 출력
+        self.version_number = nn.Parameter(th.tensor([float(MLAGENTS_MODEL_VERSION)]), requires_grad=False)
+        self.memory_size = nn.Parameter(th.tensor([0.0]), requires_grad=False)
+        self.discrete_shape = nn.Parameter(th.tensor([[float(b) for b in branches]]), requires_grad=False)
+
+        sizes = th.tensor(list(branches), dtype=th.long)
+        self.register_buffer("branch_sizes", sizes)
+        if self.binning:
+            self.register_buffer("action_low", th.as_tensor(model.action_space.low, dtype=th.float32))
+            self.register_buffer("action_high", th.as_tensor(model.action_space.high, dtype=th.float32))
+        else:
+            # 평탄화 인덱스 k의 브랜치 b 값 = (k // divisor_b) % size_b, 마스크 열 = offset_b + 그 값
+            divisors = th.tensor([int(np.prod(branches[i + 1:])) for i in range(len(branches))], dtype=th.long)
+            offsets = th.cumsum(sizes, 0) - sizes
+            flat = th.arange(int(np.prod(branches)), dtype=th.long).unsqueeze(1)
+            self.register_buffer("branch_divisors", divisors)
+            self.register_buffer("mask_index", offsets + th.div(flat, divisors, rounding_mode="floor") % sizes)
+
+    def _policy_inputs(self, obs_inputs: Sequence[th.Tensor]) -> List[th.Tensor]:
+        if self.dict_obs:
+            # MLAgentsGymWrapper._pack_obs: 이미지 *255 → [0, 255] → uint8 (소수점 절삭)
+            return [th.floor(th.clamp(x * 255.0, 0.0, 255.0)) if is_image else x
+                    for x, is_image in zip(obs_inputs, self.image_inputs)]
+        parts = [(x.permute(0, 2, 3, 1) if is_image else x).reshape(x.shape[0], -1)
+                 for x, is_image in zip(obs_inputs, self.image_inputs)]
+        return [th.cat(parts, dim=1)]
+
+    def _flat_to_branches(self, flat: th.Tensor) -> th.Tensor:
+        return th.div(flat.unsqueeze(1), self.branch_divisors, rounding_mode="floor") % self.branch_sizes
+
+    def _bin(self, actions: th.Tensor) -> th.Tensor:
+        scaled = 2.0 * (actions - self.action_low) / (self.action_high - self.action_low) - 1.0
+        bins = self.branch_sizes.float() - 1.0
+        idx = th.round((th.clamp(scaled, -1.0, 1.0) + 1.0) / 2.0 * bins)
+        return th.minimum(th.clamp(idx, min=0.0), bins).long()
+
+    def forward(self, *inputs: th.Tensor):
+        obs_inputs, action_masks = inputs[:-1], inputs[-1]
+        outputs = self.policy_module(*self._policy_inputs(obs_inputs))
+
+        if self.binning:
+            mean, log_std = outputs
+            sampled = mean + th.exp(log_std) * th.randn_like(mean)
+            if self.kind == KIND_SQUASHED:
+                low, high = self.action_low, self.action_high
+                deterministic = low + 0.5 * (th.tanh(mean) + 1.0) * (high - low)
+                sampled = low + 0.5 * (th.tanh(sampled) + 1.0) * (high - low)
+            else:
+                deterministic = mean
+            deterministic_actions = self._bin(deterministic)
+            # 구간화한 행동에는 마스크를 적용하지 않지만, 런타임이 action_masks 입력을 요구하므로 그래프에 남겨 둠
+            sampled_actions = self._bin(sampled) + (action_masks.sum(dim=1, keepdim=True) * 0).long()
+        else:
+            # 평탄화 행동 k는 모든 브랜치 값이 허용될 때만 허용
+            flat_masks = th.prod(action_masks[:, self.mask_index], dim=2)
+            scores = outputs * flat_masks - 1e8 * (1.0 - flat_masks)
+            deterministic_flat = th.argmax(scores, dim=1)
+            if self.kind == KIND_LOGITS:
+                # Gumbel-max로 소프트맥스 샘플링
+                uniform = th.clamp(th.rand_like(scores), 1e-10, 1.0)
+                sampled_flat = th.argmax(scores - th.log(-th.log(uniform)), dim=1)
+            else:
+                # DQN 평가는 탐험 없이 greedy
+                sampled_flat = deterministic_flat
+            deterministic_actions = self._flat_to_branches(deterministic_flat)
+            sampled_actions = self._flat_to_branches(sampled_flat)
+
+        return self.version_number, self.memory_size, sampled_actions, self.discrete_shape, deterministic_actions
+
+
+def export_mlagents_onnx(model: BaseAlgorithm, model_path: str, obs_shapes: Sequence[Sequence[int]],
+                         branches: Sequence[int], verify: bool = True) -> Optional[str]:
+    """
+    SB3 DQN/PPO/A2C/SAC 정책을 ML-Agents(Sentis) 추론 런타임이 그대로 읽을 수 있는 ONNX로 model_path 옆에 내보냅니다.
+    - obs_shapes: Unity 센서 형태 목록 (MLAgentsGymWrapper.obs_shapes), branches: 이산 브랜치 크기 (MLAgentsGymWrapper.branches)
+    - 결과 파일(*.mlagents.onnx)을 Agent의 Behavior Parameters > Model에 지정하면 플레이어 안에서 추론합니다.
+    - verify=True면 validate_mlagents_onnx로 검사하고, 실패하면 파일을 지우고 None을 반환합니다.
+    """
+    kind = policy_kind(model)
+    if kind is None or (kind in (KIND_Q, KIND_LOGITS)) != isinstance(model.action_space, spaces.Discrete):
+        print(f"[export_mlagents_onnx] 지원하지 않는 정책입니다: {type(model).__name__}/{type(model.policy).__name__}")
+        return None
+    if isinstance(model.action_space, spaces.Discrete) and model.action_space.n != int(np.prod(branches)):
+        print(f"[export_mlagents_onnx] 행동 수({model.action_space.n})가 브랜치 {list(branches)}와 맞지 않습니다.")
+        return None
+
+    input_names = [f"obs_{i}" for i in range(len(obs_shapes))] + [ACTION_MASKS]
+    dummy = tuple(th.zeros((1, *mlagents_input_shape(shape))) for shape in obs_shapes) + (th.ones((1, int(sum(branches)))),)
+    path = mlagents_onnx_path_for(model_path)
+
+    policy = model.policy
+    device = policy.device
+    module = _MLAgentsExportModule(model, kind, obs_shapes, branches).to("cpu").eval()
+    export_kwargs = dict(
+        input_names=input_names,
+        output_names=MLAGENTS_OUTPUT_NAMES,
+        dynamic_axes={**{name: {0: "batch"} for name in input_names},
+                      DISCRETE_ACTIONS: {0: "batch"}, DETERMINISTIC_DISCRETE_ACTIONS: {0: "batch"}},
+        opset_version=MLAGENTS_OPSET,
+        dynamo=False,
+    )
+    export_params = inspect.signature(th.onnx.export).parameters
+    export_kwargs = {k: v for k, v in export_kwargs.items() if k in export_params}
+    try:
+        with th.no_grad():
+            th.onnx.export(module, dummy, path, **export_kwargs)
+    except Exception as e:
+        print(f"[export_mlagents_onnx][WARN] ONNX 내보내기 실패: {e}")
+        return None
+    finally:
+        policy.to(device)
+
+    if verify and ort is not None:
+        report = validate_mlagents_onnx(path, obs_shapes, branches, model=model)
+        if not report["ok"]:
+            print(f"[export_mlagents_onnx][WARN] 검증 실패 ({report['errors']}). 파일을 삭제합니다.")
+            os.remove(path)
+            return None
+    return path
+
+
+def _wrapper_observation(obs_inputs: List[np.ndarray], obs_shapes: Sequence[Sequence[int]], dict_obs: bool):
+    """ONNX 입력(Unity가 Sentis에 넣는 값)을 MLAgentsGymWrapper가 SB3에 넘기는 관측으로 변환"""
+    if dict_obs:
+        out = {}
+        for i, (x, shape) in enumerate(zip(obs_inputs, obs_shapes)):
+            if len(shape) == 3:
+                out[f"obs_{i}"] = np.clip(x * 255, 0, 255).astype(np.uint8)
+            else:
+                out[f"obs_{i}"] = x.astype(np.float32)
+        return out
+    parts = [(x.transpose(0, 2, 3, 1) if len(shape) == 3 else x).reshape(len(x), -1)
+             for x, shape in zip(obs_inputs, obs_shapes)]
+    return np.concatenate(parts, axis=1).astype(np.float32)
+
+
+def _branches_from_actions(actions: np.ndarray, branches: Sequence[int], binning: bool) -> np.ndarray:
+    """SB3 행동 → MLAgentsGymWrapper.step이 Unity에 보내는 브랜치별 행동"""
+    if binning:
+        a = np.clip(np.asarray(actions, dtype=np.float32), -1.0, 1.0)
+        bins = np.asarray(branches) - 1
+        return np.clip(np.round((a + 1.0) / 2.0 * bins), 0, bins).astype(np.int64)
+    flat = np.asarray(actions, dtype=np.int64).reshape(-1, 1)
+    divisors = np.array([int(np.prod(branches[i + 1:])) for i in range(len(branches))])
+    return (flat // divisors) % np.asarray(branches)
+
+
+def validate_mlagents_onnx(path: str, obs_shapes: Sequence[Sequence[int]], branches: Sequence[int],
+                           model: Optional[BaseAlgorithm] = None, n_samples: int = 64, seed: int = 0) -> Dict[str, Any]:
+    """
+    onnxruntime으로 ML-Agents 형식 ONNX를 검사합니다.
+    - 입력 이름/형태(obs_i, action_masks), 필수 출력과 상수 값(version_number, memory_size, discrete_action_output_shape)
+    - 행동 출력의 형태/범위, 마스크한 행동을 고르지 않는지 (평탄화 이산 행동일 때)
+    - model을 주면 같은 관측에서 SB3 model.predict(deterministic=True)를 브랜치로 나눈 값과 일치율
+    반환: {"ok", "errors", "action_agreement"}
+    """
+    if ort is None:
+        return {"ok": False, "errors": ["onnxruntime이 설치되어 있지 않습니다."], "action_agreement": None}
+    errors: List[str] = []
+    session = ort.InferenceSession(path, providers=["CPUExecutionProvider"])
+
+    expected_inputs = [f"obs_{i}" for i in range(len(obs_shapes))] + [ACTION_MASKS]
+    inputs = {i.name: i for i in session.get_inputs()}
+    if sorted(inputs) != sorted(expected_inputs):
+        errors.append(f"입력 이름 {sorted(inputs)} != {sorted(expected_inputs)}")
+    for i, shape in enumerate(obs_shapes):
+        name = f"obs_{i}"
+        if name in inputs and list(inputs[name].shape[1:]) != list(mlagents_input_shape(shape)):
+            errors.append(f"{name} 형태 {inputs[name].shape[1:]} != {list(mlagents_input_shape(shape))}")
+    if ACTION_MASKS in inputs and inputs[ACTION_MASKS].shape[1:] != [int(sum(branches))]:
+        errors.append(f"{ACTION_MASKS} 형태 {inputs[ACTION_MASKS].shape[1:]} != {[int(sum(branches))]}")
+    output_names = [o.name for o in session.get_outputs()]
+    missing = [name for name in MLAGENTS_OUTPUT_NAMES if name not in output_names]
+    if missing:
+        errors.append(f"출력 없음: {missing}")
+    if errors:
+        return {"ok": False, "errors": errors, "action_agreement": None}
+
+    rng = np.random.default_rng(seed)
+    obs_inputs = [(rng.random((n_samples, *mlagents_input_shape(s))) if len(s) == 3
+                   else rng.standard_normal((n_samples, *s))).astype(np.float32) for s in obs_shapes]
+    feed = {f"obs_{i}": x for i, x in enumerate(obs_inputs)}
+    feed[ACTION_MASKS] = np.ones((n_samples, int(sum(branches))), dtype=np.float32)
+    result = dict(zip(output_names, session.run(output_names, feed)))
+
+    if result[VERSION_NUMBER].reshape(-1).tolist() != [float(MLAGENTS_MODEL_VERSION)]:
+        errors.append(f"version_number {result[VERSION_NUMBER].tolist()} != [{MLAGENTS_MODEL_VERSION}]")
+    if result[MEMORY_SIZE].reshape(-1).tolist() != [0.0]:
+        errors.append(f"memory_size {result[MEMORY_SIZE].tolist()} != [0]")
+    if result[DISCRETE_ACTION_OUTPUT_SHAPE].reshape(-1).tolist() != [float(b) for b in branches]:
+        errors.append(f"discrete_action_output_shape {result[DISCRETE_ACTION_OUTPUT_SHAPE].tolist()} != {list(branches)}")
+    for name in (DISCRETE_ACTIONS, DETERMINISTIC_DISCRETE_ACTIONS):
+        actions = result[name]
+        if actions.shape != (n_samples, len(branches)):
+            errors.append(f"{name} 형태 {actions.shape} != {(n_samples, len(branches))}")
+        elif np.any(actions < 0) or np.any(actions >= np.asarray(branches)):
+            errors.append(f"{name} 값이 브랜치 범위를 벗어났습니다.")
+    deterministic = result[DETERMINISTIC_DISCRETE_ACTIONS]
+
+    binning = model is not None and isinstance(model.action_space, spaces.Box)
+    if not errors and not binning and branches[0] > 1:
+        # 결정적 행동의 첫 브랜치 값을 막으면 다른 값을 골라야 함
+        masks = feed[ACTION_MASKS].copy()
+        masks[np.arange(n_samples), deterministic[:, 0]] = 0.0
+        masked = session.run([DETERMINISTIC_DISCRETE_ACTIONS], {**feed, ACTION_MASKS: masks})[0]
+        if np.any(masked[:, 0] == deterministic[:, 0]):
+            errors.append("action_masks로 막은 행동을 선택했습니다.")
+
+    agreement = None
+    if model is not None and not errors:
+        obs = _wrapper_observation(obs_inputs, obs_shapes, isinstance(model.observation_space, spaces.Dict))
+        actions, _ = model.predict(obs, deterministic=True)
+        expected = _branches_from_actions(actions, branches, binning)
+        agreement = float(np.mean(np.all(expected == deterministic, axis=1)))
+        if agreement < 1.0:
+            errors.append(f"SB3 행동과 일치율 {agreement:.3f}")
+    return {"ok": not errors, "errors": errors, "action_agreement": agreement}
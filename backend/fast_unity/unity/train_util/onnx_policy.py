@@ -0,0 +1,374 @@
+import inspect
+import json
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+import torch as th
+import torch.nn as nn
+from gymnasium import spaces
+from stable_baselines3 import DQN, SAC
+from stable_baselines3.common.base_class import BaseAlgorithm
+from stable_baselines3.common.policies import ActorCriticPolicy, BasePolicy
+from stable_baselines3.common.preprocessing import is_image_space, is_image_space_channels_first, maybe_transpose
+from stable_baselines3.common.utils import is_vectorized_observation
+from stable_baselines3.common.vec_env import VecTransposeImage
+
+try:
+    import onnxruntime as ort
+except ImportError:  # onnxruntime이 없으면 torch 정책으로만 추론
+    ort = None
+
+ONNX_OPSET = 17
+# 정책 출력 종류
+KIND_Q = "q_values"                  # DQN: argmax (확률적이면 epsilon-greedy)
+KIND_LOGITS = "logits"               # PPO/A2C Discrete: argmax / 소프트맥스 샘플링
+KIND_GAUSSIAN = "gaussian"           # PPO/A2C Box: 평균 / 평균 + exp(log_std) * N(0, 1), 행동 공간으로 clip
+KIND_SQUASHED = "squashed_gaussian"  # SAC: tanh 후 [low, high]로 스케일
+
+
+def onnx_path_for(model_path: str) -> str:
+    """models/foo.zip(또는 models/foo) → models/foo.onnx"""
+    root, ext = os.path.splitext(model_path)
+    return (root if ext == ".zip" else model_path) + ".onnx"
+
+
+def quantized_onnx_path_for(model_path: str) -> str:
+    """models/foo.zip(또는 models/foo) → models/foo.int8.onnx"""
+    root, ext = os.path.splitext(model_path)
+    return (root if ext == ".zip" else model_path) + ".int8.onnx"
+
+
+def inference_backend() -> str:
+    """INFERENCE_BACKEND 환경 변수: onnx(기본, .onnx가 있으면 onnxruntime 사용) / torch"""
+    return os.getenv("INFERENCE_BACKEND", "onnx").lower()
+
+
+def inference_precision() -> str:
+    """INFERENCE_PRECISION 환경 변수: int8(기본, 검증을 통과한 .int8.onnx가 있으면 사용) / fp32"""
+    return os.getenv("INFERENCE_PRECISION", "int8").lower()
+
+
+class OnnxExportModule(nn.Module):
+    """
+    SB3 정책의 추론 경로(전처리 + 특징 추출 + 행동 헤드)를 관측 텐서만 받는 모듈로 감쌉니다.
+    Dict 관측은 키 순서대로 입력을 나눠 받고 다시 dict로 묶어 정책에 넘깁니다.
+    """
+
+    def __init__(self, policy: BasePolicy, kind: str, obs_keys: Optional[List[str]]):
+        super().__init__()
+        self.policy = policy
+        self.kind = kind
+        self.obs_keys = obs_keys
+
+    def forward(self, *obs_inputs: th.Tensor):
+        obs = dict(zip(self.obs_keys, obs_inputs)) if self.obs_keys else obs_inputs[0]
+        if self.kind == KIND_Q:
+            return self.policy.q_net(obs)
+        if self.kind == KIND_SQUASHED:
+            mean, log_std, _ = self.policy.actor.get_action_dist_params(obs)
+            return mean, log_std
+
+        # ActorCriticPolicy: 공유 여부와 무관하게 actor 쪽 특징 추출기만 사용
+        features = BasePolicy.extract_features(self.policy, obs, self.policy.pi_features_extractor)
+        latent_pi = self.policy.mlp_extractor.forward_actor(features)
+        mean = self.policy.action_net(latent_pi)
+        if self.kind == KIND_LOGITS:
+            return mean
+        return mean, self.policy.log_std.expand_as(mean)
+
+
+def policy_kind(model: BaseAlgorithm) -> Optional[str]:
+    """ONNX로 내보낼 정책 출력 종류 (KIND_*). 지원하지 않는 정책(gSDE 등)이면 None"""
+    action_space = model.action_space
+    if isinstance(model, DQN):
+        return KIND_Q
+    if isinstance(model, SAC):
+        return KIND_SQUASHED if not model.use_sde else None
+    if isinstance(model.policy, ActorCriticPolicy) and not model.policy.use_sde:
+        if isinstance(action_space, spaces.Discrete):
+            return KIND_LOGITS
+        if isinstance(action_space, spaces.Box):
+            return KIND_GAUSSIAN
+    return None
+
+
+def sample_observations(observation_space: spaces.Space, n: int, seed: int = 0) -> Union[np.ndarray, Dict[str, np.ndarray]]:
+    """관측 공간에서 무작위 관측 n개를 배치로 뽑습니다. (검증/벤치마크용, Dict면 키별 배열)"""
+    observation_space.seed(seed)
+    samples = [observation_space.sample() for _ in range(n)]
+    if isinstance(observation_space, spaces.Dict):
+        return {key: np.stack([s[key] for s in samples]) for key in observation_space.spaces}
+    return np.stack(samples)
+
+
+def export_onnx(model: BaseAlgorithm, model_path: str, verify: bool = True) -> Optional[str]:
+    """
+    학습된 모델의 정책을 model_path(.zip) 옆에 .onnx로 내보내고, 행동 후처리 정보는 .onnx.json에 저장합니다.
+    - DQN(MlpPolicy/MultiInputPolicy/DiffrentRLPolicy), PPO/A2C(Discrete/Box), SAC를 지원합니다.
+    - verify=True면 무작위 관측으로 torch 출력과 비교해 어긋나면 파일을 지웁니다. (로더는 torch로 대체)
+    실패하거나 지원하지 않는 정책이면 None을 반환합니다.
+    """
+    kind = policy_kind(model)
+    if kind is None:
+        print(f"[export_onnx] 지원하지 않는 정책입니다: {type(model).__name__}/{type(model.policy).__name__}")
+        return None
+
+    observation_space = model.observation_space
+    obs_keys = list(observation_space.spaces) if isinstance(observation_space, spaces.Dict) else None
+    input_names = obs_keys or ["obs"]
+    output_names = ["q_values"] if kind == KIND_Q else ["logits"] if kind == KIND_LOGITS else ["mean", "log_std"]
+
+    sample = sample_observations(observation_space, 1)
+    dummy = tuple(th.as_tensor(sample[k]) for k in obs_keys) if obs_keys else (th.as_tensor(sample),)
+    path = onnx_path_for(model_path)
+
+    policy = model.policy
+    device = policy.device
+    module = OnnxExportModule(policy, kind, obs_keys).to("cpu").eval()
+    export_kwargs = dict(
+        input_names=input_names,
+        output_names=output_names,
+        dynamic_axes={name: {0: "batch"} for name in input_names + output_names},
+        opset_version=ONNX_OPSET,
+        dynamo=False,  # TorchScript 기반 exporter (최신 torch의 기본값은 dynamo)
+    )
+    export_params = inspect.signature(th.onnx.export).parameters
+    export_kwargs = {k: v for k, v in export_kwargs.items() if k in export_params}
+    try:
+        with th.no_grad():
+            th.onnx.export(module, dummy, path, **export_kwargs)
+    except Exception as e:
+        print(f"[export_onnx][WARN] ONNX 내보내기 실패: {e}")
+        return None
+    finally:
+        policy.to(device)
+
+    action_space = model.action_space
+    meta: Dict[str, Any] = {
+        "algo": type(model).__name__,
+        "kind": kind,
+        "obs_keys": obs_keys,
+        "exploration_rate": float(getattr(model, "exploration_rate", 0.0)) if kind == KIND_Q else 0.0,
+    }
+    if isinstance(action_space, spaces.Box):
+        meta.update(action_shape=list(action_space.shape),
+                    action_low=action_space.low.tolist(), action_high=action_space.high.tolist())
+    with open(path + ".json", "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+
+    if verify and ort is not None:
+        report = check_onnx_parity(model, OnnxPolicy(path, observation_space, action_space))
+        if not report["ok"]:
+            print(f"[export_onnx][WARN] torch와 출력이 다릅니다 ({report}). ONNX 파일을 삭제합니다.")
+            for p in (path, path + ".json"):
+                if os.path.exists(p):
+                    os.remove(p)
+            return None
+    return path
+
+
+class OnnxPolicy:
+    """
+    export_onnx로 내보낸 정책을 onnxruntime(CPU)으로 실행합니다.
+    SB3 model.predict와 같은 시그니처/반환 형태라 test_model과 teacher(_call_teacher)에서 그대로 쓸 수 있습니다.
+    """
+
+    def __init__(self, path: str, observation_space: spaces.Space, action_space: spaces.Space, num_threads: int = 1):
+        if ort is None:
+            raise ImportError("onnxruntime이 설치되어 있지 않습니다.")
+        with open(path + ".json", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        options = ort.SessionOptions()
+        # 배치 1 추론은 스레드 동기화 비용이 더 크므로 기본 1 스레드
+        options.intra_op_num_threads = num_threads
+        options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(path, sess_options=options, providers=["CPUExecutionProvider"])
+        self.path = path
+        self.observation_space = observation_space
+        self.action_space = action_space
+        self.kind = self.meta["kind"]
+        self.obs_keys: Optional[List[str]] = self.meta["obs_keys"]
+        self.exploration_rate = self.meta.get("exploration_rate", 0.0)
+        self._input_names = [i.name for i in self.session.get_inputs()]
+        self._rng = np.random.default_rng()
+        if isinstance(action_space, spaces.Box):
+            self._low = np.asarray(self.meta["action_low"], dtype=np.float32)
+            self._high = np.asarray(self.meta["action_high"], dtype=np.float32)
+
+    def _feed(self, observation) -> Tuple[Dict[str, np.ndarray], bool]:
+        # SB3 obs_to_tensor와 같이 채널 순서를 맞추고 배치 차원을 붙임
+        if self.obs_keys:
+            spaces_by_key = self.observation_space.spaces
+            observation = {k: maybe_transpose(np.asarray(observation[k]), spaces_by_key[k]) for k in self.obs_keys}
+            vectorized = is_vectorized_observation(observation, self.observation_space)
+            feed = {name: np.asarray(observation[k], dtype=spaces_by_key[k].dtype).reshape((-1, *spaces_by_key[k].shape))
+                    for name, k in zip(self._input_names, self.obs_keys)}
+            return feed, vectorized
+        observation = maybe_transpose(np.asarray(observation), self.observation_space)
+        vectorized = is_vectorized_observation(observation, self.observation_space)
+        space = self.observation_space
+        return {self._input_names[0]: np.asarray(observation, dtype=space.dtype).reshape((-1, *space.shape))}, vectorized
+
+    def forward(self, observation) -> Tuple[List[np.ndarray], bool]:
+        """정책의 원시 출력 (q_values / logits / mean, log_std)"""
+        feed, vectorized = self._feed(observation)
+        return self.session.run(None, feed), vectorized
+
+    def predict(
+        self,
+        observation: Union[np.ndarray, Dict[str, np.ndarray]],
+        state: Optional[Tuple[np.ndarray, ...]] = None,
+        episode_start: Optional[np.ndarray] = None,
+        deterministic: bool = False,
+    ) -> Tuple[np.ndarray, Optional[Tuple[np.ndarray, ...]]]:
+        outputs, vectorized = self.forward(observation)
+        out = outputs[0]
+        n_batch = out.shape[0]
+
+        if self.kind == KIND_Q:
+            actions = out.argmax(axis=1)
+            if not deterministic and self._rng.random() < self.exploration_rate:
+                # DQN.predict와 같이 배치 전체를 무작위 행동으로
+                actions = np.array([self.action_space.sample() for _ in range(n_batch)])
+        elif self.kind == KIND_LOGITS:
+            if deterministic:
+                actions = out.argmax(axis=1)
+            else:
+                probs = np.exp(out - out.max(axis=1, keepdims=True))
+                probs /= probs.sum(axis=1, keepdims=True)
+                actions = (probs.cumsum(axis=1) > self._rng.random((n_batch, 1))).argmax(axis=1)
+        else:
+            mean, log_std = outputs
+            actions = mean if deterministic else mean + np.exp(log_std) * self._rng.standard_normal(mean.shape)
+            if self.kind == KIND_SQUASHED:
+                actions = self._low + 0.5 * (np.tanh(actions) + 1.0) * (self._high - self._low)
+            else:
+                actions = np.clip(actions, self._low, self._high)
+            actions = actions.astype(np.float32).reshape((-1, *self.action_space.shape))
+
+        if not vectorized:
+            actions = actions.squeeze(axis=0)
+        return actions, state
+
+
+def policy_observation_space(space: spaces.Space) -> spaces.Space:
+    """env 관측 공간 → SB3 정책이 보는 관측 공간 (채널 마지막 이미지는 VecTransposeImage처럼 (C, H, W)로)"""
+    if isinstance(space, spaces.Dict):
+        return spaces.Dict({k: policy_observation_space(s) for k, s in space.spaces.items()})
+    if is_image_space(space) and not is_image_space_channels_first(space):
+        return VecTransposeImage.transpose_space(space)
+    return space
+
+
+def load_onnx_policy(model_path: str, observation_space: spaces.Space, action_space: spaces.Space) -> Optional[OnnxPolicy]:
+    """
+    model_path 옆의 .onnx를 OnnxPolicy로 불러옵니다. 양자화 검증을 통과한 .int8.onnx가 있으면 그것을 먼저 씁니다.
+    다음 경우에는 None (호출한 쪽에서 torch로 로드):
+    INFERENCE_BACKEND=torch, onnxruntime 없음, .onnx가 없거나 .zip보다 오래됨(.zip이 없으면 삭제된 모델로 보고 사용 안 함),
+    관측 입력이 env와 다름.
+    """
+    if inference_backend() != "onnx" or ort is None:
+        return None
+    root, ext = os.path.splitext(model_path)
+    zip_path = (root if ext == ".zip" else model_path) + ".zip"
+    candidates = [onnx_path_for(model_path)]
+    if inference_precision() == "int8":
+        candidates.insert(0, quantized_onnx_path_for(model_path))
+    path = None
+    for candidate in candidates:
+        if not os.path.exists(candidate) or not os.path.exists(candidate + ".json"):
+            continue
+        if not os.path.exists(zip_path):
+            print(f"[load_onnx_policy] {zip_path}가 없어 {candidate}를 사용하지 않습니다.")
+            continue
+        if os.path.getmtime(zip_path) > os.path.getmtime(candidate):
+            print(f"[load_onnx_policy] {candidate}가 모델보다 오래되어 사용하지 않습니다.")
+            continue
+        path = candidate
+        break
+    if path is None:
+        return None
+    observation_space = policy_observation_space(observation_space)
+    try:
+        policy = OnnxPolicy(path, observation_space, action_space)
+    except Exception as e:
+        print(f"[load_onnx_policy][WARN] ONNX 로드 실패, torch로 로드합니다: {e}")
+        return None
+
+    keys = policy.obs_keys or [None]
+    if policy.obs_keys and set(policy.obs_keys) != set(getattr(observation_space, "spaces", {})):
+        print(f"[load_onnx_policy] 관측 키가 다릅니다 ({policy.obs_keys}). torch로 로드합니다.")
+        return None
+    for inp, key in zip(policy.session.get_inputs(), keys):
+        space = observation_space.spaces[key] if key is not None else observation_space
+        if list(inp.shape[1:]) != list(space.shape):
+            print(f"[load_onnx_policy] 관측 형태가 다릅니다 ({inp.name}: {inp.shape[1:]} != {space.shape}). torch로 로드합니다.")
+            return None
+    print(f"[load_onnx_policy] onnxruntime(CPU)으로 추론합니다: {path}")
+    return policy
+
+
+def policy_outputs(model: BaseAlgorithm, kind: str, obs) -> List[np.ndarray]:
+    """ONNX 그래프와 같은 형식의 torch 정책 원시 출력 (Q값 / 로짓 / 평균, log_std)"""
+    policy = model.policy
+    obs_keys = list(obs) if isinstance(obs, dict) else None
+    module = OnnxExportModule(policy, kind, obs_keys)
+    with th.no_grad():
+        obs_tensor, _ = policy.obs_to_tensor(obs)
+        inputs = [obs_tensor[k] for k in obs_keys] if obs_keys else [obs_tensor]
+        outputs = module(*inputs)
+    if isinstance(outputs, th.Tensor):
+        outputs = (outputs,)
+    return [o.detach().cpu().numpy() for o in outputs]
+
+
+def check_onnx_parity(model: BaseAlgorithm, onnx_policy: OnnxPolicy, n_samples: int = 256,
+                      atol: float = 1e-4, rtol: float = 1e-3, seed: int = 0) -> Dict[str, Any]:
+    """
+    무작위 관측 n_samples개로 torch 정책과 ONNX 정책의 원시 출력/결정적 행동을 비교합니다.
+    반환: {"ok", "max_abs_diff", "action_agreement"}. 원시 출력이 허용 오차 안이고 행동이 모두 같으면 ok.
+    """
+    model.policy.set_training_mode(False)
+    obs = sample_observations(model.observation_space, n_samples, seed)
+    torch_outputs = policy_outputs(model, onnx_policy.kind, obs)
+    onnx_outputs, _ = onnx_policy.forward(obs)
+
+    max_abs_diff = max(float(np.max(np.abs(t - o))) for t, o in zip(torch_outputs, onnx_outputs))
+    close = all(np.allclose(t, o, atol=atol, rtol=rtol) for t, o in zip(torch_outputs, onnx_outputs))
+
+    torch_actions, _ = model.policy.predict(obs, deterministic=True)
+    onnx_actions, _ = onnx_policy.predict(obs, deterministic=True)
+    if isinstance(model.action_space, spaces.Box):
+        agreement = float(np.mean(np.all(np.isclose(torch_actions, onnx_actions, atol=atol * 10), axis=-1)))
+    else:
+        agreement = float(np.mean(torch_actions == onnx_actions))
+    return {"ok": close and agreement == 1.0, "max_abs_diff": max_abs_diff, "action_agreement": agreement}
+
+
+def benchmark_inference(model: BaseAlgorithm, onnx_policy: OnnxPolicy, n_iters: int = 1000,
+                        batch_size: int = 1, warmup: int = 50, seed: int = 0) -> Dict[str, float]:
+    """
+    같은 관측으로 torch model.predict와 OnnxPolicy.predict의 호출당 지연 시간(ms)을 잽니다. (결정적 행동)
+    반환: {torch,onnx}_{p50,p95,mean}_ms 와 speedup(p50 기준)
+    """
+    obs = sample_observations(model.observation_space, batch_size, seed)
+    if batch_size == 1:
+        obs = {k: v[0] for k, v in obs.items()} if isinstance(obs, dict) else obs[0]
+
+    result: Dict[str, float] = {}
+    for name, predict in (("torch", model.predict), ("onnx", onnx_policy.predict)):
+        for _ in range(warmup):
+            predict(obs, deterministic=True)
+        timings = np.empty(n_iters)
+        for i in range(n_iters):
+            start = time.perf_counter()
+            predict(obs, deterministic=True)
+            timings[i] = time.perf_counter() - start
+        timings *= 1e3
+        result[f"{name}_p50_ms"] = float(np.percentile(timings, 50))
+        result[f"{name}_p95_ms"] = float(np.percentile(timings, 95))
+        result[f"{name}_mean_ms"] = float(timings.mean())
+    result["speedup"] = result["torch_p50_ms"] / result["onnx_p50_ms"]
+    return result
@@ -0,0 +1,203 @@
+import json
+import os
+import shutil
+import time
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+from gymnasium import spaces
+from stable_baselines3.common.base_class import BaseAlgorithm
+
+from unity.train_util.onnx_policy import OnnxPolicy, onnx_path_for, quantized_onnx_path_for
+
+try:
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+except ImportError:  # onnx 패키지가 없으면 양자화하지 않음
+    quantize_dynamic = None
+
+Observations = Union[np.ndarray, Dict[str, np.ndarray]]
+
+# int8 가중치로 바꿀 연산 후보: Conv 포함 / 제외(Conv는 fp32)
+QUANTIZE_CANDIDATES: Tuple[List[str], ...] = (["MatMul", "Gemm", "Conv"], ["MatMul", "Gemm"])
+
+
+def observation_set_path_for(model_path: str) -> str:
+    """models/foo.zip(또는 models/foo) → models/foo.obs.npz (양자화 검증용 관측 묶음)"""
+    root, ext = os.path.splitext(model_path)
+    return (root if ext == ".zip" else model_path) + ".obs.npz"
+
+
+def quantize_candidate_paths(model_path: str) -> List[str]:
+    """quantize_policy가 후보마다 쓰는 임시 파일 경로 (QUANTIZE_CANDIDATES 순서, 각각 .json 사이드카가 붙음)"""
+    return [f"{quantized_onnx_path_for(model_path)}.{i}.tmp" for i in range(len(QUANTIZE_CANDIDATES))]
+
+
+def record_observations(model: BaseAlgorithm, n: int = 512, seed: int = 0) -> Optional[Observations]:
+    """
+    학습 중 실제로 본 관측을 리플레이 버퍼(off-policy) 또는 마지막 롤아웃 버퍼(on-policy)에서 최대 n개 뽑습니다.
+    버퍼 관측 형태가 정책 입력과 다르면(예: 이미지 대신 CNN 임베딩을 저장하는 버퍼) None.
+    """
+    observation_space = model.observation_space
+    for buffer in (getattr(model, "replay_buffer", None), getattr(model, "rollout_buffer", None)):
+        if buffer is None or buffer.size() == 0:
+            continue
+        stored = buffer.observations
+        arrays = stored if isinstance(stored, dict) else {None: stored}
+        expected = observation_space.spaces if isinstance(observation_space, spaces.Dict) else {None: observation_space}
+        if set(arrays) != set(expected) or any(
+            arrays[k].shape[arrays[k].ndim - len(expected[k].shape):] != expected[k].shape
+            or arrays[k].ndim - len(expected[k].shape) not in (1, 2) for k in expected
+        ):
+            continue
+        # (버퍼 크기, n_envs, ...) 또는 학습 후 평탄화된 롤아웃 버퍼 (n_steps * n_envs, ...) 모두 앞쪽 행이 유효
+        total = buffer.size() * buffer.n_envs
+        idx = np.random.default_rng(seed).choice(total, size=min(n, total), replace=False)
+        flat = {k: v.reshape((-1, *expected[k].shape))[idx].astype(expected[k].dtype) for k, v in arrays.items()}
+        return flat if isinstance(stored, dict) else flat[None]
+    return None
+
+
+def save_observation_set(path: str, observations: Observations) -> None:
+    arrays = observations if isinstance(observations, dict) else {"obs": observations}
+    np.savez_compressed(path, **arrays)
+
+
+def load_observation_set(path: str) -> Observations:
+    with np.load(path) as data:
+        arrays = {k: data[k] for k in data.files}
+    return arrays["obs"] if list(arrays) == ["obs"] else arrays
+
+
+def _greedy_agreement(fp32_actions: np.ndarray, int8_actions: np.ndarray, action_space: spaces.Space,
+                      action_tolerance: float) -> float:
+    if isinstance(action_space, spaces.Box):
+        # 연속 행동: 모든 차원이 행동 범위의 action_tolerance 안이면 일치
+        tolerance = action_tolerance * (action_space.high - action_space.low)
+        diff = np.abs(fp32_actions - int8_actions).reshape(len(fp32_actions), -1)
+        return float(np.mean(np.all(diff <= tolerance.reshape(-1), axis=1)))
+    return float(np.mean(fp32_actions == int8_actions))
+
+
+def _latency_p50_ms(policy: OnnxPolicy, observations: Observations, n_iters: int) -> float:
+    size = len(next(iter(observations.values()))) if isinstance(observations, dict) else len(observations)
+    timings = np.empty(n_iters)
+    for i in range(n_iters):
+        j = i % size
+        obs = {k: v[j] for k, v in observations.items()} if isinstance(observations, dict) else observations[j]
+        start = time.perf_counter()
+        policy.predict(obs, deterministic=True)
+        timings[i] = time.perf_counter() - start
+    return float(np.median(timings) * 1e3)
+
+
+def quantize_policy(
+    model_path: str,
+    observation_space: spaces.Space,
+    action_space: spaces.Space,
+    observations: Observations,
+    min_agreement: float = 0.98,
+    action_tolerance: float = 0.05,
+    n_latency_iters: int = 200,
+    min_speedup: float = 1.0,
+) -> Dict[str, Any]:
+    """
+    export_onnx로 내보낸 fp32 정책(.onnx)에 int8 동적 양자화를 적용해 .int8.onnx로 저장합니다.
+    - 가중치를 int8로 바꾸는 대상은 MatMul/Gemm(헤드, 벡터 MLP)과 Conv입니다.
+      Conv를 포함한 것과 제외한 것(Conv는 fp32) 중 일치율을 통과한 더 빠른 쪽을 씁니다.
+    - 기록된 관측(observations)으로 fp32/int8의 결정적(greedy) 행동을 비교해 일치율이 min_agreement 이상이고
+      배치 1 지연 시간이 fp32 대비 min_speedup배 이상 빠를 때만 남깁니다.
+    - 반환 보고서(일치율, 배치 1 지연 시간 p50, 파일 크기)는 통과하면 .int8.onnx.json의 "quantization"에도 기록됩니다.
+      만들거나 실행하지 못한 후보는 보고서의 "errors"에 {"quantized_ops", "error"}로 남습니다.
+    """
+    fp32_path = onnx_path_for(model_path)
+    int8_path = quantized_onnx_path_for(model_path)
+    report: Dict[str, Any] = {"accepted": False, "path": int8_path, "min_agreement": min_agreement}
+    if quantize_dynamic is None:
+        report["error"] = "onnxruntime.quantization을 사용할 수 없습니다. (onnx 패키지 필요)"
+        return report
+    if not os.path.exists(fp32_path):
+        report["error"] = f"{fp32_path}가 없습니다. export_onnx를 먼저 실행하세요."
+        return report
+
+    fp32_policy = OnnxPolicy(fp32_path, observation_space, action_space)
+    fp32_actions = np.asarray(fp32_policy.predict(observations, deterministic=True)[0])
+    report["n_observations"] = int(len(fp32_actions))
+    report["fp32_p50_ms"] = _latency_p50_ms(fp32_policy, observations, n_latency_iters)
+    report["fp32_bytes"] = os.path.getsize(fp32_path)
+
+    # Conv 포함/제외 두 후보를 모두 만들어 보고, 일치율을 통과한 것 중 가장 빠른 것을 고릅니다.
+    candidates = []
+    report["errors"] = []
+    for op_types, candidate_path in zip(QUANTIZE_CANDIDATES, quantize_candidate_paths(model_path)):
+        try:
+            quantize_dynamic(fp32_path, candidate_path, weight_type=QuantType.QInt8, op_types_to_quantize=op_types)
+            shutil.copyfile(fp32_path + ".json", candidate_path + ".json")
+            policy = OnnxPolicy(candidate_path, observation_space, action_space)
+            actions = np.asarray(policy.predict(observations, deterministic=True)[0])
+        except Exception as e:
+            print(f"[quantize_policy] {op_types} 양자화 실패: {e}")
+            report["errors"].append({"quantized_ops": op_types, "error": f"{type(e).__name__}: {e}"})
+            _remove(candidate_path)
+            continue
+        candidates.append({
+            "path": candidate_path,
+            "quantized_ops": op_types,
+            "agreement": _greedy_agreement(fp32_actions, actions, action_space, action_tolerance),
+            "int8_p50_ms": _latency_p50_ms(policy, observations, n_latency_iters),
+            "int8_bytes": os.path.getsize(candidate_path),
+        })
+    if not candidates:
+        report["error"] = "양자화한 모델을 실행할 수 없습니다: " + "; ".join(
+            f"{'+'.join(e['quantized_ops'])}: {e['error']}" for e in report["errors"])
+        return report
+
+    passed = [c for c in candidates if c["agreement"] >= min_agreement]
+    best = min(passed or candidates, key=lambda c: c["int8_p50_ms"])
+    for c in candidates:
+        if c is not best:
+            _remove(c["path"])
+    report.update({k: v for k, v in best.items() if k != "path"})
+    report["speedup"] = report["fp32_p50_ms"] / report["int8_p50_ms"]
+    report["min_speedup"] = min_speedup
+    # 배치 1 CPU에서는 양자화/역양자화 비용 때문에 int8이 더 느릴 수 있으므로 속도도 기준으로 봄
+    report["accepted"] = report["agreement"] >= min_agreement and report["speedup"] >= min_speedup
+
+    if report["accepted"]:
+        with open(best["path"] + ".json", encoding="utf-8") as f:
+            meta = json.load(f)
+        meta["quantization"] = report
+        with open(int8_path + ".json", "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(best["path"], int8_path)
+        _remove(best["path"])
+    else:
+        _remove(best["path"])
+        _remove(int8_path)
+    print(f"[quantize_policy] {'채택' if report['accepted'] else '거부'}: 일치율 {report['agreement']:.3f} "
+          f"(기준 {min_agreement}), p50 {report['fp32_p50_ms']:.3f}ms → {report['int8_p50_ms']:.3f}ms "
+          f"(x{report['speedup']:.2f}, 기준 x{min_speedup}), {report['fp32_bytes']} → {report['int8_bytes']} bytes "
+          f"({'+'.join(report['quantized_ops'])})")
+    return report
+
+
+def _remove(int8_path: str) -> None:
+    for path in (int8_path, int8_path + ".json"):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def quantize_trained_model(model: BaseAlgorithm, model_path: str, n_observations: int = 512) -> Optional[Dict[str, Any]]:
+    """
+    학습 종료 시 호출: 버퍼에서 관측을 기록(.obs.npz)하고 quantize_policy를 실행합니다.
+    (ONNX_QUANTIZE_MIN_AGREEMENT / ONNX_QUANTIZE_MIN_SPEEDUP 환경 변수로 채택 기준을 바꿀 수 있음, 기본 0.98 / 1.0)
+    저장된 .obs.npz는 나중에 load_observation_set으로 다시 검증할 때 씁니다.
+    """
+    observations = record_observations(model, n_observations)
+    if observations is None:
+        print("[quantize_trained_model] 버퍼에 검증용 관측이 없어 양자화를 건너뜁니다.")
+        return None
+    save_observation_set(observation_set_path_for(model_path), observations)
+    min_agreement = float(os.getenv("ONNX_QUANTIZE_MIN_AGREEMENT", "0.98"))
+    min_speedup = float(os.getenv("ONNX_QUANTIZE_MIN_SPEEDUP", "1.0"))
+    return quantize_policy(model_path, model.observation_space, model.action_space, observations,
+                           min_agreement=min_agreement, min_speedup=min_speedup)
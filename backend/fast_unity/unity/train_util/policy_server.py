@@ -0,0 +1,493 @@
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from contextlib import suppress
+from multiprocessing.connection import Client, Connection, Listener
+from typing import Any, Callable, Deque, Dict, Hashable, List, Optional, Tuple, Union
+
+import numpy as np
+
+Observation = Union[np.ndarray, Dict[str, np.ndarray]]
+
+
+class _Request:
+    __slots__ = ("observation", "deterministic", "action", "error", "done")
+
+    def __init__(self):
+        self.observation: Optional[Observation] = None
+        self.deterministic = False
+        self.action: Optional[np.ndarray] = None
+        self.error: Optional[BaseException] = None
+        self.done = threading.Event()
+
+
+class _ModelEntry:
+    """서버가 들고 있는 모델 하나와 그 모델의 요청 큐/배치 스레드"""
+
+    def __init__(self, key: Hashable):
+        self.key = key
+        self.model: Any = None
+        # 첫 세션이 서버 락 밖에서 모델을 로드하는 동안 같은 키의 다른 세션은 이 이벤트를 기다림
+        self.loaded = threading.Event()
+        self.load_error: Optional[BaseException] = None
+        self.refs = 0
+        self.queue: Deque[_Request] = deque()
+        self.cond = threading.Condition()
+        # 배치 스레드와 단독 세션의 직접 호출이 동시에 predict하지 않도록
+        self.predict_lock = threading.Lock()
+        self.stopped = False
+        self.thread: Optional[threading.Thread] = None
+        self.batches = 0
+        self.requests = 0
+
+
+class PolicyClient:
+    """
+    PolicyServer에 등록된 모델을 쓰는 세션 하나. SB3 model.predict와 같은 시그니처입니다.
+    관측은 배치 차원 없는 단일 관측만 받습니다. (test_model처럼 환경 하나를 도는 세션)
+    """
+
+    def __init__(self, server: "PolicyServer", entry: _ModelEntry):
+        self._server = server
+        self._entry = entry
+        # 세션당 요청은 한 번에 하나이므로 요청 객체를 재사용
+        self._request = _Request()
+        self.observation_space = entry.model.observation_space
+        self.action_space = entry.model.action_space
+
+    def predict(
+        self,
+        observation: Observation,
+        state: Optional[Tuple[np.ndarray, ...]] = None,
+        episode_start: Optional[np.ndarray] = None,
+        deterministic: bool = False,
+    ) -> Tuple[np.ndarray, Optional[Tuple[np.ndarray, ...]]]:
+        entry = self._entry
+        if entry is None:
+            raise RuntimeError("이미 닫힌 PolicyClient입니다.")
+        if entry.refs == 1:
+            # 같은 모델을 쓰는 다른 세션이 없으면 묶을 대상이 없으므로 큐를 거치지 않고 바로 추론
+            with entry.predict_lock:
+                entry.batches += 1
+                entry.requests += 1
+                return entry.model.predict(observation, state, episode_start, deterministic)
+
+        request = self._request
+        request.observation = observation
+        request.deterministic = deterministic
+        request.action = None
+        request.error = None
+        request.done.clear()
+        with entry.cond:
+            entry.queue.append(request)
+            entry.cond.notify_all()
+        request.done.wait()
+        request.observation = None
+        if request.error is not None:
+            raise request.error
+        return request.action, state
+
+    def close(self) -> None:
+        if self._entry is not None:
+            self._server._release(self._entry)
+            self._entry = None
+
+    def __enter__(self) -> "PolicyClient":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class PolicyServer:
+    """
+    프로세스 안에서 여러 추론 세션이 모델을 공유하는 마이크로 배치 추론 서버.
+
+    - 모델은 키(예: 알고리즘 + 모델 이름)마다 한 번만 로드하고, 세션(PolicyClient)이 모두 닫히면 해제합니다.
+    - 모델마다 배치 스레드 하나가 요청을 모아 한 번의 predict로 처리합니다.
+      첫 요청 후 latency_budget_ms까지, 또는 max_batch_size개나 연결된 세션 수만큼 모이면 바로 실행합니다.
+      (세션은 한 번에 요청 하나만 보내므로 모든 세션이 도착했으면 더 기다릴 이유가 없음)
+    - 세션이 하나뿐이면 큐를 거치지 않고 바로 predict합니다.
+    - DQN 계열(exploration_rate > 0)의 확률적 행동은 배치 전체가 아니라 요청마다 epsilon-greedy를 적용해
+      세션별로 predict할 때와 같은 분포를 유지합니다.
+    - POLICY_SERVER=1이면 전용 프로세스(PolicyServerProcess)에서 실행되고, test 워커들은 RemotePolicy로 그 프로세스에
+      직접 연결합니다. (API 프로세스는 관측을 중계하거나 추론하지 않음)
+    """
+
+    def __init__(self, max_batch_size: int = 32, latency_budget_ms: float = 2.0):
+        self.max_batch_size = max_batch_size
+        self.latency_budget = latency_budget_ms / 1e3
+        self._entries: Dict[Hashable, _ModelEntry] = {}
+        self._lock = threading.Lock()
+        self._rng = np.random.default_rng()
+
+    def client(self, key: Hashable, loader: Callable[[], Any]) -> PolicyClient:
+        """
+        key의 모델이 없으면 loader()로 한 번 로드하고, 그 모델을 쓰는 세션을 반환합니다.
+        로드는 서버 락 밖에서 하므로 느린 로드가 다른 키의 세션을 막지 않습니다.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            owner = entry is None
+            if owner:
+                entry = self._entries[key] = _ModelEntry(key)
+            with entry.cond:
+                entry.refs += 1
+
+        if owner:
+            try:
+                model = loader()
+                if model is None:
+                    raise ValueError(f"모델을 로드할 수 없습니다: {key}")
+            except BaseException as e:
+                with self._lock:
+                    self._entries.pop(key, None)
+                entry.load_error = e
+                entry.loaded.set()
+                raise
+            entry.model = model
+            entry.thread = threading.Thread(target=self._run, args=(entry,), name=f"policy-server-{key}", daemon=True)
+            entry.thread.start()
+            entry.loaded.set()
+        else:
+            entry.loaded.wait()
+            if entry.load_error is not None:
+                raise entry.load_error
+
+        with entry.cond:
+            entry.cond.notify_all()
+        return PolicyClient(self, entry)
+
+    def stats(self) -> Dict[Hashable, Dict[str, float]]:
+        with self._lock:
+            return {
+                key: {
+                    "sessions": entry.refs,
+                    "batches": entry.batches,
+                    "requests": entry.requests,
+                    "mean_batch_size": entry.requests / entry.batches if entry.batches else 0.0,
+                }
+                for key, entry in self._entries.items()
+                if entry.model is not None
+            }
+
+    # ---- 내부 ----
+    def _release(self, entry: _ModelEntry) -> None:
+        with self._lock:
+            with entry.cond:
+                entry.refs -= 1
+                if entry.refs > 0:
+                    entry.cond.notify_all()
+                    return
+                entry.stopped = True
+                entry.cond.notify_all()
+            self._entries.pop(entry.key, None)
+
+    def _run(self, entry: _ModelEntry) -> None:
+        while True:
+            with entry.cond:
+                entry.cond.wait_for(lambda: entry.queue or entry.stopped)
+                if entry.stopped and not entry.queue:
+                    return
+                deadline = time.perf_counter() + self.latency_budget
+                while len(entry.queue) < min(self.max_batch_size, entry.refs):
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        break
+                    entry.cond.wait(remaining)
+                batch: List[_Request] = []
+                while entry.queue and len(batch) < self.max_batch_size:
+                    batch.append(entry.queue.popleft())
+
+            try:
+                with entry.predict_lock:
+                    self._predict_batch(entry.model, batch)
+            except Exception as e:
+                for request in batch:
+                    request.error = e
+            entry.batches += 1
+            entry.requests += len(batch)
+            for request in batch:
+                request.done.set()
+
+    def _predict_batch(self, model: Any, batch: List[_Request]) -> None:
+        exploration_rate = float(getattr(model, "exploration_rate", 0.0))
+        for deterministic in (True, False):
+            requests = [request for request in batch if request.deterministic == deterministic]
+            if not requests:
+                continue
+            observations = _stack([request.observation for request in requests])
+            # epsilon-greedy 정책은 greedy 행동을 구한 뒤 요청마다 따로 탐험
+            actions, _ = model.predict(observations, deterministic=deterministic or exploration_rate > 0)
+            for request, action in zip(requests, actions):
+                if not deterministic and exploration_rate > 0 and self._rng.random() < exploration_rate:
+                    action = model.action_space.sample()
+                request.action = np.asarray(action)
+
+
+def _stack(observations: List[Observation]) -> Observation:
+    if isinstance(observations[0], dict):
+        return {k: np.stack([obs[k] for obs in observations]) for k in observations[0]}
+    return np.stack(observations)
+
+
+def policy_server_enabled() -> bool:
+    """POLICY_SERVER=1이면 test 작업의 추론을 전용 PolicyServer 프로세스로 모아서 처리합니다. (기본 꺼짐)"""
+    return os.getenv("POLICY_SERVER", "0").strip().lower() in ("1", "true")
+
+
+class RemotePolicy:
+    """
+    test 워커 쪽 세션. model.predict와 같은 시그니처로 관측을 PolicyServer 프로세스에 보내고 행동을 받습니다.
+    - address/authkey는 PolicyServerProcess.connect_info이며, open()에서 서버에 연결합니다.
+    - 세션당 요청은 한 번에 하나입니다. (test_model의 스텝 루프)
+    """
+
+    def __init__(self, address: Any, authkey: bytes, open_timeout: float = 120.0, predict_timeout: float = 30.0):
+        self.address = address
+        self.authkey = authkey
+        self.open_timeout = open_timeout
+        self.predict_timeout = predict_timeout
+        self._conn: Optional[Connection] = None
+        self.observation_space = None
+        self.action_space = None
+
+    def _request(self, command: str, value: Any, timeout: float) -> Any:
+        self._conn.send((command, value))
+        if not self._conn.poll(timeout):
+            raise TimeoutError(f"PolicyServer가 {timeout}초 안에 응답하지 않았습니다. ({command})")
+        status, result = self._conn.recv()
+        if status != "ok":
+            raise RuntimeError(result)
+        return result
+
+    def open(self, key: Hashable, *load_args: Any) -> "RemotePolicy":
+        """
+        서버에서 key의 모델을 (없으면 loader(*load_args)로) 로드하고 세션을 엽니다.
+        load_args의 마지막 두 값은 관측/행동 공간이어야 합니다. (로더가 env 대신 씀)
+        """
+        self.close()
+        self._conn = Client(self.address, authkey=self.authkey)
+        try:
+            self._request("policy_open", (key, load_args), self.open_timeout)
+        except BaseException:
+            self.close()
+            raise
+        self.observation_space, self.action_space = load_args[-2:]
+        return self
+
+    def predict(
+        self,
+        observation: Observation,
+        state: Optional[Tuple[np.ndarray, ...]] = None,
+        episode_start: Optional[np.ndarray] = None,
+        deterministic: bool = False,
+    ) -> Tuple[np.ndarray, Optional[Tuple[np.ndarray, ...]]]:
+        return self._request("policy_predict", (observation, deterministic), self.predict_timeout), state
+
+    def close(self) -> None:
+        if self._conn is None:
+            return
+        with suppress(Exception):
+            self._conn.send(("policy_close", None))
+        with suppress(Exception):
+            self._conn.close()
+        self._conn = None
+
+
+class PolicyEndpoint:
+    """
+    PolicyServer 프로세스 쪽에서 연결(= RemotePolicy 하나)의 요청을 처리합니다. (연결마다 스레드 하나)
+    - policy_open (key, load_args): loader(*load_args)로 모델을 로드해 server의 세션(PolicyClient)을 엽니다.
+      같은 key의 연결들은 모델 하나를 공유하고, 요청은 server가 마이크로 배치로 묶습니다.
+    - 응답은 reply(("ok", 결과) 또는 ("error", 메시지))로 보냅니다.
+    """
+
+    def __init__(self, server: PolicyServer, loader: Callable[..., Any], reply: Callable[[Tuple[str, Any]], Any]):
+        self.server = server
+        self.loader = loader
+        self.reply = reply
+        self.client: Optional[PolicyClient] = None
+
+    def handle(self, command: str, value: Any) -> bool:
+        """정책 요청이면 처리하고 True, 아니면 False"""
+        if command not in ("policy_open", "policy_predict", "policy_close"):
+            return False
+        if command == "policy_close":
+            self.close()
+            return True
+        try:
+            if command == "policy_open":
+                key, load_args = value
+                self.close()
+                self.client = self.server.client(key, lambda: self.loader(*load_args))
+                result = None
+            else:
+                if self.client is None:
+                    raise RuntimeError("policy_open 전에 policy_predict가 왔습니다.")
+                observation, deterministic = value
+                result, _ = self.client.predict(observation, deterministic=deterministic)
+        except Exception as e:
+            self.reply(("error", f"{type(e).__name__}: {e}"))
+        else:
+            self.reply(("ok", result))
+        return True
+
+    def close(self) -> None:
+        if self.client is not None:
+            self.client.close()
+            self.client = None
+
+
+def _serve_connection(server: PolicyServer, loader: Callable[..., Any], conn: Connection) -> None:
+    endpoint = PolicyEndpoint(server, loader, reply=conn.send)
+    try:
+        while True:
+            try:
+                command, value = conn.recv()
+            except (EOFError, OSError):
+                break
+            endpoint.handle(command, value)
+    finally:
+        endpoint.close()
+        conn.close()
+
+
+def policy_server_main(ready: Connection, authkey: bytes, loader: Callable[..., Any],
+                       max_batch_size: int, latency_budget_ms: float) -> None:
+    """PolicyServer 프로세스 진입점. 리스너 주소를 ready로 알린 뒤 연결마다 스레드 하나로 요청을 처리합니다."""
+    server = PolicyServer(max_batch_size=max_batch_size, latency_budget_ms=latency_budget_ms)
+    with Listener(authkey=authkey) as listener:
+        ready.send(listener.address)
+        ready.close()
+        while True:
+            try:
+                conn = listener.accept()
+            except (OSError, EOFError, multiprocessing.AuthenticationError) as e:
+                print(f"[PolicyServer][WARN] 연결 수락 실패: {e}")
+                continue
+            threading.Thread(target=_serve_connection, args=(server, loader, conn), name="policy-endpoint",
+                             daemon=True).start()
+
+
+class PolicyServerProcess:
+    """
+    API 프로세스 쪽에서 PolicyServer 전용 프로세스를 관리하는 핸들.
+    - 모델 로드와 torch/onnxruntime 추론은 이 프로세스에서만 하므로 API 프로세스의 GIL과 경쟁하지 않습니다.
+    - loader는 spawn으로 넘기므로 모듈 수준 함수여야 합니다.
+    - test 워커에는 connect_info (리스너 주소, authkey)만 넘기고, 워커가 RemotePolicy로 직접 연결합니다.
+    - POLICY_SERVER_MAX_BATCH (기본 32), POLICY_SERVER_LATENCY_MS (기본 2.0)
+    """
+
+    def __init__(self, loader: Callable[..., Any], max_batch_size: Optional[int] = None,
+                 latency_budget_ms: Optional[float] = None, start_timeout: float = 30.0):
+        self.loader = loader
+        self.max_batch_size = max_batch_size or int(os.getenv("POLICY_SERVER_MAX_BATCH", "32"))
+        self.latency_budget_ms = (latency_budget_ms if latency_budget_ms is not None
+                                  else float(os.getenv("POLICY_SERVER_LATENCY_MS", "2.0")))
+        self.start_timeout = start_timeout
+        self.authkey = os.urandom(16)
+        self.address: Any = None
+        self.process: Optional[multiprocessing.Process] = None
+
+    @property
+    def connect_info(self) -> Tuple[Any, bytes]:
+        return self.address, self.authkey
+
+    def is_alive(self) -> bool:
+        return self.process is not None and self.process.is_alive()
+
+    def start(self) -> None:
+        ctx = multiprocessing.get_context("spawn")
+        ready, child_ready = ctx.Pipe(duplex=False)
+        self.process = ctx.Process(
+            target=policy_server_main,
+            args=(child_ready, self.authkey, self.loader, self.max_batch_size, self.latency_budget_ms),
+            name="policy-server",
+            daemon=True,
+        )
+        self.process.start()
+        child_ready.close()
+        try:
+            if not ready.poll(self.start_timeout):
+                raise TimeoutError(f"PolicyServer 프로세스가 {self.start_timeout}초 안에 시작되지 않았습니다.")
+            self.address = ready.recv()
+        except BaseException:
+            self.stop()
+            raise
+        finally:
+            ready.close()
+
+    def stop(self) -> None:
+        if self.process is not None and self.process.is_alive():
+            self.process.terminate()
+            self.process.join(5)
+        self.process = None
+        self.address = None
+
+
+def _benchmark_worker(connect_info: Optional[Tuple[Any, bytes]], loader: Callable[..., Any], load_args: Tuple,
+                      key: Hashable, seed: int, n_steps: int, warmup: int, barrier: Any, results: Any) -> None:
+    """benchmark_policy_server의 test 워커 하나. connect_info가 없으면 워커 안에서 직접 로드해 추론합니다."""
+    import torch
+
+    # 워커는 스케줄러 슬롯처럼 코어 하나 몫만 씀
+    torch.set_num_threads(1)
+    from unity.train_util.onnx_policy import sample_observations
+
+    if connect_info is None:
+        model = loader(*load_args)
+    else:
+        model = RemotePolicy(*connect_info).open(key, *load_args)
+    observation = sample_observations(load_args[-2], 1, seed)
+    observation = {k: v[0] for k, v in observation.items()} if isinstance(observation, dict) else observation[0]
+    for _ in range(warmup):
+        model.predict(observation, deterministic=True)
+    timings = np.empty(n_steps)
+    barrier.wait()
+    start = time.perf_counter()
+    for step in range(n_steps):
+        t = time.perf_counter()
+        model.predict(observation, deterministic=True)
+        timings[step] = time.perf_counter() - t
+    elapsed = time.perf_counter() - start
+    if connect_info is not None:
+        model.close()
+    results.put((elapsed, timings * 1e3))
+
+
+def benchmark_policy_server(loader: Callable[..., Any], load_args: Tuple, n_workers: int = 8, n_steps: int = 300,
+                            max_batch_size: int = 32, latency_budget_ms: float = 2.0, warmup: int = 20) -> Dict[str, float]:
+    """
+    test 워커 n_workers개(프로세스)가 각자 관측 하나씩 n_steps번 추론할 때
+    워커마다 모델을 로드해 직접 추론하는 방식(per_worker)과 PolicyServer 프로세스를 거치는 방식(server)을 비교합니다.
+    loader와 load_args는 spawn으로 넘기므로 피클 가능해야 하며, load_args의 마지막 두 값은 관측/행동 공간입니다.
+    반환: {per_worker,server}_{actions_per_s,p50_ms,p99_ms}, throughput_gain
+    """
+    ctx = multiprocessing.get_context("spawn")
+    server = PolicyServerProcess(loader, max_batch_size=max_batch_size, latency_budget_ms=latency_budget_ms)
+    server.start()
+    result: Dict[str, float] = {}
+    try:
+        for name, connect_info in (("per_worker", None), ("server", server.connect_info)):
+            barrier, results = ctx.Barrier(n_workers), ctx.Queue()
+            workers = [ctx.Process(target=_benchmark_worker,
+                                   args=(connect_info, loader, load_args, "benchmark", seed, n_steps, warmup,
+                                         barrier, results))
+                       for seed in range(n_workers)]
+            for worker in workers:
+                worker.start()
+            runs = [results.get() for _ in workers]
+            for worker in workers:
+                worker.join()
+            elapsed = max(run[0] for run in runs)
+            timings = np.concatenate([run[1] for run in runs])
+            result[f"{name}_actions_per_s"] = n_workers * n_steps / elapsed
+            result[f"{name}_p50_ms"] = float(np.percentile(timings, 50))
+            result[f"{name}_p99_ms"] = float(np.percentile(timings, 99))
+    finally:
+        server.stop()
+    result["throughput_gain"] = result["server_actions_per_s"] / result["per_worker_actions_per_s"]
+    return result
@@ -1,10 +1,11 @@
 import time, json, numpy as np
-from typing import Any, Dict, Optional
+from typing import Any, Callable, Dict, Optional
 from datetime import datetime, timezone
-from collections import deque
-import requests
 from stable_baselines3.common.callbacks import BaseCallback
 from stable_baselines3 import DQN, SAC, DDPG, TD3 # Off-policy 알고리즘
+from unity.train_util.event_bus import get_event_bus
+from unity.train_util.step_feedback import attach_step_feedback
+from unity.train_util.streaming_stats import StreamingStats, WindowMean
 
 def _py_scalar(x: Any):
     if isinstance(x, np.generic):
@@ -27,10 +28,13 @@ class StreamTrainMetricsCallback(BaseCallback):
         run_id: str,
         log_interval_steps: int = 1000,
         http_endpoint_url: str = None,
+        local_sink: Optional[Callable[[Dict[str, Any]], None]] = None,
         verbose: int = 0
     ):
         super().__init__(verbose)
         self.run_id = run_id
+        # API 프로세스의 MetricsHub로 보내는 경로 (대시보드 실시간 스트림, Node/Mongo 경유 없음)
+        self.local_sink = local_sink
         # PPO의 n_steps나 DQN의 train_freq와 유사한 값으로 설정
         self.log_interval_steps = log_interval_steps
         self.http_endpoint_url = http_endpoint_url
@@ -40,9 +44,14 @@ class StreamTrainMetricsCallback(BaseCallback):
         self._last_log_step = 0
         self._is_off_policy = False
         
-        # 피드백 래퍼(TFW) 통계를 위한 버퍼
-        self.tfw_feedback_buffer = deque(maxlen=log_interval_steps)
-        self.tfw_shaped_reward_buffer = deque(maxlen=log_interval_steps)
+        # 로그 구간별 통계 (값을 저장하지 않는 누적기: 평균/표준편차/최소/최대/p5/p50/p95)
+        self.tfw_feedback_stats = StreamingStats()
+        self.tfw_shaped_reward_stats = StreamingStats()
+        self.ep_reward_stats = StreamingStats()
+        # rollout/ep_rew_mean, ep_len_mean (SB3 ep_info_buffer와 같은 최근 N 에피소드 평균)
+        self.ep_reward_window: Optional[WindowMean] = None
+        self.ep_length_window: Optional[WindowMean] = None
+        self._step_feedback = None
 
     def _on_training_start(self) -> None:
         """학습 시작 시 호출되어 시작 시간을 기록합니다."""
@@ -50,15 +59,26 @@ class StreamTrainMetricsCallback(BaseCallback):
         
         # 현재 모델이 Off-policy 계열인지 확인 (DQN, SAC 등)
         self._is_off_policy = isinstance(self.model, (DQN, SAC, DDPG, TD3))
+        window = getattr(self.model, "_stats_window_size", 100)
+        self.ep_reward_window = WindowMean(window)
+        self.ep_length_window = WindowMean(window)
+        self._step_feedback = attach_step_feedback(self.training_env)
 
     def _on_step(self) -> bool:
-        # 매 스텝마다 info 딕셔너리에서 TFW 관련 통계를 수집합니다.
+        # 매 스텝마다 피드백 표에서 TFW 통계를, info 딕셔너리에서 에피소드 통계를 누적합니다.
+        table = self._step_feedback
+        if table is not None:
+            for i in range(table.n_envs):
+                if table.valid[i]:
+                    self.tfw_feedback_stats.update(table.feedback[i])
+                    self.tfw_shaped_reward_stats.update(table.shaped_reward[i])
         if "infos" in self.locals:
             for info in self.locals["infos"]:
-                if "tfw_feedback" in info:
-                    self.tfw_feedback_buffer.append(info["tfw_feedback"])
-                if "tfw_shaped_reward" in info:
-                    self.tfw_shaped_reward_buffer.append(info["tfw_shaped_reward"])
+                ep_info = info.get("episode")
+                if ep_info is not None:
+                    self.ep_reward_stats.update(ep_info["r"])
+                    self.ep_reward_window.update(ep_info["r"])
+                    self.ep_length_window.update(ep_info["l"])
 
         # Off-policy 알고리즘(DQN 등)은 스텝 기반으로 로그를 남깁니다.
         if self._is_off_policy and self.num_timesteps >= self._last_log_step + self.log_interval_steps:
@@ -75,13 +95,12 @@ class StreamTrainMetricsCallback(BaseCallback):
         # 1. train/* 과 같은 기본 로그를 가져옵니다.
         kvs = _safe_kvs(self.logger)
 
-        # 2. rollout/* 통계를 집계합니다. (ep_info_buffer 사용)
-        ep_info_buffer: Optional[deque] = getattr(self.model, "ep_info_buffer", None)
-        if ep_info_buffer and len(ep_info_buffer) > 0:
-            if "rollout/ep_rew_mean" not in kvs:
-                kvs["rollout/ep_rew_mean"] = np.mean([ep_info["r"] for ep_info in ep_info_buffer]).item()
-            if "rollout/ep_len_mean" not in kvs:
-                kvs["rollout/ep_len_mean"] = np.mean([ep_info["l"] for ep_info in ep_info_buffer]).item()
+        # 2. rollout/* 통계를 집계합니다. (최근 N 에피소드 누적 평균 + 이번 구간 에피소드 리워드 분포)
+        if self.ep_reward_window:
+            kvs.setdefault("rollout/ep_rew_mean", self.ep_reward_window.mean())
+            kvs.setdefault("rollout/ep_len_mean", self.ep_length_window.mean())
+        for key, value in self.ep_reward_stats.summary("rollout/ep_rew").items():
+            kvs.setdefault(key, value)
 
         # 3. time/* 통계를 집계합니다. (self.start_time 사용)
         time_elapsed = time.time() - self.start_time
@@ -89,14 +108,19 @@ class StreamTrainMetricsCallback(BaseCallback):
         kvs["time/time_elapsed"] = time_elapsed
         kvs["time/total_timesteps"] = self.model.num_timesteps
         
-        # 4. TFW 통계를 집계합니다.
-        if len(self.tfw_feedback_buffer) > 0:
-            kvs["teacher/feedback_mean"] = np.mean(self.tfw_feedback_buffer).item()
-        if len(self.tfw_shaped_reward_buffer) > 0:
-            kvs["teacher/shaped_reward_mean"] = np.mean(self.tfw_shaped_reward_buffer).item()
-            
-        self.tfw_feedback_buffer.clear()
-        self.tfw_shaped_reward_buffer.clear()
+        # 4. 메트릭 전송 큐 상태 (백프레셔로 버려진 메트릭 수 포함)
+        if self.http_endpoint_url:
+            for key, value in get_event_bus().stats().items():
+                kvs[f"event_bus/{key}"] = value
+
+        # 5. TFW 통계를 집계합니다.
+        kvs.update(self.tfw_feedback_stats.summary("teacher/feedback"))
+        kvs.update(self.tfw_shaped_reward_stats.summary("teacher/shaped_reward"))
+
+        # 구간 통계는 전송 후 새로 집계
+        self.tfw_feedback_stats.reset()
+        self.tfw_shaped_reward_stats.reset()
+        self.ep_reward_stats.reset()
 
         return kvs
 
@@ -150,6 +174,8 @@ class StreamTrainMetricsCallback(BaseCallback):
 
         # 외부 엔드포인트로 데이터 전송
         self._send_http(payload)
+        if self.local_sink is not None:
+            self.local_sink(payload)
 
         # 사람이 읽기 쉬운 로그 출력
         elapsed_time = time.time() - self.start_time
@@ -185,10 +211,6 @@ class StreamTrainMetricsCallback(BaseCallback):
         """
         if not self.http_endpoint_url:
             return
-        try:
-            # HTTP 요청은 학습 루프를 느리게 할 수 있으므로 timeout을 짧게 설정합니다.
-            # `json` 파라미터는 dict를 자동으로 JSON으로 직렬화하고 헤더를 설정합니다.
-            requests.post(self.http_endpoint_url, json=payload, timeout=2)
-        except requests.RequestException as e:
-            if self.verbose > 0:
-                print(f"[HTTP][ERROR] Failed to send metrics: {e}")
+        # HTTP 요청은 학습 루프를 느리게 할 수 있으므로 백그라운드 EventBus에 맡깁니다.
+        # 전송이 밀리면 오래된 메트릭부터 버려집니다.
+        get_event_bus().publish(self.http_endpoint_url, payload, droppable=True)
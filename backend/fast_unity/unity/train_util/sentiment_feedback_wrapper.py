@@ -1,12 +1,15 @@
-from typing import Callable, Optional, Tuple, Union
+from typing import Callable, Deque, List, Optional, Tuple, Union
 import gymnasium as gym
-import openai
 import threading
 import os
-import json
+import time
 import numpy as np
 
 from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from unity.train_util.feedback_scorer import ChainedFeedbackScorer, default_feedback_scorer
+from unity.train_util.step_feedback import FeedbackScheduleMixin, StepFeedbackWriterMixin
 def cnt_for_fb(fb: int, steps_since_warmup: int, total_remaining_steps: int) -> int:
     """'동적 카운트' 전략: 학습 진행도(스텝 기반)에 따라 피드백 강도를 조절"""
     if total_remaining_steps <= 0:
@@ -60,87 +63,103 @@ action_descriptions = {
 
 class SentimentLLMFeedback:
     """
-    LLM을 통해 사용자의 텍스트 피드백을 감성(긍정/중립/부정)으로 분석하고,
+    사용자의 텍스트 피드백을 감성(긍정/중립/부정)으로 분석하고,
     피드백 값(-1, 0, 1)으로 변환하는 클래스.
+
+    - 채점은 scorer(기본: 캐시 → 내장 어휘 사전 → gpt-4o-mini)에 맡깁니다.
+      캐시/어휘 사전으로 채점되는 메시지는 AddMessage() 안에서 바로 끝나고, 나머지만 백그라운드에서 LLM을 호출합니다.
+      (env.step은 네트워크를 기다리지 않음)
+    - 채점 대상은 메시지가 도착한 시점의 전이(스텝 번호, 행동)이며, 래퍼가 poll_feedback()으로 완료된 결과를 가져가
+      리플레이 버퍼의 해당 전이를 사후에 보정합니다. (보상 셰이핑 + 중복 저장)
+    - API 호출에는 timeout초 제한이 있고, 그 안에 끝나지 않은 채점은 버립니다.
     """
     _lock: "threading.Lock"
 
-    def __init__(self, unpause_callback: Optional[Callable] = None):
-        self.client = openai.OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
-        self.system_prompt = """
-        당신은 강화학습 에이전트의 행동과 그에 대한 사용자 피드백을 분석하는 시스템입니다.
-        주어진 피드백이 에이전트의 행동에 대해 얼마나 부정적인지를 [0.0, 1.0] 사이의 연속적인 값으로 평가해주세요.
-        - 0.0: 매우 긍정적 (올바른 행동)
-        - 0.1 ~ 0.3: 다소 긍정적
-        - 0.4 ~ 0.6: 중립적이거나 불분명함
-        - 0.7 ~ 0.9: 다소 부정적 (약간의 실수)
-        - 1.0: 매우 부정적이거나 위험함 (큰 실수, 충돌 등)
-        
-        다른 설명 없이 {"feedback": [결과 값]} 형태의 JSON으로만 반환하시오.
-        결과 값은 0.0과 1.0 사이의 실수(float)여야 합니다.
-        """
-        self._message_queue = deque(maxlen=1) # 최신 메시지 하나만 저장
+    def __init__(self, unpause_callback: Optional[Callable] = None, timeout: Optional[float] = None, max_workers: int = 2,
+                 scorer: Optional[ChainedFeedbackScorer] = None):
+        self.timeout = float(timeout if timeout is not None else os.environ.get("LLM_FEEDBACK_TIMEOUT", "10"))
+        self.scorer = scorer if scorer is not None else default_feedback_scorer(timeout=self.timeout)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm-feedback")
+        # (대상 스텝, 제출 시각, future) - 제출 순서대로 보관
+        self._pending: Deque[Tuple[int, float, Future]] = deque()
         self._lock = threading.Lock()
         self.unpause_callback = unpause_callback
 
+        # 래퍼가 매 스텝 갱신하는 현재 전이 (메시지가 도착하면 이 전이에 피드백을 붙임)
+        self.current_step = 0
+        self.current_action = "알 수 없는 행동"
+
+    def set_current_transition(self, step: int, action_description: str) -> None:
+        self.current_step = step
+        self.current_action = action_description
+
     def AddMessage(self, message: str) -> bool:
         """
-        사용자 메시지를 받아 큐에 저장하고, 학습 재개 콜백을 호출합니다.
+        사용자 메시지를 받아 현재 전이에 대한 채점을 백그라운드에서 시작하고, 학습 재개 콜백을 호출합니다.
         """
+        step, action_description = self.current_step, self.current_action
+        local_score = self.scorer.score_local(message, action_description)
+        if local_score is not None:
+            # 캐시/어휘 사전으로 바로 채점됨
+            future = Future()
+            future.set_result(to_feedback(local_score))
+            print(f"[SentimentLLMFeedback] 로컬 채점({self.scorer.last_source}): {future.result()}")
+        else:
+            future = self._executor.submit(self._score, message, action_description)
         with self._lock:
-            self._message_queue.append(message)
+            self._pending.append((step, time.monotonic(), future))
         
-        # 메시지 수신 후 unpause 콜백 호출
+        # 채점 완료를 기다리지 않고 바로 unpause 콜백 호출
         if self.unpause_callback:
             self.unpause_callback()
         
         return True
 
-    def consume_message_and_get_feedback(self, action_message: str) -> Optional[int]:
+    def poll_feedback(self) -> List[Tuple[int, int]]:
         """
-        사용자 메시지를 받아 LLM API를 호출하고, 결과로 나온 피드백 값을 내부에 저장합니다.
+        완료된 채점 결과를 [(대상 스텝, 피드백 값)] 형태로 가져갑니다. 기다리지 않습니다.
+        timeout을 넘긴 채점은 취소하고 버립니다.
         """
-        message: Optional[str] = None
+        if not self._pending:
+            return []
+        results = []
+        now = time.monotonic()
         with self._lock:
-            if len(self._message_queue) > 0:
-                message = self._message_queue.popleft()
-        if message is None:
-            return None
-        full_prompt = (
-            f"에이전트가 방금 '{action_message}' 행동을 했습니다.\n"
-            f"이에 대한 사용자 피드백은 다음과 같습니다: '{message}'"
-        )
-        try:
-            completion = self.client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": self.system_prompt},
-                    {"role": "user", "content": full_prompt},
-                ],
-                response_format={"type": "json_object"},
-                temperature=0.0,
-            )
-            content = completion.choices[0].message.content
-            response_data = json.loads(content)
-            feedback_score = float(response_data["feedback"])
-
-            if not (0.0 <= feedback_score <= 1.0):
-                raise ValueError("피드백 점수는 0.0과 1.0 사이여야 합니다.")
-
-            feedback_value = to_feedback(feedback_score)
-            print(f"LLM 피드백 수신 및 처리 완료: {feedback_value}")
-            return feedback_value
-        except (openai.APIError, ValueError, IndexError, json.JSONDecodeError, KeyError) as e:
-            print(f"[SentimentLLMFeedback] API 호출 또는 응답 처리 중 오류 발생: {e}")
+            remaining: Deque[Tuple[int, float, Future]] = deque()
+            for step, submitted_at, future in self._pending:
+                if future.done():
+                    feedback_value = None if future.cancelled() else future.result()
+                    if feedback_value is not None:
+                        results.append((step, feedback_value))
+                elif now - submitted_at > self.timeout * 2:
+                    future.cancel()
+                    print(f"[SentimentLLMFeedback] 스텝 {step}의 피드백 채점이 시간 초과로 취소되었습니다.")
+                else:
+                    remaining.append((step, submitted_at, future))
+            self._pending = remaining
+        return results
+
+    def _score(self, message: str, action_message: str) -> Optional[int]:
+        """원격 LLM으로 채점해 피드백 값을 반환합니다. (백그라운드 스레드, 결과는 캐시에 저장됨)"""
+        feedback_score = self.scorer.score_remote(message, action_message)
+        if feedback_score is None:
             return None
+        feedback_value = to_feedback(feedback_score)
+        print(f"LLM 피드백 수신 및 처리 완료: {feedback_value}")
+        return feedback_value
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self.scorer.close()
 
 
-class SentimentLLMWrapper(gym.Wrapper):
+class SentimentLLMWrapper(FeedbackScheduleMixin, StepFeedbackWriterMixin, gym.Wrapper):
     """
     LLM의 감성 분석 결과를 보상 셰이핑에 사용하는 래퍼.
 
     - 사용자의 텍스트 입력을 LLM으로 보내 긍정(1), 중립(0), 부정(-1) 피드백을 받습니다.
-    - 이 피드백을 바탕으로 보상을 조절하고, 관련 정보를 info 딕셔너리에 추가합니다.
+    - 채점은 백그라운드에서 진행되고, 결과가 도착한 스텝의 step_feedback.patches 행에 (대상 스텝, 셰이핑 보상, cnt)를 담아
+      리플레이 버퍼(DupReplayBuffer 계열)가 이미 저장된 대상 전이를 보정하게 합니다. 현재 스텝의 보상은 바뀌지 않습니다.
     - 기존 teacher 모델 없이 LLM 피드백에만 의존합니다.
     """
     def __init__(
@@ -151,17 +170,15 @@ class SentimentLLMWrapper(gym.Wrapper):
         feedback_weight: float = 0.05,
         warmup_fraction: float = 0.05,
         verbose: int = 1,
+        start_step: int = 0,
     ):
         super().__init__(env)
         self.message_handler = message_handler
-        self.total_timesteps = total_timesteps
-        self.feedback_weight = float(feedback_weight)
-        self.warmup_end_step = int(total_timesteps * warmup_fraction)
-        self.verbose = int(verbose)
+        self._init_feedback_schedule(total_timesteps, feedback_weight, warmup_fraction, verbose, start_step)
+        self._init_step_feedback()
 
         # 내부 상태
         self._episode_idx = 0
-        self._total_step = 0
         
         # 통계
         self._fb_pos = 0
@@ -181,26 +198,28 @@ class SentimentLLMWrapper(gym.Wrapper):
         self._total_step += 1
 
         fb = 0
-        cnt = 1
         shaped = 0.0
+        # 보정 목록은 표의 환경별 리스트를 재사용
+        patches = self.step_feedback.patches[self.step_feedback_index]
+        patches.clear()
         is_warmup = self._total_step < self.warmup_end_step
 
-        # 현재 action에 대한 설명을 가져와서, 대기 중인 메시지가 있다면 LLM 피드백을 요청합니다.
-        action_idx = int(action) if not isinstance(action, int) else action
-        action_description = action_descriptions.get(action_idx, "알 수 없는 행동")
-        llm_feedback = self.message_handler.consume_message_and_get_feedback(action_description)
-
-        if llm_feedback is not None and not is_warmup:
+        # 완료된 LLM 채점 결과를 가져와 해당 전이의 보정값을 계산합니다. (기다리지 않음)
+        for target_step, llm_feedback in self.message_handler.poll_feedback():
+            if target_step < self.warmup_end_step:
+                continue
             fb = llm_feedback
 
-            # 보상 셰이핑 (학습 진행도에 따라 가중치 감소)
-            progress = self._total_step / self.total_timesteps
-            shaped = self.feedback_weight * float(fb) * (1 - progress)
+            # 보상 셰이핑 (대상 전이 시점의 학습 진행도에 따라 가중치 감소)
+            progress = target_step / self.total_timesteps
+            target_shaped = self.feedback_weight * float(fb) * (1 - progress)
+            shaped += target_shaped
 
             # 동적 카운트 계산
-            steps_since_warmup = max(0, self._total_step - self.warmup_end_step)
-            total_remaining_steps = max(1, self.total_timesteps - self._total_step)
+            steps_since_warmup = max(0, target_step - self.warmup_end_step)
+            total_remaining_steps = max(1, self.total_timesteps - target_step)
             cnt = cnt_for_fb(fb, steps_since_warmup, total_remaining_steps)
+            patches.append((target_step, target_shaped, int(cnt)))
 
             # 통계 업데이트
             if fb > 0:
@@ -210,19 +229,16 @@ class SentimentLLMWrapper(gym.Wrapper):
             else:
                 self._fb_neu += 1
 
-        # 환경 스텝 진행 및 보상 적용
+        # 환경 스텝 진행
         next_obs, reward, terminated, truncated, info = self.env.step(action)
-        reward = float(reward) + shaped
+
+        # 이 스텝 이후 일시정지 중에 도착하는 메시지는 이 전이에 대한 피드백
+        action_idx = int(action) if not isinstance(action, int) else action
+        self.message_handler.set_current_transition(self._total_step, action_descriptions.get(action_idx, "알 수 없는 행동"))
 
         if terminated or truncated:
             self._episode_idx += 1
 
-        # info 딕셔너리 확장
-        info = dict(info) if info is not None else {}
-        info.update({
-            "tfw_feedback": fb,
-            "tfw_shaped_reward": shaped,
-            "tfw_is_warmup": is_warmup,
-            "tfw_cnt": int(cnt),
-        })
+        # 이번 전이는 한 번만 저장 (피드백은 patches로 나중에 반영)
+        self.step_feedback.write(self.step_feedback_index, self._total_step, fb, 1, shaped, is_warmup)
         return next_obs, reward, terminated, truncated, info
@@ -0,0 +1,149 @@
+import os
+from typing import Any, Dict, Optional, Tuple, Union
+
+import numpy as np
+from gymnasium import spaces
+from stable_baselines3 import DQN, SAC
+from stable_baselines3.common.base_class import BaseAlgorithm
+from stable_baselines3.common.policies import ActorCriticPolicy, BasePolicy
+from stable_baselines3.common.preprocessing import maybe_transpose
+from stable_baselines3.common.save_util import load_from_zip_file, save_to_zip_file
+from stable_baselines3.common.utils import get_device, is_vectorized_observation
+
+from unity.train_util.onnx_policy import policy_observation_space
+
+# predict에 쓰지 않는 정책 파라미터 (state_dict 키 접두사)
+_DQN_UNUSED = ("q_net_target.",)
+_SAC_UNUSED = ("critic.", "critic_target.")
+_ACTOR_CRITIC_UNUSED = ("value_net.", "mlp_extractor.value_net.", "vf_features_extractor.")
+
+
+def slim_path_for(model_path: str) -> str:
+    """models/foo.zip(또는 models/foo) → models/foo.policy.zip (추론 전용 아티팩트)"""
+    root, ext = os.path.splitext(model_path)
+    return (root if ext == ".zip" else model_path) + ".policy.zip"
+
+
+def _unused_prefixes(model: BaseAlgorithm) -> Optional[Tuple[str, ...]]:
+    if isinstance(model, DQN):
+        return _DQN_UNUSED
+    if isinstance(model, SAC):
+        return _SAC_UNUSED
+    if isinstance(model.policy, ActorCriticPolicy):
+        return _ACTOR_CRITIC_UNUSED
+    return None
+
+
+class SlimPolicy:
+    """
+    추론 전용 아티팩트에서 다시 만든 SB3 정책.
+    SB3 model.predict와 같은 시그니처라 test_model과 teacher(_call_teacher)에서 그대로 쓸 수 있고,
+    .policy로 torch 정책에 접근할 수 있습니다. (srl/hf-llm의 특징 추출기 가중치 복사)
+    """
+
+    def __init__(self, policy: BasePolicy, exploration_rate: float = 0.0):
+        self.policy = policy
+        self.observation_space = policy.observation_space
+        self.action_space = policy.action_space
+        self.exploration_rate = exploration_rate
+        self._rng = np.random.default_rng()
+
+    def predict(
+        self,
+        observation: Union[np.ndarray, Dict[str, np.ndarray]],
+        state: Optional[Tuple[np.ndarray, ...]] = None,
+        episode_start: Optional[np.ndarray] = None,
+        deterministic: bool = False,
+    ) -> Tuple[np.ndarray, Optional[Tuple[np.ndarray, ...]]]:
+        if deterministic or self._rng.random() >= self.exploration_rate:
+            return self.policy.predict(observation, state, episode_start, deterministic)
+        # DQN.predict와 같이 배치 전체를 무작위 행동으로
+        if is_vectorized_observation(maybe_transpose(observation, self.observation_space), self.observation_space):
+            if isinstance(observation, dict):
+                n_batch = observation[next(iter(observation.keys()))].shape[0]
+            else:
+                n_batch = observation.shape[0]
+            return np.array([self.action_space.sample() for _ in range(n_batch)]), state
+        return np.array(self.action_space.sample()), state
+
+
+def save_slim_policy(model: BaseAlgorithm, model_path: str) -> Optional[str]:
+    """
+    model_path(.zip) 옆에 predict에 필요한 정책 가중치와 정책을 다시 만들 정보만 .policy.zip으로 저장합니다.
+    옵티마이저 상태, DQN 타깃 네트워크, SAC 크리틱, PPO/A2C 가치 헤드, 리플레이 버퍼 정보는 넣지 않습니다.
+    지원하지 않는 알고리즘이면 None을 반환합니다.
+    """
+    unused = _unused_prefixes(model)
+    if unused is None:
+        print(f"[save_slim_policy] 지원하지 않는 정책입니다: {type(model).__name__}/{type(model.policy).__name__}")
+        return None
+    policy = model.policy
+    constructor = policy._get_constructor_parameters()
+    for key in ("observation_space", "action_space", "lr_schedule"):
+        constructor.pop(key, None)
+    data = {
+        "algo": type(model).__name__,
+        "policy_class": type(policy),
+        "policy_kwargs": constructor,
+        "observation_space": policy.observation_space,
+        "action_space": policy.action_space,
+        "exploration_rate": float(getattr(model, "exploration_rate", 0.0)),
+        "unused_prefixes": list(unused),
+    }
+    state_dict = {k: v for k, v in policy.state_dict().items() if not k.startswith(unused)}
+    path = slim_path_for(model_path)
+    save_to_zip_file(path, data=data, params={"policy": state_dict})
+    return path
+
+
+def load_slim_policy(model_path: str, observation_space: spaces.Space, action_space: spaces.Space,
+                     device: str = "auto") -> Optional[SlimPolicy]:
+    """
+    model_path 옆의 .policy.zip을 SlimPolicy로 불러옵니다. 다음 경우에는 None (호출한 쪽에서 전체 모델로 로드):
+    .policy.zip이 없거나 .zip보다 오래됨(.zip이 없으면 삭제된 모델), 관측/행동 공간이 env와 다름, 가중치가 정책 구조와 맞지 않음.
+    """
+    path = slim_path_for(model_path)
+    zip_path = path[:-len(".policy.zip")] + ".zip"
+    if not os.path.exists(path):
+        return None
+    if not os.path.exists(zip_path):
+        print(f"[load_slim_policy] {zip_path}가 없어 {path}를 사용하지 않습니다.")
+        return None
+    if os.path.getmtime(zip_path) > os.path.getmtime(path):
+        print(f"[load_slim_policy] {path}가 모델보다 오래되어 전체 모델로 로드합니다.")
+        return None
+    device = get_device(device)
+    try:
+        data, params, _ = load_from_zip_file(path, device=device)
+    except Exception as e:
+        print(f"[load_slim_policy][WARN] {path} 로드 실패: {e}")
+        return None
+    if data["observation_space"] != policy_observation_space(observation_space) or data["action_space"] != action_space:
+        print(f"[load_slim_policy] {path}의 관측/행동 공간이 env와 달라 전체 모델로 로드합니다.")
+        return None
+
+    policy: BasePolicy = data["policy_class"](
+        observation_space=data["observation_space"],
+        action_space=data["action_space"],
+        lr_schedule=lambda _: 0.0,
+        **data["policy_kwargs"],
+    ).to(device)
+    missing, unexpected = policy.load_state_dict(params["policy"], strict=False)
+    unused = tuple(data["unused_prefixes"])
+    if unexpected or any(not k.startswith(unused) for k in missing):
+        print(f"[load_slim_policy][WARN] {path}의 가중치가 정책 구조와 맞지 않습니다: "
+              f"missing={[k for k in missing if not k.startswith(unused)]}, unexpected={unexpected}")
+        return None
+    policy.set_training_mode(False)
+    print(f"[load_slim_policy] 추론 전용 정책으로 로드합니다: {path}")
+    return SlimPolicy(policy, exploration_rate=data["exploration_rate"])
+
+
+def slim_size_report(model_path: str) -> Dict[str, Any]:
+    """전체 모델(.zip)과 추론 전용 아티팩트(.policy.zip)의 파일 크기 비교"""
+    root, ext = os.path.splitext(model_path)
+    zip_path = (root if ext == ".zip" else model_path) + ".zip"
+    full = os.path.getsize(zip_path) if os.path.exists(zip_path) else None
+    slim_path = slim_path_for(model_path)
+    slim = os.path.getsize(slim_path) if os.path.exists(slim_path) else None
+    return {"full_bytes": full, "slim_bytes": slim, "ratio": slim / full if full and slim else None}
@@ -0,0 +1,108 @@
+import weakref
+from typing import List, Optional, Tuple
+
+import numpy as np
+from stable_baselines3.common.vec_env import DummyVecEnv, VecEnv, VecEnvWrapper
+
+# 피드백 래퍼가 매 스텝 환경별로 한 행씩 덮어쓰는 값
+STEP_FEEDBACK_DTYPE = np.dtype([
+    ("step", np.int64),             # 래퍼 기준 스텝 번호 (리플레이 버퍼의 사후 보정 대상 식별용)
+    ("feedback", np.int8),          # +1 / 0 / -1
+    ("cnt", np.int32),              # 리플레이 버퍼에 반복 저장할 횟수
+    ("shaped_reward", np.float32),
+    ("is_warmup", np.bool_),
+    ("valid", np.bool_),            # 피드백 래퍼가 이번 스텝 값을 썼는지
+])
+
+# (대상 스텝, 셰이핑 보상, cnt)
+FeedbackPatch = Tuple[int, float, int]
+
+
+class StepFeedbackTable:
+    """
+    피드백 래퍼 → 리플레이 버퍼/콜백으로 전달하는 스텝별 값을 담는 (n_envs,) 구조화 배열.
+
+    - 배열과 필드 뷰(step, feedback, cnt, ...)는 한 번만 만들고 매 스텝 같은 메모리에 덮어씁니다.
+      info dict를 복사하거나 키를 추가하지 않으므로 피드백 경로에서 스텝마다 새로 할당하는 것이 없습니다.
+    - 읽는 쪽(버퍼, 콜백)은 같은 스텝 안에서 필드를 인덱스로 조회합니다. (env.step 직후 ~ 다음 env.step 전)
+    - 늦게 도착한 LLM 피드백의 보정 목록은 가변 길이라 환경별 리스트(patches)로 따로 둡니다. (재사용, 매 스텝 clear)
+    """
+
+    def __init__(self, n_envs: int = 1):
+        self.n_envs = n_envs
+        self.data = np.zeros(n_envs, dtype=STEP_FEEDBACK_DTYPE)
+        self.data["cnt"] = 1
+        self.step = self.data["step"]
+        self.feedback = self.data["feedback"]
+        self.cnt = self.data["cnt"]
+        self.shaped_reward = self.data["shaped_reward"]
+        self.is_warmup = self.data["is_warmup"]
+        self.valid = self.data["valid"]
+        self.patches: List[List[FeedbackPatch]] = [[] for _ in range(n_envs)]
+
+    def write(self, index: int, step: int, feedback: int, cnt: int, shaped_reward: float, is_warmup: bool) -> None:
+        self.step[index] = step
+        self.feedback[index] = feedback
+        self.cnt[index] = cnt
+        self.shaped_reward[index] = shaped_reward
+        self.is_warmup[index] = is_warmup
+        self.valid[index] = True
+
+
+class StepFeedbackWriterMixin:
+    """
+    단일 환경 피드백 래퍼용: 혼자 쓸 때는 자기 1행짜리 표를 쓰고,
+    VecEnv 안에서는 attach_step_feedback()이 공유 표의 한 행(index)에 연결합니다.
+    """
+
+    def _init_step_feedback(self) -> None:
+        self.step_feedback = StepFeedbackTable(1)
+        self.step_feedback_index = 0
+
+    def bind_step_feedback(self, table: StepFeedbackTable, index: int) -> None:
+        self.step_feedback = table
+        self.step_feedback_index = index
+
+
+class FeedbackScheduleMixin:
+    """피드백 래퍼 공용: 피드백 가중치, warmup 구간과 진행 스텝(_total_step)을 설정합니다."""
+
+    def _init_feedback_schedule(self, total_timesteps: int, feedback_weight: float, warmup_fraction: float,
+                                verbose: int, start_step: int) -> None:
+        self.total_timesteps = total_timesteps
+        self.feedback_weight = float(feedback_weight)
+        self.warmup_end_step = int(total_timesteps * warmup_fraction)
+        self.verbose = int(verbose)
+        # 선점 후 이어서 학습할 때는 체크포인트의 num_timesteps부터 셈 (warmup/cnt/셰이핑 감쇠가 처음부터 다시 시작하지 않도록)
+        self._total_step = int(start_step)
+
+
+# VecEnv → 공유 표 (버퍼와 콜백이 같은 표를 쓰도록 한 번만 연결)
+_ATTACHED: "weakref.WeakKeyDictionary[VecEnv, Optional[StepFeedbackTable]]" = weakref.WeakKeyDictionary()
+
+
+def attach_step_feedback(venv: Optional[VecEnv]) -> Optional[StepFeedbackTable]:
+    """
+    VecEnv 안의 피드백 래퍼가 쓰는 StepFeedbackTable을 찾아 반환합니다. (피드백 래퍼가 없으면 None)
+    - TeacherFeedbackVecWrapper처럼 VecEnv 수준 래퍼면 그 표를 그대로 사용합니다.
+    - DummyVecEnv 안의 단일 환경 래퍼들은 (n_envs,) 공유 표를 만들어 환경마다 한 행씩 연결합니다.
+      (SubprocVecEnv는 메모리를 공유하지 않으므로 지원하지 않음)
+    """
+    if venv is None:
+        return None
+    if venv in _ATTACHED:
+        return _ATTACHED[venv]
+
+    table = None
+    env = venv
+    while isinstance(env, VecEnvWrapper):
+        if isinstance(getattr(env, "__dict__", {}).get("step_feedback"), StepFeedbackTable):
+            table = env.step_feedback
+            break
+        env = env.venv
+    if table is None and isinstance(env, DummyVecEnv) and env.has_attr("bind_step_feedback"):
+        table = StepFeedbackTable(env.num_envs)
+        for index in range(env.num_envs):
+            env.env_method("bind_step_feedback", table, index, indices=[index])
+    _ATTACHED[venv] = table
+    return table
@@ -0,0 +1,137 @@
+import math
+from collections import deque
+from typing import Deque, Dict, Sequence
+
+
+class P2Quantile:
+    """
+    P² 알고리즘(Jain & Chlamtac)으로 분위수 하나를 추정합니다.
+    마커 5개만 유지하므로 값을 저장하지 않고 O(1) 메모리/시간으로 갱신됩니다. (값이 5개 미만이면 정확한 값)
+    """
+    __slots__ = ("p", "q", "n", "dn", "count")
+
+    def __init__(self, p: float):
+        self.p = p
+        self.q = []                         # 마커 높이
+        self.n = [0, 1, 2, 3, 4]            # 마커 위치
+        self.dn = (0.0, p / 2, p, (1 + p) / 2, 1.0)  # 목표 위치 = dn * (count - 1)
+        self.count = 0
+
+    def update(self, x: float) -> None:
+        q = self.q
+        self.count += 1
+        if len(q) < 5:
+            q.append(x)
+            if len(q) == 5:
+                q.sort()
+            return
+
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = 0
+            while x >= q[k + 1]:
+                k += 1
+        n, dn = self.n, self.dn
+        for i in range(k + 1, 5):
+            n[i] += 1
+        last = self.count - 1
+
+        # 가운데 마커 3개를 목표 위치 쪽으로 조정 (포물선 보간, 실패하면 선형 보간)
+        for i in (1, 2, 3):
+            d = dn[i] * last - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                s = 1 if d > 0 else -1
+                qp = q[i] + s / (n[i + 1] - n[i - 1]) * (
+                    (n[i] - n[i - 1] + s) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+                    + (n[i + 1] - n[i] - s) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+                )
+                if not q[i - 1] < qp < q[i + 1]:
+                    qp = q[i] + s * (q[i + s] - q[i]) / (n[i + s] - n[i])
+                q[i] = qp
+                n[i] += s
+
+    def value(self) -> float:
+        q = self.q
+        if not q:
+            return math.nan
+        if len(q) < 5:
+            ordered = sorted(q)
+            return ordered[min(len(ordered) - 1, int(round(self.p * (len(ordered) - 1))))]
+        return q[2]
+
+
+class StreamingStats:
+    """
+    스칼라 스트림의 개수/평균/분산(Welford), 최소/최대, 분위수(P²)를 값 저장 없이 누적합니다.
+    reset()으로 로그 구간마다 새로 집계할 수 있습니다.
+    """
+
+    def __init__(self, quantiles: Sequence[float] = (0.05, 0.5, 0.95)):
+        self.quantiles = tuple(quantiles)
+        self.reset()
+
+    def reset(self) -> None:
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self._sketches = [P2Quantile(p) for p in self.quantiles]
+
+    def update(self, x: float) -> None:
+        x = float(x)
+        if x != x:
+            return
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (x - self.mean)
+        if x < self.min:
+            self.min = x
+        if x > self.max:
+            self.max = x
+        for sketch in self._sketches:
+            sketch.update(x)
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self._m2 / self.count) if self.count > 1 else 0.0
+
+    def summary(self, prefix: str) -> Dict[str, float]:
+        """{prefix}_mean/_std/_min/_max/_p5/... 형식의 메트릭. 값이 없으면 빈 dict"""
+        if self.count == 0:
+            return {}
+        result = {
+            f"{prefix}_mean": self.mean,
+            f"{prefix}_std": self.std,
+            f"{prefix}_min": self.min,
+            f"{prefix}_max": self.max,
+        }
+        for p, sketch in zip(self.quantiles, self._sketches):
+            result[f"{prefix}_p{round(p * 100):g}"] = sketch.value()
+        return result
+
+
+class WindowMean:
+    """최근 window개 값의 평균 (합계를 누적하므로 조회 시 리스트를 만들지 않음)"""
+
+    def __init__(self, window: int):
+        self.values: Deque[float] = deque(maxlen=window)
+        self.total = 0.0
+
+    def update(self, x: float) -> None:
+        if len(self.values) == self.values.maxlen:
+            self.total -= self.values[0]
+        self.values.append(float(x))
+        self.total += float(x)
+
+    def mean(self) -> float:
+        return self.total / len(self.values) if self.values else math.nan
+
+    def __len__(self) -> int:
+        return len(self.values)
@@ -1,82 +1,168 @@
 
 from stable_baselines3.common.callbacks import BaseCallback
+from stable_baselines3.common.off_policy_algorithm import OffPolicyAlgorithm
+from stable_baselines3.common.type_aliases import TrainFrequencyUnit
+from stable_baselines3.common.utils import polyak_update
+from stable_baselines3 import DQN
 import time
 import threading
+import multiprocessing
+import ctypes
 import os
-import requests
 from unity.train_util.sidechannel import RLSideChannel
-from typing import Optional, Dict, Any
-from contextlib import contextmanager
-class UnityTrainingState:
-     def __init__(self):
-        self.is_running = False
-        self.is_paused = False
-        self.is_stopped = False
-
-        # 멀티스레드 안전을 위한 락
-        self._lock = threading.Lock()
-        
-     def set_paused(self, pause: bool):
-        with self._lock:
-            self.is_paused = pause
-
-     def set_running(self, running: bool):
-        with self._lock:
-            self.is_running = running
-     def set_stop(self, stop: bool):
-        with self._lock:
-            self.is_stopped = stop
-     def reset(self):
-        self.is_running = False
-        self.is_paused = False
-        self.is_stopped = False
-    
+from unity.train_util.event_bus import get_event_bus
+from unity.train_util.async_logger import flush_logger
+from unity.train_util.step_feedback import attach_step_feedback
+from unity.train_util.onnx_policy import export_onnx
+from unity.train_util.mlagents_export import export_mlagents_onnx
+from unity.train_util.onnx_quantize import quantize_trained_model
+from unity.train_util.slim_policy import save_slim_policy
+from typing import Callable, Optional, Dict, Any
+from contextlib import contextmanager, suppress
+class RunStateMachine:
+    """
+    학습/추론 실행 상태(running / paused / stopped) 머신.
+    - 모든 읽기/쓰기는 Condition으로 보호되며, 상태가 바뀌면 대기 중인 쪽을 즉시 깨웁니다. (sleep 폴링 없음)
+    - 제어 명령(pause/resume/stop)에는 번호가 매겨지고, 워커가 스텝 경계에서 반영하면 ack합니다.
+      제어하는 쪽은 wait_applied()로 명령이 실제로 반영될 때까지 기다릴 수 있습니다.
+    - 저장소(cond/flags/seqs)만 바꾸면 프로세스 간 공유 상태로도 사용할 수 있습니다. (SharedRunState)
+    """
+    _RUNNING, _PAUSED, _STOPPED, _PREEMPTED = 0, 1, 2, 3
+    _REQUESTED, _APPLIED = 0, 1
+
+    def __init__(self, cond=None, flags=None, seqs=None):
+        self._cond = cond if cond is not None else threading.Condition()
+        self._flags = flags if flags is not None else [False] * 4
+        self._seqs = seqs if seqs is not None else [0, 0]
+
+    def _get(self, idx: int) -> bool:
+        with self._cond:
+            return bool(self._flags[idx])
 
-class UnityInferenceState:
-    def __init__(self):
-        self.is_running = False
-        self.is_paused = False
-        self.is_stopped = False
+    def _set(self, idx: int, value: bool, command: bool = False) -> int:
+        with self._cond:
+            self._flags[idx] = value
+            if command:
+                self._seqs[self._REQUESTED] += 1
+            self._cond.notify_all()
+            return self._seqs[self._REQUESTED]
 
-        # 멀티스레드 안전을 위한 락 추가
-        self._lock = threading.Lock()
+    is_running = property(lambda self: self._get(self._RUNNING), lambda self, v: self._set(self._RUNNING, v))
+    is_paused = property(lambda self: self._get(self._PAUSED), lambda self, v: self._set(self._PAUSED, v, command=True))
+    is_stopped = property(lambda self: self._get(self._STOPPED), lambda self, v: self._set(self._STOPPED, v, command=True))
+    is_preempted = property(lambda self: self._get(self._PREEMPTED), lambda self, v: self._set(self._PREEMPTED, v))
 
-    def set_paused(self, pause: bool):
-        with self._lock:
-            self.is_paused = pause
+    def set_paused(self, pause: bool) -> int:
+        """일시정지/재개 명령. 반환값은 wait_applied()에 넘길 명령 번호입니다."""
+        return self._set(self._PAUSED, pause, command=True)
 
     def set_running(self, running: bool):
-        with self._lock:
-            self.is_running = running
-        
-    def set_stop(self, stop: bool):
-        with self._lock:
-            self.is_stopped = stop
+        self._set(self._RUNNING, running)
+
+    def set_stop(self, stop: bool) -> int:
+        """정지 명령. 반환값은 wait_applied()에 넘길 명령 번호입니다."""
+        return self._set(self._STOPPED, stop, command=True)
+
     def reset(self):
-        self.is_running = False
-        self.is_paused = False
-        self.is_stopped = False
-        
+        with self._cond:
+            for idx in range(len(self._flags)):
+                self._flags[idx] = False
+            self._cond.notify_all()
+
+    # ---- 워커(학습/추론 루프) 쪽 ----
+    def _ack_locked(self) -> None:
+        if self._seqs[self._APPLIED] != self._seqs[self._REQUESTED]:
+            self._seqs[self._APPLIED] = self._seqs[self._REQUESTED]
+            self._cond.notify_all()
+
+    def ack(self) -> None:
+        """워커가 지금까지의 명령을 반영했음을 알립니다. (루프 종료 시 호출)"""
+        with self._cond:
+            self._ack_locked()
+
+    def wait_while_paused(self, on_pause: Optional[Callable[[], None]] = None) -> bool:
+        """
+        스텝 경계에서 호출합니다. 일시정지 상태면 재개 또는 정지될 때까지 블로킹합니다.
+        지금까지의 명령을 반영했음을 ack하고, 계속 진행해도 되면 True, 정지해야 하면 False를 반환합니다.
+        """
+        with self._cond:
+            if self._flags[self._PAUSED] and not self._flags[self._STOPPED]:
+                self._ack_locked()  # 일시정지가 반영됨
+                if on_pause is not None:
+                    on_pause()
+                while self._flags[self._PAUSED] and not self._flags[self._STOPPED]:
+                    self._cond.wait()
+            self._ack_locked()
+            return not self._flags[self._STOPPED]
+
+    # ---- 제어(API) 쪽 ----
+    def wait_applied(self, seq: int, timeout: Optional[float] = None) -> bool:
+        """seq번 명령이 워커에 반영될 때까지 기다립니다. 시간 초과면 False (블로킹, executor에서 호출)"""
+        with self._cond:
+            return self._cond.wait_for(lambda: self._seqs[self._APPLIED] >= seq, timeout)
+
+
+class UnityTrainingState(RunStateMachine):
+    """같은 프로세스 안에서 학습 루프를 제어하는 상태"""
+
+
+class UnityInferenceState(RunStateMachine):
+    """같은 프로세스 안에서 추론 루프를 제어하는 상태"""
+
+
+class SharedRunState(RunStateMachine):
+    """
+    API 프로세스와 학습/추론 워커 프로세스가 공유하는 실행 상태.
+    - Condition과 플래그/명령 번호가 공유 메모리에 있으므로 pause/stop이 별도 메시지 없이 워커를 즉시 깨웁니다.
+    - is_preempted는 스케줄러가 선점으로 중지시켰음을 표시합니다. (완료 신호 대신 체크포인트만 저장)
+    """
+    def __init__(self, ctx=None):
+        ctx = ctx or multiprocessing.get_context("spawn")
+        super().__init__(
+            cond=ctx.Condition(),
+            flags=ctx.Array(ctypes.c_bool, 4, lock=False),
+            seqs=ctx.Array(ctypes.c_long, 2, lock=False),
+        )
+
+def replay_buffer_path_for(model_path: str) -> str:
+    """models/foo.zip(또는 models/foo) → models/foo.replay.pkl (선점 시 저장하는 리플레이 버퍼)"""
+    root, ext = os.path.splitext(model_path)
+    return (root if ext == ".zip" else model_path) + ".replay.pkl"
+
+
 # 학습 상태를 제어 할 수 있는 콜백
 class PauseResumeCallback(BaseCallback):
+    """
+    pause/resume/stop 신호를 처리하고 학습 종료 시 모델을 저장하는 콜백.
+    - pause_replay_ratio를 주면(off-policy 전용) 일시정지 동안에도 리플레이 버퍼로 그래디언트 스텝을 계속합니다.
+      (사람이 피드백을 입력하는 동안 CPU를 놀리지 않음) 재개/정지 신호가 오면 다음 스텝 전에 멈춥니다.
+      한 번의 일시정지에서 추가하는 업데이트 수는 설정된 학습 비율(gradient_steps / train_freq) 기준으로
+      pause_replay_ratio * 학습 비율 * (직전 일시정지 이후 수집한 스텝 수)를 넘지 않습니다.
+      (기본 1.0이면 그 구간 데이터로 평소 업데이트 수만큼 한 번 더 학습)
+    - DQN은 타깃 네트워크 동기화가 train()이 아니라 _on_step에 있으므로, 추가 업데이트가
+      target_update_interval(환경 스텝)에 해당하는 업데이트 수만큼 쌓일 때마다 직접 동기화합니다.
+    """
     def __init__(
         self,
         state,
         side_channel,
         save_path: str,
         run_id : str,
-        check_interval: float = 0.3,
         debug_log_freq: Optional[int] = 500,
+        pause_replay_ratio: Optional[float] = None,
         verbose: int = 0,
     ):
         super().__init__(verbose)
         self.state = state
         self.side_channel = side_channel
         self.save_path = save_path
-        self.check_interval = check_interval
         self.debug_log_freq = debug_log_freq
         self.triggered = False
         self.run_id = run_id
+        self.pause_replay_ratio = pause_replay_ratio
+        self.pause_updates = 0  # 일시정지 중에 추가로 수행한 그래디언트 스텝 수
+        self._pause_window_start = 0  # 직전 일시정지 학습이 끝난 시점의 num_timesteps
+        self._updates_since_target_sync = 0
         self._orig_train = None
         
     def __getstate__(self) -> Dict[str, Any]:
@@ -111,16 +197,68 @@ class PauseResumeCallback(BaseCallback):
                 setattr(self.model, k, v)
 
 
+    def _log_pause(self) -> None:
+        if self.verbose > 0:
+            print("[SB3] 학습 일시정지 중...")
+
+    def _on_training_start(self) -> None:
+        # 이어서 학습할 때는 복원된 스텝부터 일시정지 학습 한도를 셈
+        self._pause_window_start = self.model.num_timesteps
+
+    @staticmethod
+    def _configured_replay_ratio(model: OffPolicyAlgorithm) -> float:
+        """환경 스텝당 그래디언트 스텝 (gradient_steps / train_freq). 에피소드 단위 train_freq나 -1이면 1.0"""
+        if model.gradient_steps < 0 or model.train_freq.unit != TrainFrequencyUnit.STEP:
+            return 1.0
+        return model.gradient_steps / max(1, model.train_freq.frequency)
+
+    def _sync_dqn_target(self, model: DQN, updates: int) -> None:
+        """DQN._on_step과 같은 방식으로 타깃 네트워크 동기화 (target_update_interval 환경 스텝 = 업데이트 수로 환산)"""
+        self._updates_since_target_sync += updates
+        interval = max(1, int(model.target_update_interval * self._configured_replay_ratio(model)))
+        if self._updates_since_target_sync >= interval:
+            polyak_update(model.q_net.parameters(), model.q_net_target.parameters(), model.tau)
+            polyak_update(model.batch_norm_stats, model.batch_norm_stats_target, 1.0)
+            self._updates_since_target_sync = 0
+
+    def _train_while_paused(self) -> None:
+        """일시정지 한 번에 학습 비율 기준 한도 안에서 그래디언트 스텝을 한 번씩 수행합니다."""
+        model = self.model
+        if not isinstance(model, OffPolicyAlgorithm) or model.num_timesteps <= model.learning_starts:
+            return
+        window = model.num_timesteps - max(self._pause_window_start, model.learning_starts)
+        budget = int(self.pause_replay_ratio * self._configured_replay_ratio(model) * window)
+        if budget <= 0:
+            return
+
+        # 일시정지가 반영되었음을 먼저 알림 (pause 지연 측정은 학습 시작 전까지)
+        self.state.ack()
+        done = 0
+        try:
+            while done < budget and self.state.is_paused and not self.state.is_stopped:
+                model.train(gradient_steps=1, batch_size=model.batch_size)
+                done += 1
+                if isinstance(model, DQN):
+                    self._sync_dqn_target(model, 1)
+        finally:
+            # collect_rollouts 도중이므로 정책을 다시 평가 모드로 되돌림
+            model.policy.set_training_mode(False)
+            self._pause_window_start = model.num_timesteps
+        self.pause_updates += done
+        if self.verbose > 0:
+            print(f"[PauseResumeCallback] 일시정지 중 추가 업데이트 {done}/{budget}회 (누적 {self.pause_updates}회)")
+
     def _on_step(self) -> bool:
-        # 외부 일시정지 신호 처리
-        while (self.state.is_paused):
-            if self.verbose > 0:
-                print("[SB3] 학습 일시정지 중...")
-            if (self.state.is_stopped):
-                # 정지 신호가 들어오면 학습 루프 종료
-                self.triggered = True
-                return False
-            time.sleep(self.check_interval)
+        if self.pause_replay_ratio and self.state.is_paused:
+            self._train_while_paused()
+        if self.pause_updates:
+            self.logger.record("train/pause_updates", self.pause_updates)
+
+        # 일시정지면 재개/정지 신호가 올 때까지 블로킹 (신호가 오면 즉시 깨어남)
+        # 정지 신호가 들어오면 학습 루프 종료
+        if not self.state.wait_while_paused(self._log_pause):
+            self.triggered = True
+            return False
 
         # 디버그용 로거나 출력(선택)
         # if self.debug_log_freq and self.num_timesteps > 0 and (self.num_timesteps % self.debug_log_freq == 0):
@@ -129,23 +267,84 @@ class PauseResumeCallback(BaseCallback):
         #     except Exception:
         #         pass
 
-        # 외부 정지 신호 즉시 중단
-        if (self.state.is_stopped):
-            self.triggered = True
-            return False
-
         return True
     
+    def _save_replay_buffer(self) -> None:
+        """선점 후 이어서 학습할 때 빈 버퍼로 곧바로 업데이트하지 않도록 리플레이 버퍼를 저장합니다. (실패하면 예외)"""
+        if not isinstance(self.model, OffPolicyAlgorithm):
+            return
+        path = replay_buffer_path_for(self.save_path)
+        self.model.save_replay_buffer(path)
+        if self.verbose:
+            print("[PauseResumeCallback] replay buffer saved ->", path)
+
+    def _export_inference_artifacts(self) -> None:
+        # 테스트/teacher 로드용 추론 전용 아티팩트 (옵티마이저/타깃 네트워크 없이 정책 가중치만)
+        try:
+            slim_path = save_slim_policy(self.model, self.save_path)
+            if slim_path and self.verbose:
+                print("[PauseResumeCallback] inference-only policy saved ->", slim_path)
+        except Exception as e:
+            print("[PauseResumeCallback][WARN] 추론 전용 정책 저장 실패:", e)
+
+        # 테스트/teacher 추론용 ONNX 정책을 .zip 옆에 함께 저장 (torch 출력과 다르면 저장하지 않음)
+        try:
+            onnx_path = export_onnx(self.model, self.save_path)
+            if onnx_path and self.verbose:
+                print("[PauseResumeCallback] ONNX exported ->", onnx_path)
+            # ONNX_QUANTIZE=1이면 int8 동적 양자화본도 만들고, 행동 일치율 기준을 넘을 때만 남김
+            if onnx_path and os.getenv("ONNX_QUANTIZE", "0").lower() in ("1", "true"):
+                quantize_trained_model(self.model, self.save_path)
+        except Exception as e:
+            print("[PauseResumeCallback][WARN] ONNX 내보내기 실패:", e)
+
+        # 플레이어 안(ML-Agents/Sentis)에서 추론할 수 있는 ONNX도 함께 저장 (Unity 환경일 때만)
+        try:
+            env = self.model.get_env()
+            if env is not None and env.has_attr("obs_shapes"):
+                mlagents_path = export_mlagents_onnx(self.model, self.save_path,
+                                                     obs_shapes=env.get_attr("obs_shapes", indices=[0])[0],
+                                                     branches=env.get_attr("branches", indices=[0])[0])
+                if mlagents_path and self.verbose:
+                    print("[PauseResumeCallback] ML-Agents ONNX exported ->", mlagents_path)
+        except Exception as e:
+            print("[PauseResumeCallback][WARN] ML-Agents ONNX 내보내기 실패:", e)
+
     def _on_training_end(self) -> None:
+        # 선점된 학습은 스케줄러가 다시 실행하므로 체크포인트와 리플레이 버퍼만 저장하고 내보내기는 건너뜀
+        preempted = getattr(self.state, "is_preempted", False)
+
         # 안전 저장
         if self.verbose:
             print("[PauseResumeCallback] saving on training end ->", self.save_path)
 
+        # 선점된 학습은 체크포인트 없이 다시 실행되면 안 되므로, 저장 실패를 정리 후 다시 던져 워커를 비정상 종료시킴
+        # (스케줄러는 큐에 다시 넣지 않고 FAILED를 보냄)
+        checkpoint_error: Optional[Exception] = None
         try:
             with self._clean_model_for_save():
                 self.model.save(self.save_path)
         except Exception as e:
             print("[PauseResumeCallback][WARN] model.save 실패:", e)
+            checkpoint_error = e
+
+        if preempted:
+            if checkpoint_error is None:
+                try:
+                    self._save_replay_buffer()
+                except Exception as e:
+                    print("[PauseResumeCallback][WARN] 리플레이 버퍼 저장 실패:", e)
+                    checkpoint_error = e
+        else:
+            with suppress(FileNotFoundError):
+                os.remove(replay_buffer_path_for(self.save_path))
+            self._export_inference_artifacts()
+
+        # 백그라운드 기록 중인 로그(CSV/TensorBoard)를 완료 신호 전에 모두 기록
+        try:
+            flush_logger(self.logger)
+        except Exception as e:
+            print("[PauseResumeCallback][WARN] 로그 flush 실패:", e)
 
         # 환경 닫기 시도 (VecEnv 포함)
         try:
@@ -156,28 +355,31 @@ class PauseResumeCallback(BaseCallback):
                     print("[PauseResumeCallback] env closed")
         except Exception as e:
             print("[PauseResumeCallback][WARN] env.close() 실패:", e)
-        # 여기서 신호 보내자
+        # 여기서 신호 보내자 (선점된 학습은 스케줄러가 다시 실행하므로 완료 신호를 보내지 않음)
+        if preempted and self.verbose:
+            print("[PauseResumeCallback] 선점으로 중지되었습니다. 체크포인트만 저장합니다.")
         base_api_server_url = os.environ.get("API_SERVER_URL")
-        if base_api_server_url and self.run_id:
+        if base_api_server_url and self.run_id and not preempted:
             endpoint = f"{base_api_server_url}/callbacks/{self.run_id}/experiment-completed"
-            try:
-                if self.verbose:
-                    print(f"[PauseResumeCallback] 학습 완료 신호를 보냅니다 -> {endpoint}")
-                
-                # is_stopped 상태에 따라 성공/중단 상태를 body에 담아 전송
-                status_payload = {"status": "STOPPED" if self.triggered else "COMPLETED"}
-                requests.post(endpoint, json=status_payload, timeout=5)
-            except requests.RequestException as e:
-                print(f"[PauseResumeCallback][ERROR] Node.js API 서버로 완료 신호 전송 실패: {e}")
-
-        # 로컬 상태 리셋
+            if self.verbose:
+                print(f"[PauseResumeCallback] 학습 완료 신호를 보냅니다 -> {endpoint}")
+
+            # is_stopped 상태에 따라 성공/중단 상태를 body에 담아 전송 (백그라운드 전송, 버리지 않음)
+            status_payload = {"status": "STOPPED" if self.triggered else "COMPLETED"}
+            get_event_bus().publish(endpoint, status_payload, droppable=False)
+
+        # 로컬 상태 리셋 (종료 전에 받은 명령은 반영된 것으로 ack)
         try:
+            self.state.ack()
             self.state.reset()
         except Exception:
             pass
 
         if self.triggered and self.verbose:
             print("[PauseResumeCallback] training ended by external stop signal")
+
+        if preempted and checkpoint_error is not None:
+            raise RuntimeError("선점 체크포인트를 저장하지 못했습니다.") from checkpoint_error
             
             
 class CustomExplorationCallback(BaseCallback):
@@ -199,6 +401,10 @@ class CustomExplorationCallback(BaseCallback):
         self.warmup_end_step = int(total_timesteps * warmup_fraction)
         self.warmup_eps = warmup_eps
         self.post_warmup_eps = post_warmup_eps
+        self._step_feedback = None
+
+    def _on_training_start(self) -> None:
+        self._step_feedback = attach_step_feedback(self.training_env)
 
     def _on_step(self) -> bool:
         if self.num_timesteps < self.warmup_end_step:
@@ -212,12 +418,40 @@ class CustomExplorationCallback(BaseCallback):
         self.logger.record("rollout/exploration_rate", self.model.exploration_rate)
 
         # --- TeacherFeedbackWrapper의 커스텀 정보 로깅 추가 ---
-        # self.locals에서 마지막 스텝의 info 딕셔너리를 가져옵니다.
-        if "infos" in self.locals and len(self.locals["infos"]) > 0:
-            info = self.locals["infos"][0]
-            # info 딕셔너리에 있는 'tfw_'로 시작하는 값들을 로그에 기록합니다.
-            for key, value in info.items():
-                if key.startswith("tfw_"):
-                    self.logger.record(f"custom/{key}", value)
-
-        return True
\ No newline at end of file
+        # 피드백 표에서 첫 번째 환경의 이번 스텝 값을 기록합니다.
+        table = self._step_feedback
+        if table is not None and table.valid[0]:
+            self.logger.record("custom/tfw_feedback", int(table.feedback[0]))
+            self.logger.record("custom/tfw_cnt", int(table.cnt[0]))
+            self.logger.record("custom/tfw_shaped_reward", float(table.shaped_reward[0]))
+            self.logger.record("custom/tfw_is_warmup", bool(table.is_warmup[0]))
+
+        return True
+
+
+class CnnUnfreezeCallback(BaseCallback):
+    """
+    DiffrentRLPolicy의 CNN을 학습 진행도에 따라 해제하는 콜백.
+    - unfreeze_fraction 시점까지는 cnn_lr=0(고정) 상태를 유지하고,
+    - 이후에는 지정된 'cnn_lr'로 CNN 파라미터 그룹을 다시 학습시킵니다.
+    """
+    def __init__(
+        self,
+        total_timesteps: int,
+        unfreeze_fraction: float = 0.5,
+        cnn_lr: float = 0.000005,
+        verbose: int = 0,
+    ):
+        super(CnnUnfreezeCallback, self).__init__(verbose)
+        self.unfreeze_step = int(total_timesteps * unfreeze_fraction)
+        self.cnn_lr = cnn_lr
+        self.unfrozen = False
+
+    def _on_step(self) -> bool:
+        if not self.unfrozen and self.num_timesteps >= self.unfreeze_step:
+            self.model.policy.set_cnn_lr(self.cnn_lr)
+            self.unfrozen = True
+            if self.verbose > 0:
+                print(f"[CnnUnfreezeCallback] {self.num_timesteps} 스텝에서 CNN 고정 해제 (cnn_lr={self.cnn_lr})")
+        self.logger.record("train/cnn_lr", self.cnn_lr if self.unfrozen else 0.0)
+        return True